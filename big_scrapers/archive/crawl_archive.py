@@ -0,0 +1,255 @@
+# archive_crawler_v1_day_partitioned.py
+"""
+Paralelní procházení denních archivů po jednotlivých dnech.
+
+Podporované archivy:
+- irozhlas: https://www.irozhlas.cz/zpravy-archiv/YYYY-MM-DD (od 2. 10. 2000)
+- ct24:     vyhledávání https://ct24.ceskatelevize.cz/hledat s filtrem na jeden den (od 2. 5. 2005)
+
+Rozsah dat se rozdělí na jednotlivé dny, které si berou souběžní workeři.
+Hotové dny se připisují do manifestu (JSONL), takže přerušený běh pokračuje
+tam, kde skončil. Den useknutý na `MAX_PAGES_PER_DAY` stránkách se zapíše
+jako nedokončený i s URL další stránky a příští běh v něm pokračuje. Odkazy se deduplikují ještě před zápisem. Tempo na doménu
+hlídá sdílený plánovač (scraping/politeness.py) s nízkou prioritou backfillu.
+
+Použití:
+    python big_scrapers/archive/crawl_archive.py irozhlas
+    python big_scrapers/archive/crawl_archive.py ct24 --from 2020-01-01 --to 2020-12-31 -w 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+from datetime import date, timedelta
+from urllib.parse import urljoin
+
+import httpx
+import lxml.etree
+import lxml.html
+
+# Přidáme kořen projektu do cesty kvůli sdíleným indexům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from scraping.politeness import PolitenessScheduler, PRIORITY_BACKFILL
+from scraping.url_index import UrlWriter, load_url_index
+
+# --- KONFIGURACE ---
+MANIFEST_TEMPLATE = "VYSTUP_archive_{source}_manifest.jsonl"
+URL_OUTPUT_TEMPLATE = "VYSTUP_archive_{source}_urls.txt"
+LOG_FILE = "VYSTUP_archive.log"
+
+DEFAULT_WORKERS = 8
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 5
+MAX_BACKOFF = 120
+MAX_PAGES_PER_DAY = 200
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
+}
+
+# Články iRozhlasu mají v URL časové razítko: /rubrika/slug_RRMMDDHHMM_autor
+IROZHLAS_ARTICLE_RE = re.compile(r"^/[a-z0-9-]+/[a-z0-9-]+_\d{10}_[a-z0-9]+$")
+
+# --- NASTAVENÍ LOGOVÁNÍ ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler(LOG_FILE, encoding='utf-8'), logging.StreamHandler()]
+)
+# httpx jinak loguje každý požadavek
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# --- PARSOVÁNÍ STRÁNEK ---
+def parse_irozhlas_page(html, page_url):
+    """Vrátí (odkazy na články, URL další stránky nebo None)."""
+    tree = lxml.html.fromstring(html)
+    links = []
+    for href in tree.xpath("//a/@href"):
+        path = href.split("?", 1)[0].split("#", 1)[0]
+        if path.startswith("https://www.irozhlas.cz"):
+            path = path[len("https://www.irozhlas.cz"):]
+        if IROZHLAS_ARTICLE_RE.match(path):
+            links.append("https://www.irozhlas.cz" + path)
+    next_href = tree.xpath("//a[@rel='next']/@href | //li[contains(@class, 'pager__item--next')]/a/@href")
+    return links, urljoin(page_url, next_href[0]) if next_href else None
+
+def parse_ct24_page(html, page_url):
+    """Vrátí (odkazy na články, URL další stránky nebo None) z výsledků vyhledávání."""
+    tree = lxml.html.fromstring(html)
+    links = [
+        urljoin("https://ct24.ceskatelevize.cz", href)
+        for href in tree.xpath("//a[contains(concat(' ', normalize-space(@class), ' '), ' stretched-link ')]/@href")
+    ]
+    # Tlačítko "Následující" znamená další stránku
+    has_next = bool(tree.xpath("//a[contains(@class, 'page-link') and normalize-space(text())='Následující']"))
+    if not has_next:
+        return links, None
+    page = int(httpx.URL(page_url).params.get("page", "1"))
+    return links, str(httpx.URL(page_url).copy_merge_params({"page": page + 1}))
+
+def irozhlas_day_url(day):
+    return f"https://www.irozhlas.cz/zpravy-archiv/{day.isoformat()}"
+
+def ct24_day_url(day):
+    date_str = day.strftime("%d.%m.%Y")
+    return str(httpx.URL("https://ct24.ceskatelevize.cz/hledat", params={'q': '', 'from': date_str, 'to': date_str, 'page': 1}))
+
+# 🗂️ Archiv -> (první den, URL první stránky dne, parser stránky, URL pro inicializaci cookies)
+ARCHIVES = {
+    "irozhlas": (date(2000, 10, 2), irozhlas_day_url, parse_irozhlas_page, None),
+    "ct24": (date(2005, 5, 2), ct24_day_url, parse_ct24_page, "https://ct24.ceskatelevize.cz/hledat"),
+}
+
+# --- MANIFEST ---
+def load_manifest(path):
+    """
+    Vrátí (množinu hotových dní, {den: URL další stránky} u useknutých dní).
+    Dny jsou ISO řetězce; pozdější záznam o stejném dni platí před dřívějším.
+    """
+    done, resume = set(), {}
+    if not os.path.exists(path):
+        return done, resume
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                day = entry["day"]
+            except (json.JSONDecodeError, KeyError):
+                # Poslední řádek mohl zůstat useknutý po pádu
+                continue
+            if entry.get("next"):
+                done.discard(day)
+                resume[day] = entry["next"]
+            else:
+                done.add(day)
+                resume.pop(day, None)
+    return done, resume
+
+# --- STAHOVÁNÍ ---
+async def fetch_page(client, scheduler, url):
+    """Stáhne stránku s omezeným počtem pokusů a exponenciálním odstupem."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            async with scheduler.slot(url, PRIORITY_BACKFILL):
+                response = await client.get(url)
+            if response.status_code == 429:
+                scheduler.pause(url, min(MAX_BACKOFF, 2 ** attempt * 5))
+            if response.status_code == 429 or response.status_code >= 500:
+                raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500 and e.response.status_code != 429:
+                raise
+            error = e
+        except httpx.TransportError as e:
+            error = e
+        backoff = min(MAX_BACKOFF, 2 ** attempt * 5)
+        logging.warning(f"Chyba při stahování {url}: {error}. Zkusím znovu za {backoff}s.")
+        await asyncio.sleep(backoff)
+    raise httpx.HTTPError(f"Stránku {url} se nepodařilo stáhnout ani na {MAX_RETRIES} pokusů")
+
+async def crawl_day(client, scheduler, start_url, parse_page):
+    """
+    Projde stránky jednoho dne od `start_url` a vrátí (unikátní odkazy v pořadí, počet stránek,
+    URL další stránky nebo None). Další stránka zbývá, když den narazí na `MAX_PAGES_PER_DAY`.
+    """
+    links = {}
+    url = start_url
+    pages = 0
+    while url and pages < MAX_PAGES_PER_DAY:
+        html = await fetch_page(client, scheduler, url)
+        pages += 1
+        try:
+            page_links, url = parse_page(html, url)
+        except lxml.etree.ParserError as e:
+            # Prázdná nebo useknutá stránka: den selže, ostatní workery to nezastaví
+            raise lxml.etree.ParserError(f"Stránku {url} nejde zpracovat: {e}") from e
+        for link in page_links:
+            links.setdefault(link, None)
+    return list(links), pages, url
+
+async def crawl_archive(source, start, end, workers=DEFAULT_WORKERS):
+    first_day, day_url, parse_page, warmup_url = ARCHIVES[source]
+    start = max(start or first_day, first_day)
+    end = end or date.today()
+
+    manifest_path = MANIFEST_TEMPLATE.format(source=source)
+    output_path = URL_OUTPUT_TEMPLATE.format(source=source)
+    done_days, resume_urls = load_manifest(manifest_path)
+    known = load_url_index(output_path)
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    pending = [day for day in days if day.isoformat() not in done_days]
+    logging.info(f"{source}: {len(days)} dní v rozsahu {start}..{end}, hotových {len(days) - len(pending)}, "
+                 f"zbývá {len(pending)} (z toho {len(resume_urls)} useknutých). Workerů: {workers}")
+
+    queue = asyncio.Queue()
+    for day in pending:
+        queue.put_nowait(day)
+    counters = {"days": 0, "failed": 0, "truncated": 0, "links": 0}
+
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    async with PolitenessScheduler(concurrency=workers) as scheduler, \
+            httpx.AsyncClient(headers=HEADERS, limits=limits, timeout=REQUEST_TIMEOUT,
+                              http2=True, follow_redirects=True) as client:
+        if warmup_url:
+            # Nejprve navštívíme stránku, abychom dostali cookies
+            async with scheduler.slot(warmup_url, PRIORITY_BACKFILL):
+                await client.get(warmup_url)
+
+        with UrlWriter(output_path) as writer, open(manifest_path, 'a', encoding='utf-8') as manifest:
+
+            async def worker():
+                while not queue.empty():
+                    day = queue.get_nowait()
+                    try:
+                        links, pages, next_url = await crawl_day(
+                            client, scheduler, resume_urls.get(day.isoformat()) or day_url(day), parse_page
+                        )
+                    except (httpx.HTTPError, lxml.etree.ParserError) as e:
+                        counters["failed"] += 1
+                        logging.error(f"{source} {day}: {e}. Den zůstane nehotový pro příští běh.")
+                        continue
+
+                    new_links = [link for link in links if known.add(link)]
+                    for link in new_links:
+                        writer.write(link)
+                    # Odkazy musí být na disku dřív, než den označíme za hotový
+                    writer.flush()
+                    entry = {"day": day.isoformat(), "pages": pages, "links": len(links), "new": len(new_links)}
+                    if next_url:
+                        # Den není celý: příští běh naváže od této stránky
+                        entry["next"] = next_url
+                        counters["truncated"] += 1
+                        logging.warning(f"{source} {day}: useknuto po {pages} stránkách, pokračování příště od {next_url}")
+                    manifest.write(json.dumps(entry) + "\n")
+                    manifest.flush()
+
+                    counters["days"] += 1
+                    counters["links"] += len(new_links)
+                    if counters["days"] % 50 == 0:
+                        logging.info(f"{source}: hotovo {counters['days']}/{len(pending)} dní, {counters['links']} nových odkazů")
+
+            await asyncio.gather(*(worker() for _ in range(workers)))
+
+    logging.info(f"Hotovo! {source}: {counters['days']} dní, {counters['links']} nových odkazů, "
+                 f"{counters['failed']} dní selhalo, {counters['truncated']} useknuto. Výstup: {output_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Paralelní procházení denních archivů.")
+    parser.add_argument("source", choices=list(ARCHIVES), help="Archiv k procházení")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="První den (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Poslední den (YYYY-MM-DD, výchozí dnes)")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Počet souběžně zpracovávaných dní")
+    args = parser.parse_args()
+
+    asyncio.run(crawl_archive(args.source, args.start, args.end, args.workers))
+
+
+if __name__ == "__main__":
+    main()
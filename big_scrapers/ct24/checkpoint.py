@@ -0,0 +1,179 @@
+"""
+Checkpoint úložiště pro get_all_urls.py nad SQLite ve WAL režimu.
+
+Každá zpracovaná stránka je jedna malá transakce (připsání do WAL žurnálu),
+takže se už po každé stránce nepřepisuje celý stav ani celé statistiky.
+Po pádu SQLite žurnál sama přehraje a stav je konzistentní k poslední
+dokončené stránce. Hotové tagy se drží v paměti jako množina.
+
+Pro inkrementální běhy se u každého tagu drží i "watermark": nejnovější
+viděné id a datum článku a jestli byl tag při poslední kontrole prázdný.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS completed_tags (tag_id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS tag_progress (tag_id INTEGER PRIMARY KEY, next_page INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS category_stats (path TEXT PRIMARY KEY, count INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS category_tags (
+    path TEXT NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (path, tag_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tag_watermarks (
+    tag_id INTEGER PRIMARY KEY,
+    newest_id INTEGER,
+    newest_date TEXT,
+    is_empty INTEGER NOT NULL,
+    last_checked REAL NOT NULL
+);
+"""
+
+
+class CheckpointStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Ve WAL režimu stačí NORMAL: commit je jen append do žurnálu
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.completed_tags = {row[0] for row in self.conn.execute("SELECT tag_id FROM completed_tags")}
+
+    def close(self):
+        self.conn.close()
+
+    # --- Stav procházení ---
+    def get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key: str, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value)),
+            )
+
+    def tags_in_progress(self) -> dict[int, int]:
+        return dict(self.conn.execute("SELECT tag_id, next_page FROM tag_progress"))
+
+    def is_completed(self, tag_id: int) -> bool:
+        return tag_id in self.completed_tags
+
+    def record_page(self, tag_id: int, next_page: int | None, category_counts: dict[str, int]):
+        """
+        Zapíše postup v tagu a přírůstky statistik jedné stránky v jedné transakci.
+        S `next_page=None` (inkrementální běh) se postup v tagu neukládá.
+        """
+        with self.conn:
+            if next_page is not None:
+                self.conn.execute(
+                    "INSERT INTO tag_progress (tag_id, next_page) VALUES (?, ?) "
+                    "ON CONFLICT(tag_id) DO UPDATE SET next_page = excluded.next_page",
+                    (tag_id, next_page),
+                )
+            self.conn.executemany(
+                "INSERT INTO category_stats (path, count) VALUES (?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET count = count + excluded.count",
+                category_counts.items(),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO category_tags (path, tag_id) VALUES (?, ?)",
+                ((path, tag_id) for path in category_counts),
+            )
+
+    def complete_tag(self, tag_id: int, had_articles: bool, next_tag_id: int):
+        """Uzavře tag a posune kurzor, pod kterým jsou všechny tagy prohledané."""
+        with self.conn:
+            self.conn.execute("DELETE FROM tag_progress WHERE tag_id = ?", (tag_id,))
+            if had_articles:
+                self.conn.execute("INSERT OR IGNORE INTO completed_tags (tag_id) VALUES (?)", (tag_id,))
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('next_tag_id', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (json.dumps(next_tag_id),),
+            )
+        if had_articles:
+            self.completed_tags.add(tag_id)
+
+    # --- Watermarky pro inkrementální běhy ---
+    def record_watermark(self, tag_id: int, newest_id: int | None, newest_date: str | None):
+        """Uloží výsledek kontroly tagu; `newest_id=None` znamená prázdný tag."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO tag_watermarks (tag_id, newest_id, newest_date, is_empty, last_checked) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(tag_id) DO UPDATE SET "
+                "newest_id = MAX(COALESCE(newest_id, excluded.newest_id), COALESCE(excluded.newest_id, newest_id)), "
+                "newest_date = COALESCE(excluded.newest_date, newest_date), "
+                "is_empty = excluded.is_empty, last_checked = excluded.last_checked",
+                (tag_id, newest_id, newest_date, int(newest_id is None), time.time()),
+            )
+
+    def load_watermarks(self) -> dict[int, dict]:
+        return {
+            tag_id: {"newest_id": newest_id, "newest_date": newest_date, "is_empty": bool(is_empty), "last_checked": last_checked}
+            for tag_id, newest_id, newest_date, is_empty, last_checked in self.conn.execute(
+                "SELECT tag_id, newest_id, newest_date, is_empty, last_checked FROM tag_watermarks"
+            )
+        }
+
+    # --- Statistiky ---
+    def load_category_stats(self) -> dict:
+        """Statistiky ve stejném tvaru jako dřív: {rubrika: {"count": n, "associated_tags": [...]}}."""
+        stats = {path: {"count": count, "associated_tags": []}
+                 for path, count in self.conn.execute("SELECT path, count FROM category_stats")}
+        for path, tag_id in self.conn.execute("SELECT path, tag_id FROM category_tags ORDER BY path, tag_id"):
+            stats.setdefault(path, {"count": 0, "associated_tags": []})["associated_tags"].append(tag_id)
+        return stats
+
+    # --- Migrace ze starých JSON souborů ---
+    def import_json(self, state_file: str, stats_file: str):
+        """Jednorázově převezme VYSTUP_state.json a VYSTUP_category_stats.json, pokud je DB prázdná."""
+        if self.get_meta("next_tag_id") is not None or self.completed_tags:
+            return
+
+        state, stats = {}, {}
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r') as f:
+                    state = json.load(f)
+            except json.JSONDecodeError:
+                logging.error(f"Soubor '{state_file}' je poškozen, přeskakuji migraci stavu.")
+        if os.path.exists(stats_file):
+            try:
+                with open(stats_file, 'r', encoding='utf-8') as f:
+                    stats = json.load(f)
+            except json.JSONDecodeError:
+                logging.error(f"Soubor '{stats_file}' je poškozen, přeskakuji migraci statistik.")
+        if not state and not stats:
+            return
+
+        completed = state.get("completed_tags", [])
+        in_progress = {int(tag): page for tag, page in state.get("tags_in_progress", {}).items()}
+        if state.get("current_tag_in_progress"):
+            in_progress[int(state["current_tag_in_progress"])] = state.get("next_page", 1)
+        next_tag_id = state.get("next_tag_id", max(completed) + 1 if completed else None)
+
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO completed_tags (tag_id) VALUES (?)", ((t,) for t in completed))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tag_progress (tag_id, next_page) VALUES (?, ?)", in_progress.items()
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO category_stats (path, count) VALUES (?, ?)",
+                ((path, data["count"]) for path, data in stats.items()),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO category_tags (path, tag_id) VALUES (?, ?)",
+                ((path, tag) for path, data in stats.items() for tag in data.get("associated_tags", [])),
+            )
+        if next_tag_id is not None:
+            self.set_meta("next_tag_id", next_tag_id)
+        self.completed_tags.update(completed)
+        logging.info(f"Převzat stav z '{state_file}' a '{stats_file}' ({len(completed)} hotových tagů).")
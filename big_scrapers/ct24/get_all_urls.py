@@ -1,16 +1,29 @@
-# ct24_scraper_v9_final_accurate_stats.py
-import requests
+# ct24_scraper_v13_delta_crawl.py
+import argparse
+import asyncio
+import email.utils
 import time
 import os
+import sys
 import json
 import logging
-import sys
+from collections import Counter
+
+import httpx
+
+# Přidáme kořen projektu do cesty kvůli sdíleným indexům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from checkpoint import CheckpointStore
+from scraping.politeness import PolitenessScheduler, PRIORITY_FRESH, PRIORITY_BACKFILL
+from scraping.url_index import UrlWriter, load_ct24_ids
 
 # --- KONFIGURACE ---
 TAG_ID_RANGE = range(1, 50000)
 
 # Názvy souborů
-STATE_FILE = "VYSTUP_state.json"
+CHECKPOINT_FILE = "VYSTUP_checkpoint.sqlite"
+STATE_FILE = "VYSTUP_state.json"  # jen pro převzetí stavu ze starších verzí
 URL_OUTPUT_FILE = "VYSTUP_ct24_urls.txt"
 STATS_FILE = "VYSTUP_category_stats.json"
 REPORT_FILE = "VYSTUP_rubriky_report.txt"
@@ -21,8 +34,22 @@ API_ENDPOINT = "https://ct24.ceskatelevize.cz/api/articles"
 BASE_ARTICLE_URL = "https://ct24.ceskatelevize.cz/clanek"
 PAGE_SIZE = 24
 REQUEST_TIMEOUT = 30
-SLEEP_BETWEEN_REQUESTS = 1.0
-SLEEP_ON_ERROR = 15
+
+# Řízení rychlosti (AIMD): souběžnost roste o 1 za "kolo" úspěšných požadavků
+# a při 429/5xx nebo pomalých odpovědích se násobně snižuje
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+TARGET_LATENCY = 1.5  # s, nad touto latencí začneme zpomalovat
+DECREASE_FACTOR = 0.5
+SLOW_DECREASE_FACTOR = 0.9
+MAX_BACKOFF = 120
+PROGRESS_EVERY = 500
+
+# Inkrementální režim: prázdné tagy se znovu zkoušejí až po uplynutí TTL
+EMPTY_TAG_TTL_DAYS = 7
+# Pole s datem publikace v odpovědi API (první nalezené se použije)
+ARTICLE_DATE_FIELDS = ("publishedAt", "publishDate", "published", "date")
 
 # --- NASTAVENÍ LOGOVÁNÍ ---
 logging.basicConfig(
@@ -30,39 +57,37 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[logging.FileHandler(LOG_FILE, encoding='utf-8'), logging.StreamHandler()]
 )
+# httpx jinak loguje každý požadavek
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # --- POMOCNÉ FUNKCE ---
-def load_state():
-    try:
-        with open(STATE_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        logging.info(f"Stavový soubor '{STATE_FILE}' nenalezen, vytvářím nový.")
-        return {"current_tag_in_progress": None, "next_page": 1, "completed_tags": []}
-
-def save_state(state):
-    with open(STATE_FILE, 'w') as f: json.dump(state, f, indent=4)
-
-def load_existing_urls():
-    if not os.path.exists(URL_OUTPUT_FILE): return set()
-    with open(URL_OUTPUT_FILE, 'r', encoding='utf-8') as f:
-        return {line.strip() for line in f}
-
 def build_article_url(article_data):
     try:
         return f"{BASE_ARTICLE_URL}/{article_data['mainSection']['path']}/{article_data['slug']}-{article_data['id']}"
     except (KeyError, TypeError):
         return None
 
-# --- FUNKCE PRO STATISTIKY (UPRAVENÉ) ---
-def load_category_stats():
-    if not os.path.exists(STATS_FILE): return {}
+def article_date(article_data):
+    for field in ARTICLE_DATE_FIELDS:
+        if article_data.get(field):
+            return str(article_data[field])
+    return None
+
+def parse_retry_after(value):
+    """Retry-After může být počet sekund nebo HTTP datum."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
     try:
-        with open(STATS_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-    except json.JSONDecodeError:
-        logging.error(f"Soubor '{STATS_FILE}' je poškozen. Vytvářím nový.")
-        return {}
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
+# --- FUNKCE PRO STATISTIKY (UPRAVENÉ) ---
 def save_category_stats(stats):
     with open(STATS_FILE, 'w', encoding='utf-8') as f:
         json.dump(stats, f, indent=4, ensure_ascii=False)
@@ -72,9 +97,9 @@ def generate_final_report(stats):
     if not stats:
         logging.warning("Nebyly nalezeny žádné statistiky k vygenerování reportu.")
         return
-        
+
     sorted_stats = sorted(stats.items(), key=lambda item: item[1]['count'], reverse=True)
-    
+
     with open(REPORT_FILE, 'w', encoding='utf-8') as f:
         f.write("Přehled rubrik a počtu článků na ČT24\n")
         f.write("Seřazeno podle počtu článků\n")
@@ -86,107 +111,301 @@ def generate_final_report(stats):
             # Pro hezčí výpis uděláme první písmeno velké
             category_name = category_path.capitalize()
             f.write(f"{category_name}: {data['count']} článků (nalezeno pod tagy: {sorted(data['associated_tags'])})\n")
-            
+
     logging.info(f"Finální report byl uložen do souboru: {REPORT_FILE}")
 
-# --- HLAVNÍ SKRIPT ---
-def main():
-    logging.info("="*50 + "\nSpouštím skript V9 s přesným počítáním statistik\n" + "="*50)
-
-    state = load_state()
-    all_urls = load_existing_urls()
-    stats = load_category_stats()
-
-    start_id = 1
-    if state.get("current_tag_in_progress"):
-        start_id = state["current_tag_in_progress"]
-    elif state["completed_tags"]:
-        start_id = max(state["completed_tags"]) + 1
-
-    logging.info(f"Budu pokračovat od tagId: {start_id}")
-
-    for tag_id in range(start_id, TAG_ID_RANGE.stop):
-        if tag_id in state["completed_tags"]:
-            continue
-            
-        sys.stdout.write(f"\rProhledávám tagId: {tag_id}...")
-        sys.stdout.flush()
-
-        page = state["next_page"] if state["current_tag_in_progress"] == tag_id else 1
-        
-        while True:
-            params = {'tagId': tag_id, 'page': page, 'pageSize': PAGE_SIZE}
+# --- ŘÍZENÍ RYCHLOSTI ---
+class RateController:
+    """
+    AIMD regulátor souběžnosti požadavků na API.
+    Úspěšné rychlé odpovědi limit pomalu zvyšují, 429/5xx ho půlí
+    a Retry-After pozastaví všechny požadavky na požadovanou dobu.
+    Tempo navíc hlídá sdílený plánovač domény, takže se API dělí
+    o limit s ostatními crawlery běžícími na ct24.ceskatelevize.cz.
+    """
+    def __init__(self, scheduler, priority=PRIORITY_BACKFILL, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY,
+                 maximum=MAX_CONCURRENCY, target_latency=TARGET_LATENCY):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            while self.in_flight >= int(self.limit):
+                await self._condition.wait()
+            self.in_flight += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.scheduler.acquire(API_ENDPOINT, self.priority)
+
+    async def release(self):
+        self.scheduler.release(API_ENDPOINT)
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        if latency > self.target_latency:
+            self.limit = max(self.minimum, self.limit * SLOW_DECREASE_FACTOR)
+        else:
+            # +1 za každých `limit` úspěšných požadavků (jedno "kolo")
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self, retry_after=None):
+        old_limit = self.limit
+        self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self.scheduler.pause(API_ENDPOINT, retry_after)
+        logging.warning(f"Server nás brzdí, souběžnost {old_limit:.1f} -> {self.limit:.1f}"
+                        + (f", pauza {retry_after:.0f}s" if retry_after else ""))
+
+async def fetch_page(client, controller, tag_id, page):
+    """
+    Stáhne jednu stránku článků tagu. Vrací seznam článků,
+    nebo None pokud se má zbytek tagu přeskočit.
+    """
+    params = {'tagId': tag_id, 'page': page, 'pageSize': PAGE_SIZE}
+    attempt = 0
+    while True:
+        await controller.acquire()
+        started = time.monotonic()
+        try:
+            response = await client.get(API_ENDPOINT, params=params)
+        except httpx.TransportError as e:
+            response = None
+            error = e
+        finally:
+            await controller.release()
+        latency = time.monotonic() - started
+
+        if response is not None and (response.status_code == 429 or response.status_code >= 500):
+            controller.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+            error = f"HTTP {response.status_code}"
+        elif response is not None:
+            if response.status_code >= 400:
+                logging.error(f"CHYBA (ID: {tag_id}, str: {page}): HTTP {response.status_code}. Přeskakuji zbytek rubriky.")
+                return None
+            controller.on_success(latency)
             try:
-                response = requests.get(API_ENDPOINT, params=params, timeout=REQUEST_TIMEOUT)
-                response.raise_for_status()
-                json_data = response.json()
-                articles = json_data.get('data', {}).get('articles', [])
-
-                if not articles:
-                    if page == 1: logging.debug(f"TagId {tag_id} je prázdný.")
-                    else: logging.info(f"\nTagId {tag_id}: Konec článků.")
-                    break
-
-                if page == 1:
-                    sys.stdout.write("\r" + " "*50 + "\r")
-                    logging.info(f"Nalezeny články pod tagId: {tag_id}. Zpracovávám od stránky {page}...")
-
-                # --- ZÁSADNÍ ZMĚNA LOGIKY POČÍTÁNÍ ---
-                for article in articles:
-                    # Sestavení URL a uložení (pokud je nová)
-                    url = build_article_url(article)
-                    if url and url not in all_urls:
-                        all_urls.add(url)
-                        with open(URL_OUTPUT_FILE, 'a', encoding='utf-8') as f: f.write(url + "\n")
-
-                    # Zjištění SKUTEČNÉ rubriky a aktualizace statistik
-                    try:
-                        category_path = article['mainSection']['path']
-                        # Inicializace statistiky pro novou rubriku
-                        if category_path not in stats:
-                            stats[category_path] = {"count": 0, "associated_tags": []}
-                        
-                        # Přičtení článku do správné rubriky
-                        stats[category_path]["count"] += 1
-                        # Zaznamenání, pod kterým tagId jsme tuto rubriku našli
-                        if tag_id not in stats[category_path]["associated_tags"]:
-                            stats[category_path]["associated_tags"].append(tag_id)
-
-                    except (KeyError, TypeError):
-                        logging.warning(f"Článek s id {article.get('id')} nemá platnou strukturu pro určení rubriky.")
-
-                logging.info(f"TagId {tag_id}, Stránka {page}: Zpracováno {len(articles)} článků.")
-                
-                # Uložení stavu a statistik po každé stránce
-                save_category_stats(stats)
-                state["current_tag_in_progress"] = tag_id
-                state["next_page"] = page + 1
-                save_state(state)
-                
-                page += 1
-                time.sleep(SLEEP_BETWEEN_REQUESTS)
-
-            except requests.exceptions.RequestException as e:
-                logging.error(f"\nCHYBA (ID: {tag_id}, str: {page}): {e}. Zkouším znovu za {SLEEP_ON_ERROR}s.")
-                time.sleep(SLEEP_ON_ERROR)
+                return response.json().get('data', {}).get('articles', [])
             except json.JSONDecodeError:
-                logging.error(f"\nCHYBA JSON (ID: {tag_id}, str: {page}). Přeskakuji zbytek rubriky.")
-                break
-        
-        # Aktualizace finálního stavu po dokončení celého tagu
-        if page > 1: # Pokud jsme zpracovali alespoň jednu stránku
-            if tag_id not in state["completed_tags"]:
-                state["completed_tags"].append(tag_id)
-        
-        state["current_tag_in_progress"] = None
-        state["next_page"] = 1
-        save_state(state)
+                logging.error(f"CHYBA JSON (ID: {tag_id}, str: {page}). Přeskakuji zbytek rubriky.")
+                return None
+        else:
+            controller.on_throttle()
+
+        backoff = min(MAX_BACKOFF, 2 ** attempt)
+        attempt += 1
+        logging.error(f"CHYBA (ID: {tag_id}, str: {page}): {error}. Zkouším znovu za {backoff}s.")
+        await asyncio.sleep(backoff)
+
+# --- HLAVNÍ SKRIPT ---
+async def sweep_tag(client, controller, tag_id, start_page, store, known_ids, writer, delta=False, watermark=None):
+    """
+    Projde stránky jednoho tagu popořadě.
+    V inkrementálním režimu (`delta`) skončí na první stránce, kde žádný článek nemá
+    id vyšší než `watermark` tagu z minulého běhu (API vrací nejnovější první);
+    bez watermarku na první stránce s jen známými články. Do statistik počítá jen nové články.
+    Vrací id a datum nejnovějšího článku v tagu (None u prázdného tagu) a příznak,
+    že stahování tagu skončilo chybou (pak None neznamená prázdný tag).
+    """
+    page = start_page
+    newest_id, newest_date = None, None
+    failed = False
+
+    while True:
+        articles = await fetch_page(client, controller, tag_id, page)
+        if articles is None:
+            failed = True
+            break
+        if not articles:
+            if page > 1:
+                logging.info(f"TagId {tag_id}: Konec článků.")
+            break
+
+        if page == 1:
+            logging.info(f"Nalezeny články pod tagId: {tag_id}. Zpracovávám od stránky {page}...")
+
+        page_counts = Counter()
+        new_on_page = 0
+        above_watermark = 0
+        for article in articles:
+            # Sestavení URL a uložení (pokud je článek nový, podle jeho id)
+            url = build_article_url(article)
+            is_new = bool(url) and known_ids.add(int(article['id']))
+            if is_new:
+                writer.write(url)
+                new_on_page += 1
+            if url and (newest_id is None or int(article['id']) > newest_id):
+                newest_id, newest_date = int(article['id']), article_date(article)
+            if url and watermark is not None and int(article['id']) > watermark:
+                above_watermark += 1
+
+            # Zjištění SKUTEČNÉ rubriky pro statistiky
+            if delta and not is_new:
+                continue
+            try:
+                page_counts[article['mainSection']['path']] += 1
+            except (KeyError, TypeError):
+                logging.warning(f"Článek s id {article.get('id')} nemá platnou strukturu pro určení rubriky.")
+
+        logging.info(f"TagId {tag_id}, Stránka {page}: Zpracováno {len(articles)} článků ({new_on_page} nových).")
+
+        # URL musí být na disku dřív, než checkpoint stránku označí za hotovou
+        writer.flush()
+        # Jedna transakce: postup v tagu + přírůstky statistik
+        store.record_page(tag_id, None if delta else page + 1, page_counts)
+
+        # Známé id nestačí: článek mohl být v tomto běhu nalezen už pod jiným tagem
+        if delta and watermark is not None and above_watermark == 0:
+            logging.info(f"TagId {tag_id}: Stránka {page} nemá články novější než watermark {watermark}, končím.")
+            break
+        if delta and watermark is None and new_on_page == 0:
+            logging.info(f"TagId {tag_id}: Stránka {page} obsahuje jen známé články, končím.")
+            break
+        page += 1
+
+    return newest_id, newest_date, failed
+
+async def run_sweep(store):
+    known_ids = load_ct24_ids(URL_OUTPUT_FILE)
+    logging.info(f"Načteno {len(known_ids)} známých článků z '{URL_OUTPUT_FILE}'.")
+
+    # Nejdřív dokončíme rozpracované tagy, pak pokračujeme od posledního místa
+    resumed = store.tags_in_progress()
+    start_id = store.get_meta("next_tag_id", TAG_ID_RANGE.start)
+    logging.info(f"Budu pokračovat od tagId: {start_id} (rozpracovaných tagů: {len(resumed)})")
+
+    pending = list(resumed) + [t for t in range(start_id, TAG_ID_RANGE.stop) if t not in resumed]
+    pending_iter = iter(pending)
+    in_flight = set()
+    probed = 0
+    cursor = start_id
+    last_dispatched = start_id - 1
+
+    def advance_cursor():
+        # Kurzor = nejnižší tag, který ještě není hotový; vše pod ním je prohledané
+        nonlocal cursor
+        unfinished = [t for t in in_flight if t >= start_id and t not in resumed]
+        cursor = min(unfinished) if unfinished else max(cursor, last_dispatched + 1)
+
+    async def worker():
+        nonlocal probed, last_dispatched
+        for tag_id in pending_iter:
+            if store.is_completed(tag_id):
+                continue
+            in_flight.add(tag_id)
+            if tag_id not in resumed:
+                last_dispatched = max(last_dispatched, tag_id)
+
+            newest_id, newest_date, failed = await sweep_tag(client, controller, tag_id, resumed.get(tag_id, 1),
+                                                             store, known_ids, writer)
+            # U obnoveného tagu nemusí být nejnovější článek v tomto běhu vidět;
+            # chyba stahování neznamená prázdný tag, watermark pak neukládáme
+            if not failed and (tag_id not in resumed or newest_id is not None):
+                store.record_watermark(tag_id, newest_id, newest_date)
+
+            # Aktualizace finálního stavu po dokončení celého tagu
+            in_flight.discard(tag_id)
+            advance_cursor()
+            store.complete_tag(tag_id, newest_id is not None or tag_id in resumed, cursor)
+
+            probed += 1
+            if probed % PROGRESS_EVERY == 0:
+                logging.info(f"Prohledáno {probed} tagů, kurzor na tagId {cursor}, "
+                             f"souběžnost {controller.limit:.1f}")
+
+    limits = httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY)
+    with UrlWriter(URL_OUTPUT_FILE) as writer:
+        async with PolitenessScheduler(concurrency=MAX_CONCURRENCY) as scheduler, \
+                httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, http2=True) as client:
+            # Plný průchod je backfill, přednost mají čerstvé články
+            controller = RateController(scheduler, PRIORITY_BACKFILL)
+            await asyncio.gather(*(worker() for _ in range(MAX_CONCURRENCY)))
+
+async def run_delta(store, empty_ttl_days=EMPTY_TAG_TTL_DAYS):
+    """
+    Inkrementální běh: každý tag se prochází od první stránky jen do místa,
+    kde začínají články starší než jeho watermark z minulého běhu. Tagy, které byly minule prázdné, se přeskočí,
+    dokud nevyprší jejich TTL (negativní cache).
+    """
+    known_ids = load_ct24_ids(URL_OUTPUT_FILE)
+    logging.info(f"Načteno {len(known_ids)} známých článků z '{URL_OUTPUT_FILE}'.")
+
+    watermarks = store.load_watermarks()
+    empty_cutoff = time.time() - empty_ttl_days * 86400
+    pending = [
+        tag_id for tag_id in TAG_ID_RANGE
+        if not (tag_id in watermarks and watermarks[tag_id]["is_empty"] and watermarks[tag_id]["last_checked"] > empty_cutoff)
+    ]
+    logging.info(f"Inkrementální běh: kontroluji {len(pending)} tagů, "
+                 f"{len(TAG_ID_RANGE) - len(pending)} prázdných přeskakuji (TTL {empty_ttl_days} dní).")
+    pending_iter = iter(pending)
+    counters = {"probed": 0, "failed": 0, "new_before": len(known_ids)}
+
+    async def worker():
+        for tag_id in pending_iter:
+            watermark = watermarks[tag_id]["newest_id"] if tag_id in watermarks else None
+            newest_id, newest_date, failed = await sweep_tag(client, controller, tag_id, 1, store, known_ids, writer,
+                                                             delta=True, watermark=watermark)
+            # Chybu nesmíme zapsat jako prázdný tag (negativní cache) ani posunout watermark
+            # přes stránky, které se nepodařilo stáhnout; tag se zkontroluje příště znovu
+            if failed:
+                counters["failed"] += 1
+            else:
+                store.record_watermark(tag_id, newest_id, newest_date)
+
+            counters["probed"] += 1
+            if counters["probed"] % PROGRESS_EVERY == 0:
+                logging.info(f"Zkontrolováno {counters['probed']}/{len(pending)} tagů, "
+                             f"nových článků {len(known_ids) - counters['new_before']}, souběžnost {controller.limit:.1f}")
+
+    limits = httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY)
+    with UrlWriter(URL_OUTPUT_FILE) as writer:
+        async with PolitenessScheduler(concurrency=MAX_CONCURRENCY) as scheduler, \
+                httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, http2=True) as client:
+            controller = RateController(scheduler, PRIORITY_FRESH)
+            await asyncio.gather(*(worker() for _ in range(MAX_CONCURRENCY)))
+
+    logging.info(f"Inkrementální běh našel {len(known_ids) - counters['new_before']} nových článků"
+                 f" ({counters['failed']} tagů skončilo chybou, zkontrolují se příště).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Stažení seznamu URL článků ČT24 přes interní API.")
+    parser.add_argument("--since-last-run", action="store_true",
+                        help="Inkrementální běh: v každém tagu jen články novější než při minulém běhu")
+    parser.add_argument("--empty-ttl-days", type=float, default=EMPTY_TAG_TTL_DAYS,
+                        help="Po kolika dnech znovu zkusit tagy, které byly minule prázdné")
+    args = parser.parse_args()
+
+    logging.info("="*50 + "\nSpouštím skript V13 se souběžným procházením a SQLite checkpointem\n" + "="*50)
+
+    store = CheckpointStore(CHECKPOINT_FILE)
+    store.import_json(STATE_FILE, STATS_FILE)
+    try:
+        if args.since_last_run:
+            asyncio.run(run_delta(store, args.empty_ttl_days))
+        else:
+            asyncio.run(run_sweep(store))
+        stats = store.load_category_stats()
+    finally:
+        store.close()
 
     logging.info("\n" + "="*50)
     logging.info("Hotovo! Všechny tagy v rozsahu byly zkontrolovány.")
+    # Statistiky se serializují jen jednou na konci běhu
+    save_category_stats(stats)
     generate_final_report(stats)
     logging.info("="*50)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,290 @@
+"""
+Úložiště stažených článků: shardované gzip JSONL segmenty + SQLite index.
+
+Článek se ukládá pod 64bitovým hashem normalizované URL (stejný jako
+v url_index.py). Podle hashe se vybere shard a článek se připíše na konec
+jeho aktuálního segmentu; každý flush je jeden gzip member s dávkou řádků,
+takže se segment nikdy nepřepisuje. Index drží pro každou URL pozici
+(segment, offset memberu, řádek) a hash obsahu: stejný článek se podruhé
+neuloží, změněný se připíše jako nová verze a index ukáže na ni.
+
+Čtení po jednom (`get`) rozbalí jen jeden member, hromadné čtení
+(`iter_articles`) jde po segmentech sekvenčně a vrací jen platné verze.
+
+Použití:
+    python scraping/article_store.py import scrapnute_clanky
+    python scraping/article_store.py import VYSTUP_clanky.jsonl
+    python scraping/article_store.py stats
+    python scraping/article_store.py get https://ct24.ceskatelevize.cz/clanek/...
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.url_index import url_hash
+
+DEFAULT_STORE_DIR = "VYSTUP_article_store"
+SHARD_COUNT = 16
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+FLUSH_EVERY = 256
+COMPRESS_LEVEL = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url_hash INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    source TEXT,
+    date TEXT,
+    content_hash TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    member_offset INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_position ON articles (segment, member_offset, line);
+"""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _read_member(path: str, offset: int) -> list[bytes]:
+    """Rozbalí jeden gzip member začínající na `offset` a vrátí jeho řádky."""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    data = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while not decompressor.eof:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                break
+            data.append(decompressor.decompress(chunk))
+    return b"".join(data).splitlines()
+
+
+class ArticleStore:
+    """
+    Jeden zapisující proces na úložiště; číst může víc procesů zároveň (SQLite WAL).
+    Zápisy se drží v bufferu a na disk jdou po `FLUSH_EVERY` článcích nebo při `flush()`.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        # Zapisovat smí i jedno pomocné vlákno (batch_scrape, pipeline), nikdy ale dvě souběžně
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._pending = {}  # shard -> [(url_hash, article, content_hash)]
+        self._pending_count = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def __contains__(self, url: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM articles WHERE url_hash = ?", (url_hash(url),)).fetchone() is not None
+
+    # --- Zápis ---
+    def _current_segment(self, shard: int) -> str:
+        """Relativní cesta segmentu, do kterého se v shardu připisuje."""
+        directory = os.path.join(self.root, f"{shard:02x}")
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(glob.glob(os.path.join(directory, "*.jsonl.gz")))
+        number = int(os.path.basename(segments[-1]).split(".")[0]) if segments else 0
+        if segments and os.path.getsize(segments[-1]) >= SEGMENT_MAX_BYTES:
+            number += 1
+        # V indexu vždy s "/", aby úložiště šlo přenést mezi systémy
+        return f"{shard:02x}/{number:06d}.jsonl.gz"
+
+    def put(self, article: dict, source: str | None = None) -> bool:
+        """
+        Přidá článek (musí mít "url" a "content"). Vrací False, pokud je v úložišti
+        nebo v bufferu už stejná verze.
+        """
+        if source and not article.get("source"):
+            article = {**article, "source": source}
+        key = url_hash(article["url"])
+        digest = content_hash(article.get("content", ""))
+
+        shard = key % SHARD_COUNT
+        if any(pending_key == key and pending_digest == digest
+               for pending_key, _, pending_digest in self._pending.get(shard, ())):
+            return False
+        row = self.conn.execute("SELECT content_hash FROM articles WHERE url_hash = ?", (key,)).fetchone()
+        if row and row[0] == digest:
+            return False
+
+        self._pending.setdefault(shard, []).append((key, article, digest))
+        self._pending_count += 1
+        if self._pending_count >= FLUSH_EVERY:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Zapíše buffer: jeden gzip member na shard, pak index v jedné transakci."""
+        if not self._pending_count:
+            return
+        now = time.time()
+        rows = []
+        for shard, items in self._pending.items():
+            segment = self._current_segment(shard)
+            payload = "".join(json.dumps(article, ensure_ascii=False) + "\n" for _, article, _ in items)
+            with open(os.path.join(self.root, segment), "ab") as f:
+                offset = f.tell()
+                f.write(gzip.compress(payload.encode("utf-8"), COMPRESS_LEVEL))
+                f.flush()
+                os.fsync(f.fileno())
+            for line, (key, article, digest) in enumerate(items):
+                rows.append((key, article["url"], article.get("source"), article.get("date"),
+                             digest, segment, offset, line, now))
+
+        # Index až po zápisu dat: useknutý member po pádu jen zůstane neodkazovaný
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO articles (url_hash, url, source, date, content_hash, segment, member_offset, line, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(url_hash) DO UPDATE SET "
+                "url = excluded.url, source = excluded.source, date = excluded.date, "
+                "content_hash = excluded.content_hash, segment = excluded.segment, "
+                "member_offset = excluded.member_offset, line = excluded.line, stored_at = excluded.stored_at",
+                rows,
+            )
+        self._pending.clear()
+        self._pending_count = 0
+
+    # --- Čtení ---
+    def get(self, url: str) -> dict | None:
+        """Vrátí aktuální verzi článku, nebo None."""
+        key = url_hash(url)
+        for pending_key, article, _ in reversed(self._pending.get(key % SHARD_COUNT, [])):
+            if pending_key == key:
+                return article
+        row = self.conn.execute(
+            "SELECT segment, member_offset, line FROM articles WHERE url_hash = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        segment, offset, line = row
+        return json.loads(_read_member(os.path.join(self.root, segment), offset)[line])
+
+    def iter_articles(self, source: str | None = None):
+        """
+        Proudově projde všechny články (jen aktuální verze) v pořadí uložení na disku.
+        Každý member se rozbalí jen jednou a v paměti je vždy jen jeden.
+        """
+        self.flush()
+        query = "SELECT segment, member_offset, line FROM articles"
+        params = ()
+        if source:
+            query += " WHERE source = ?"
+            params = (source,)
+        query += " ORDER BY segment, member_offset, line"
+
+        current, lines = None, []
+        for segment, offset, line in self.conn.execute(query, params):
+            if (segment, offset) != current:
+                current = (segment, offset)
+                lines = _read_member(os.path.join(self.root, segment), offset)
+            yield json.loads(lines[line])
+
+    def stats(self) -> dict:
+        counts = dict(self.conn.execute("SELECT COALESCE(source, '?'), COUNT(*) FROM articles GROUP BY 1"))
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.root, "*", "*.jsonl.gz")))
+        return {"articles": sum(counts.values()), "by_source": counts, "segment_bytes": size}
+
+
+def import_json_dir(store: ArticleStore, directory: str) -> tuple[int, int]:
+    """
+    Převezme staré soubory `{zdroj}_article_*.json` (jeden článek na soubor).
+    Zdroj se doplní z názvu souboru. Vrací (uloženo, přeskočeno).
+    """
+    stored = skipped = 0
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            with open(path, encoding="utf-8") as f:
+                article = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Nelze načíst {path}: {e}")
+            skipped += 1
+            continue
+        name = os.path.basename(path)
+        source = name.split("_article_")[0] if "_article_" in name else None
+        if not article.get("url") or not article.get("content"):
+            skipped += 1
+            continue
+        if store.put(article, source=source):
+            stored += 1
+        else:
+            skipped += 1
+    return stored, skipped
+
+
+def import_jsonl(store: ArticleStore, path: str) -> tuple[int, int]:
+    """Převezme výstup batch_scrape.py (JSON Lines). Vrací (uloženo, přeskočeno)."""
+    stored = skipped = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                article = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            if article.get("url") and article.get("content") and store.put(article):
+                stored += 1
+            else:
+                skipped += 1
+    return stored, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Úložiště stažených článků.")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Adresář úložiště")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Převzít adresář JSON souborů nebo JSONL soubor")
+    import_parser.add_argument("paths", nargs="+")
+    commands.add_parser("stats", help="Počty článků podle zdroje")
+    get_parser = commands.add_parser("get", help="Vypsat článek podle URL")
+    get_parser.add_argument("url")
+    args = parser.parse_args()
+
+    with ArticleStore(args.store) as store:
+        if args.command == "import":
+            for path in args.paths:
+                if os.path.isdir(path):
+                    stored, skipped = import_json_dir(store, path)
+                else:
+                    stored, skipped = import_jsonl(store, path)
+                print(f"✅ {path}: uloženo {stored} článků, přeskočeno {skipped} (duplicity, chyby)")
+        elif args.command == "stats":
+            print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+        else:
+            article = store.get(args.url)
+            if article is None:
+                print("⚠️ Článek v úložišti není.")
+                sys.exit(1)
+            print(json.dumps(article, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Dávkové stahování článků ze seznamu URL.
+
+Načte URL ze souboru (nebo ze stdin), podle domény vybere správný extraktor
+a stahuje články souběžně přes jeden sdílený httpx klient s keep-alive
+spojeními. Extrakce (CPU) běží odděleně v procesním poolu. Hotové články
+se průběžně zapisují jako JSON Lines, nebo s `--store` do shardovaného
+úložiště článků (scraping/article_store.py). Volitelně se surové HTML ukládá do
+cache, ze které jde články později znovu extrahovat bez sítě.
+
+Tempo na jednotlivé domény hlídá sdílený `PolitenessScheduler` (token bucket
+podle robots.txt, společný pro všechny běžící crawlery). Čerstvé články
+(`--priority fresh`) mají přednost před backfillem z jiných běhů.
+
+Použití:
+    python scraping/batch_scrape.py VYSTUP_ct24_urls.txt -o VYSTUP_clanky.jsonl
+    cat urls.txt | python scraping/batch_scrape.py - --per-host 4 -c 64 -w 8
+    python scraping/batch_scrape.py VYSTUP_ct24_urls.txt --cache
+    python scraping/batch_scrape.py VYSTUP_ct24_urls.txt --store
+    python scraping/batch_scrape.py --offline -o VYSTUP_clanky_znovu.jsonl
+    python scraping/batch_scrape.py VYSTUP_sitemap_ct24_urls.txt --priority fresh --rate 4
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+
+# Přidáme kořen projektu do cesty, aby šly importovat jednotlivé scrapery
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR
+from scraping.html_cache import HtmlCache, DEFAULT_CACHE_DIR
+from scraping.politeness import PolitenessScheduler, CrawlFrontier, PRIORITY_FRESH, PRIORITY_BACKFILL, DEFAULT_RATE
+from scraping.url_index import UrlIndex
+from scraping.scrape_ct24 import extract_ct24_article, HEADERS as CT24_HEADERS
+from scraping.scrape_ctk import extract_ctk_article, HEADERS as CTK_HEADERS
+from scraping.scrape_demagog import extract_demagog_article, HEADERS as DEMAGOG_HEADERS
+from scraping.scrape_irozhlas import extract_irozhlas_article, HEADERS as IROZHLAS_HEADERS
+from scraping.scrape_manipulatori import extract_manipulatori_article, HEADERS as MANIPULATORI_HEADERS
+from scraping.scrape_refresher import extract_refresher_article, HEADERS as REFRESHER_HEADERS
+
+# 🗺️ Doména -> (název zdroje, extraktor, hlavičky)
+SOURCES = {
+    "ct24.ceskatelevize.cz": ("ct24", extract_ct24_article, CT24_HEADERS),
+    "www.ceskenoviny.cz": ("ctk", extract_ctk_article, CTK_HEADERS),
+    "demagog.cz": ("demagog", extract_demagog_article, DEMAGOG_HEADERS),
+    "www.irozhlas.cz": ("irozhlas", extract_irozhlas_article, IROZHLAS_HEADERS),
+    "manipulatori.cz": ("manipulatori", extract_manipulatori_article, MANIPULATORI_HEADERS),
+    "refresher.cz": ("refresher", extract_refresher_article, REFRESHER_HEADERS),
+}
+
+DEFAULT_OUTPUT = "VYSTUP_clanky.jsonl"
+DEFAULT_CONCURRENCY = 32
+DEFAULT_PER_HOST = 6
+REQUEST_TIMEOUT = 10
+MAX_RETRIES = 2
+RETRY_BACKOFF = 2.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_MAX_TASKS_PER_CHILD = 200
+PRIORITIES = {"fresh": PRIORITY_FRESH, "backfill": PRIORITY_BACKFILL}
+
+
+def resolve_source(url: str):
+    """
+    Vrátí (zdroj, extraktor, hlavičky) pro danou URL, nebo None pro neznámou doménu.
+    Toleruje variantu domény s i bez "www.".
+    """
+    host = (urlsplit(url).hostname or "").lower()
+    if host in SOURCES:
+        return SOURCES[host]
+    alternative = host[4:] if host.startswith("www.") else f"www.{host}"
+    return SOURCES.get(alternative)
+
+
+def read_urls(path: str):
+    """Postupně čte URL ze souboru nebo ze stdin ("-"), přeskakuje prázdné řádky a duplicity."""
+    seen = UrlIndex()
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in stream:
+            url = line.strip()
+            if not url or url.startswith("#") or not seen.add(url):
+                continue
+            yield url
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def fetch_html(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict,
+    scheduler: PolitenessScheduler,
+    priority: int = PRIORITY_BACKFILL,
+    cache: HtmlCache | None = None,
+) -> str:
+    """
+    Stáhne HTML stránky, při 429/5xx a síťových chybách to zkusí znovu s prodlevou.
+    Každý pokus si bere slot domény u plánovače, 429 doménu pozastaví všem.
+    S cache posílá podmíněný GET a při 304 vrátí uloženou verzi.
+    """
+    request_headers = dict(headers)
+    if cache is not None:
+        request_headers.update(cache.conditional_headers(url))
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with scheduler.slot(url, priority):
+                response = await client.get(url, headers=request_headers)
+            if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                if response.status_code == 429:
+                    scheduler.pause(url, RETRY_BACKOFF * (attempt + 1))
+                await asyncio.sleep(RETRY_BACKOFF * (attempt + 1))
+                continue
+
+            if response.status_code == 304 and cache is not None:
+                html = await asyncio.to_thread(cache.load, url)
+                if html is not None:
+                    await asyncio.to_thread(cache.mark_not_modified, url)
+                    return html
+                # Záznam zmizel, stáhneme stránku znovu bez validátorů
+                request_headers = dict(headers)
+                continue
+
+            response.raise_for_status()
+            if cache is not None:
+                await asyncio.to_thread(cache.store, url, response.text, response.headers)
+            return response.text
+        except httpx.TransportError:
+            if attempt >= MAX_RETRIES:
+                raise
+            await asyncio.sleep(RETRY_BACKOFF * (attempt + 1))
+
+    raise httpx.HTTPError(f"Nepodařilo se stáhnout {url}")
+
+
+async def fetch_one(
+    client: httpx.AsyncClient,
+    url: str,
+    scheduler: PolitenessScheduler | None,
+    priority: int = PRIORITY_BACKFILL,
+    cache: HtmlCache | None = None,
+    offline: bool = False,
+) -> dict:
+    """
+    Fetch fáze: stáhne HTML a vrátí ho spolu s extraktorem zdroje, nebo záznam o chybě.
+    V režimu offline se HTML bere jen z cache a síť se vůbec nepoužije.
+    """
+    source = resolve_source(url)
+    if source is None:
+        return {"url": url, "error": "Nepodporovaná doména"}
+    source_name, extractor, headers = source
+
+    if offline:
+        html = await asyncio.to_thread(cache.load, url)
+        if html is None:
+            return {"url": url, "source": source_name, "error": "Stránka není v cache"}
+        return {"url": url, "source": source_name, "extractor": extractor, "html": html}
+
+    if not await scheduler.allowed(url):
+        return {"url": url, "source": source_name, "error": "Zakázáno v robots.txt"}
+
+    try:
+        html = await fetch_html(client, url, headers, scheduler, priority, cache)
+    except httpx.HTTPError as e:
+        return {"url": url, "source": source_name, "error": str(e)}
+
+    return {"url": url, "source": source_name, "extractor": extractor, "html": html}
+
+
+async def run_batch(
+    urls,
+    output_path: str,
+    fetch_concurrency: int = DEFAULT_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    extract_workers: int | None = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    max_tasks_per_child: int = DEFAULT_MAX_TASKS_PER_CHILD,
+    cache: HtmlCache | None = None,
+    offline: bool = False,
+    priority: int = PRIORITY_BACKFILL,
+    rate: float = DEFAULT_RATE,
+    store: ArticleStore | None = None,
+):
+    """
+    Stáhne všechny URL a výsledky průběžně zapisuje do JSONL souboru,
+    nebo do úložiště článků, pokud je zadané `store`.
+
+    Stahování (I/O) a extrakce (CPU) běží jako dvě oddělené fáze: fetch korutiny
+    předávají surové HTML přes omezenou frontu do ProcessPoolExecutoru, jehož
+    procesy se po `max_tasks_per_child` článcích recyklují (paměť lxml).
+    Zápis do úložiště (gzip, fsync, SQLite) běží v jednom vlákně mimo smyčku,
+    aby nebrzdil rozběhnutá stahování. Chyby se zapisují na stderr, aby výstup
+    obsahoval jen úspěšné články.
+    """
+    if offline and cache is None:
+        raise ValueError("Režim offline vyžaduje cache")
+
+    extract_workers = extract_workers or os.cpu_count() or 1
+    frontier = CrawlFrontier(maxsize=fetch_concurrency * 2)
+    html_queue = asyncio.Queue(maxsize=queue_size)
+    scheduler = None if offline else PolitenessScheduler(default_rate=rate, concurrency=per_host)
+    counters = {"ok": 0, "error": 0}
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+
+    # Jediné vlákno: úložiště má jednoho zapisovatele a puty jdou popořadě
+    store_writer = ThreadPoolExecutor(max_workers=1) if store is not None else None
+
+    async def report(result: dict, out):
+        if "error" in result:
+            counters["error"] += 1
+            print(f"❌ {result['url']}: {result['error']}", file=sys.stderr)
+        else:
+            counters["ok"] += 1
+            if store is not None:
+                await loop.run_in_executor(store_writer, store.put, result)
+            else:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+
+        done = counters["ok"] + counters["error"]
+        if done % 100 == 0:
+            rate = done / max(time.monotonic() - started, 1e-9)
+            print(f"📈 Hotovo {done} URL ({counters['error']} chyb, {rate:.1f} URL/s, fronta HTML {html_queue.qsize()})", file=sys.stderr)
+
+    limits = httpx.Limits(max_connections=fetch_concurrency, max_keepalive_connections=fetch_concurrency)
+    pool = ProcessPoolExecutor(max_workers=extract_workers, max_tasks_per_child=max_tasks_per_child)
+    try:
+        async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, http2=True, follow_redirects=True) as client:
+            with open(output_path, "a", encoding="utf-8") if store is None else contextlib.nullcontext() as out:
+
+                async def fetcher():
+                    while True:
+                        url = await frontier.get()
+                        if url is None:
+                            return
+                        item = await fetch_one(client, url, scheduler, priority, cache, offline)
+                        if "error" in item:
+                            await report(item, out)
+                        else:
+                            # Plná fronta brzdí stahování, dokud extrakce nedožene
+                            await html_queue.put(item)
+
+                async def extract_worker():
+                    while True:
+                        item = await html_queue.get()
+                        if item is None:
+                            return
+                        url, source_name = item["url"], item["source"]
+                        try:
+                            article = await loop.run_in_executor(pool, item["extractor"], item["html"], url)
+                        except Exception as e:
+                            article = None
+                            print(f"❌ Chyba extrakce {url}: {e}", file=sys.stderr)
+
+                        if not article or not article.get("content"):
+                            await report({"url": url, "source": source_name, "error": "Nepodařilo se získat obsah článku"}, out)
+                        else:
+                            await report({"source": source_name, **article}, out)
+
+                fetchers = [asyncio.create_task(fetcher()) for _ in range(fetch_concurrency)]
+                # Dvě korutiny na proces, aby pool nečekal na další práci
+                extractors = [asyncio.create_task(extract_worker()) for _ in range(extract_workers * 2)]
+
+                for url in urls:
+                    await frontier.put(url, priority)
+                await frontier.close()
+                await asyncio.gather(*fetchers)
+
+                for _ in extractors:
+                    await html_queue.put(None)
+                await asyncio.gather(*extractors)
+    finally:
+        pool.shutdown()
+        if scheduler is not None:
+            await scheduler.aclose()
+        if store is not None:
+            store_writer.shutdown()
+            store.flush()
+
+    print(f"✅ Staženo {counters['ok']} článků, {counters['error']} chyb → {store.root if store else output_path}", file=sys.stderr)
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dávkové stahování článků ze seznamu URL.")
+    parser.add_argument("input", nargs="?", help="Soubor s URL (jedna na řádek), nebo '-' pro stdin; v režimu --offline lze vynechat")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="Výstupní JSONL soubor (doplňuje se)")
+    parser.add_argument("-c", "--fetch-concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Celkový počet souběžných stahování")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="Maximum souběžných požadavků na jednu doménu")
+    parser.add_argument("-w", "--extract-workers", type=int, default=None, help="Počet procesů pro extrakci (výchozí: počet jader)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Kapacita fronty stažených HTML čekajících na extrakci")
+    parser.add_argument("--max-tasks-per-child", type=int, default=DEFAULT_MAX_TASKS_PER_CHILD, help="Po kolika článcích se proces extrakce recykluje")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, default=None, help=f"Ukládat surové HTML do cache a posílat podmíněné GET (výchozí adresář: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--offline", action="store_true", help="Znovu extrahovat články jen z cache, bez přístupu k síti")
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE_DIR, default=None, help=f"Ukládat články do úložiště místo JSONL (výchozí adresář: {DEFAULT_STORE_DIR})")
+    parser.add_argument("--priority", choices=list(PRIORITIES), default="backfill", help="Priorita u sdíleného plánovače (fresh má přednost)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Výchozí počet požadavků za sekundu na doménu (Crawl-delay ho může snížit)")
+    args = parser.parse_args()
+
+    if args.offline and args.cache is None:
+        args.cache = DEFAULT_CACHE_DIR
+    if args.input is None and not args.offline:
+        parser.error("Chybí vstupní soubor s URL")
+
+    cache = HtmlCache(args.cache) if args.cache else None
+    # Bez vstupu v režimu offline zpracujeme celou cache
+    urls = read_urls(args.input) if args.input else cache.iter_urls()
+
+    store = ArticleStore(args.store) if args.store else None
+    try:
+        asyncio.run(run_batch(
+            urls,
+            args.output,
+            fetch_concurrency=args.fetch_concurrency,
+            per_host=args.per_host,
+            extract_workers=args.extract_workers,
+            queue_size=args.queue_size,
+            max_tasks_per_child=args.max_tasks_per_child,
+            cache=cache,
+            offline=args.offline,
+            priority=PRIORITIES[args.priority],
+            rate=args.rate,
+            store=store,
+        ))
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Sdílená extrakce článků z HTML pro všechny scrapery.
+
+HTML se parsuje jen jednou do lxml stromu. Nad stejným stromem běží
+trafilatura (obsah i metadata v jednom průchodu) a pokud selže, použijí se
+záložní XPath selektory zaregistrované pro daný zdroj přes `register_fallback`.
+"""
+import lxml.html
+import trafilatura
+from lxml import etree
+
+UNKNOWN_TITLE = "Neznámý titulek"
+UNKNOWN_DATE = "Neznámé datum"
+
+# Parser odpovídá tomu, co používá trafilatura interně
+HTML_PARSER = lxml.html.HTMLParser(
+    collect_ids=False, default_doctype=False, encoding="utf-8", remove_comments=True, remove_pis=True
+)
+
+# 🧩 Záložní selektory: zdroj -> {"title": [...], "date": [...], "content": [...]}
+FALLBACKS = {}
+
+DEFAULT_FALLBACK = {
+    "title": ["//h1"],
+    "date": ["//time/@datetime", "//time"],
+    "content": ["//p"],
+}
+
+
+def has_class(name: str) -> str:
+    """XPath podmínka ekvivalentní CSS selektoru `.name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def register_fallback(source: str, title: list[str], date: list[str], content: list[str]):
+    """
+    Zaregistruje záložní XPath selektory pro zdroj.
+    Každý seznam se zkouší postupně, použije se první výraz s neprázdným výsledkem.
+    """
+    FALLBACKS[source] = {"title": title, "date": date, "content": content}
+
+
+def parse_html(html: str):
+    """Naparsuje HTML text do lxml stromu, při chybě vrátí None."""
+    try:
+        return lxml.html.document_fromstring(html.encode("utf-8"), parser=HTML_PARSER)
+    except (ValueError, etree.ParserError):
+        return None
+
+
+def _node_text(node) -> str:
+    if isinstance(node, str):
+        return node.strip()
+    return node.text_content().strip()
+
+
+def _first_text(tree, expressions: list[str]) -> str | None:
+    for expression in expressions:
+        for node in tree.xpath(expression):
+            text = _node_text(node)
+            if text:
+                return text
+    return None
+
+
+def _joined_text(tree, expressions: list[str]) -> str:
+    for expression in expressions:
+        texts = [_node_text(node) for node in tree.xpath(expression)]
+        content = "\n".join(text for text in texts if text)
+        if content:
+            return content
+    return ""
+
+
+def extract_article(html: str, url: str, source: str | None = None) -> dict:
+    """
+    Vytáhne z HTML titulek, datum a obsah článku.
+    Vrací slovník ve formátu {url, title, date, content}, prázdný při nečitelném HTML.
+    """
+    tree = parse_html(html)
+    if tree is None:
+        return {}
+
+    # ✅ Obsah i metadata z trafilatury nad jedním stromem
+    document = trafilatura.bare_extraction(
+        tree, url=url, include_comments=False, include_tables=False, with_metadata=True
+    )
+
+    if document is not None and document.text:
+        return {
+            "url": url,
+            "title": document.title or UNKNOWN_TITLE,
+            "date": document.date or UNKNOWN_DATE,
+            "content": document.text
+        }
+
+    # ❌ Fallback: zaregistrované selektory nad stejným stromem
+    print("⚠️ Trafilatura selhala, přecházím na záložní selektory...")
+    selectors = FALLBACKS.get(source, DEFAULT_FALLBACK)
+
+    return {
+        "url": url,
+        "title": _first_text(tree, selectors["title"]) or UNKNOWN_TITLE,
+        "date": _first_text(tree, selectors["date"]) or UNKNOWN_DATE,
+        "content": _joined_text(tree, selectors["content"])
+    }
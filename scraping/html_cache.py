@@ -0,0 +1,124 @@
+"""
+Diskový cache surových HTML odpovědí.
+
+Každá stránka je uložená pod sha256 normalizované URL jako gzip soubor
+s JSON hlavičkou vedle (URL, ETag, Last-Modified, čas stažení). Díky tomu
+jde při dalším běhu poslat podmíněný GET a u nezměněných stránek dostat
+jen levné 304, nebo články znovu extrahovat úplně bez sítě.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_CACHE_DIR = "VYSTUP_html_cache"
+
+# Parametry, které nemění obsah stránky
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+
+def normalize_url(url: str) -> str:
+    """Sjednotí URL: malé schéma a host, bez fragmentu, výchozího portu a sledovacích parametrů."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class HtmlCache:
+    def __init__(self, root: str = DEFAULT_CACHE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        key = cache_key(url)
+        directory = os.path.join(self.root, key[:2])
+        return os.path.join(directory, f"{key}.html.gz"), os.path.join(directory, f"{key}.json")
+
+    def get_meta(self, url: str) -> dict | None:
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def load(self, url: str) -> str | None:
+        """Vrátí uložené HTML, nebo None pokud stránka v cache není."""
+        body_path, _ = self._paths(url)
+        try:
+            with gzip.open(body_path, "rt", encoding="utf-8") as f:
+                return f.read()
+        except (FileNotFoundError, EOFError, OSError):
+            return None
+
+    def conditional_headers(self, url: str) -> dict:
+        """Hlavičky If-None-Match / If-Modified-Since pro podmíněný GET."""
+        meta = self.get_meta(url)
+        if not meta:
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, url: str, html: str, headers=None):
+        """Uloží HTML a validátory z hlaviček odpovědi."""
+        headers = headers or {}
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+
+        _write_atomic(body_path, gzip.compress(html.encode("utf-8")))
+        now = time.time()
+        meta = {
+            "url": url,
+            "normalized_url": normalize_url(url),
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "fetched_at": now,
+            "checked_at": now,
+            "size": len(html),
+        }
+        _write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    def mark_not_modified(self, url: str):
+        """Po odpovědi 304 jen poznamená čas poslední kontroly."""
+        meta = self.get_meta(url)
+        if meta is None:
+            return
+        meta["checked_at"] = time.time()
+        _, meta_path = self._paths(url)
+        _write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    def iter_urls(self):
+        """Projde všechny URL uložené v cache."""
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(directory, name), encoding="utf-8") as f:
+                        yield json.load(f)["url"]
+                except (OSError, json.JSONDecodeError, KeyError):
+                    continue
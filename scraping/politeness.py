@@ -0,0 +1,315 @@
+"""
+Sdílený plánovač zdvořilého stahování a prioritní fronta URL (frontier).
+
+`PolitenessScheduler` drží pro každou doménu token bucket (GCRA): rychlost je
+výchozí limit domény, případně nižší podle `Crawl-delay` z robots.txt.
+Čekající požadavky na stejnou doménu se obsluhují podle priority, takže
+čerstvé články mají přednost před backfillem.
+
+Stav bucketů je volitelně ve sdílené SQLite databázi, takže si limit dělí
+všechny současně běžící skripty (batch_scrape, get_all_urls, crawl_archive,
+sitemaps) a dohromady doménu nepřetíží. Cestu lze změnit proměnnou
+prostředí `POLITENESS_DB`, prázdná hodnota sdílení vypne.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+PRIORITY_FRESH = 0
+PRIORITY_BACKFILL = 10
+
+DEFAULT_DB = os.getenv("POLITENESS_DB", "VYSTUP_politeness.sqlite")
+DEFAULT_RATE = 4.0  # požadavků za sekundu na doménu
+DEFAULT_BURST = 8
+DEFAULT_CONCURRENCY = 4
+ROBOTS_TIMEOUT = 10
+USER_AGENT = "FakeNewsScraper"
+
+HEADERS = {
+    "User-Agent": f"Mozilla/5.0 (compatible; {USER_AGENT}/1.0; +https://bezfejku.cz)"
+}
+
+# Ruční limity pro konkrétní domény (požadavků/s)
+HOST_RATES = {}
+
+
+def _robots_url(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/robots.txt"
+
+
+def _parse_robots(lines: list[str]) -> RobotFileParser:
+    robots = RobotFileParser()
+    robots.parse(lines)
+    return robots
+
+
+def _host_interval(host: str, robots: RobotFileParser, default_rate: float) -> float:
+    """Minimální odstup požadavků na doménu: ruční limit, nebo přísnější Crawl-delay."""
+    rate = HOST_RATES.get(host, default_rate)
+    crawl_delay = robots.crawl_delay(USER_AGENT)
+    if crawl_delay:
+        rate = min(rate, 1 / float(crawl_delay))
+    return 1 / rate
+
+
+class _RateLedger:
+    """
+    GCRA (ekvivalent token bucketu) nad "teoretickým časem příchodu" domény.
+    Bez cesty k DB je stav jen v paměti procesu.
+    Volá se z vláken (`asyncio.to_thread`) nad jedním spojením, transakce proto
+    serializuje zámek: dvě vlákna v jednom spojení by si navzájem rušila BEGIN/ROLLBACK.
+    """
+
+    def __init__(self, path: str | None):
+        self._tat = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS host_tat (host TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def reserve(self, host: str, interval: float, burst: int) -> float:
+        """Zarezervuje další slot pro doménu a vrátí, kolik sekund se má počkat."""
+        tolerance = interval * (burst - 1)
+        with self._lock:
+            now = time.time()
+            if self._conn is None:
+                tat = self._tat.get(host, now)
+                slot = max(now, tat - tolerance)
+                self._tat[host] = max(tat, slot) + interval
+                return slot - now
+
+            # BEGIN IMMEDIATE zamkne zápis, takže si dva procesy nevezmou stejný slot
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tat FROM host_tat WHERE host = ?", (host,)).fetchone()
+                tat = row[0] if row else now
+                slot = max(now, tat - tolerance)
+                self._conn.execute(
+                    "INSERT INTO host_tat (host, tat) VALUES (?, ?) ON CONFLICT(host) DO UPDATE SET tat = excluded.tat",
+                    (host, max(tat, slot) + interval),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return slot - now
+
+    def pause(self, host: str, seconds: float, interval: float, burst: int):
+        """Odsune další sloty domény (např. podle Retry-After)."""
+        # `reserve` pouští sloty už od tat - tolerance, první slot tedy padne přesně na konec pauzy
+        until = time.time() + seconds + interval * (burst - 1)
+        with self._lock:
+            if self._conn is None:
+                self._tat[host] = max(self._tat.get(host, 0.0), until)
+                return
+            self._conn.execute(
+                "INSERT INTO host_tat (host, tat) VALUES (?, ?) ON CONFLICT(host) DO UPDATE SET tat = MAX(tat, excluded.tat)",
+                (host, until),
+            )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+
+
+class _HostState:
+    def __init__(self, concurrency: int):
+        self.waiters = []
+        self.dispatching = False
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1 / DEFAULT_RATE
+        self.robots = _parse_robots([])
+        self.robots_loaded = None
+
+
+class PolitenessScheduler:
+    def __init__(self, db_path: str | None = DEFAULT_DB, default_rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST, concurrency: int = DEFAULT_CONCURRENCY, headers: dict | None = None):
+        self.default_rate = default_rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.headers = headers or HEADERS
+        self._ledger = _RateLedger(db_path)
+        self._hosts = {}
+        self._sequence = itertools.count()
+        self._client = None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._ledger.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _state(self, host: str) -> _HostState:
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.concurrency)
+        return self._hosts[host]
+
+    async def _load_robots(self, url: str, state: _HostState):
+        """Jednou za běh načte robots.txt domény a nastaví rychlost podle Crawl-delay."""
+        if state.robots_loaded is None:
+            state.robots_loaded = asyncio.get_running_loop().create_future()
+            try:
+                if self._client is None:
+                    self._client = httpx.AsyncClient(headers=self.headers, timeout=ROBOTS_TIMEOUT, follow_redirects=True)
+                response = await self._client.get(_robots_url(url))
+                if response.status_code == 200:
+                    state.robots = _parse_robots(response.text.splitlines())
+            except httpx.HTTPError:
+                pass
+            finally:
+                # Bez robots.txt platí výchozí limit a vše je povolené
+                state.interval = _host_interval(urlsplit(url).hostname, state.robots, self.default_rate)
+                state.robots_loaded.set_result(None)
+        await state.robots_loaded
+
+    async def allowed(self, url: str) -> bool:
+        """Povoluje robots.txt stažení této URL?"""
+        state = self._state(urlsplit(url).hostname)
+        await self._load_robots(url, state)
+        return state.robots.can_fetch(USER_AGENT, url)
+
+    async def _dispatch(self, host: str, state: _HostState):
+        try:
+            while state.waiters:
+                _, _, future = heapq.heappop(state.waiters)
+                if future.done():
+                    continue
+                try:
+                    wait = await asyncio.to_thread(self._ledger.reserve, host, state.interval, self.burst)
+                except Exception as e:
+                    # Vyzvednutý čekatel by jinak visel navždy; chybu dostane jeho `acquire`
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            state.dispatching = False
+
+    async def acquire(self, url: str, priority: int = PRIORITY_BACKFILL):
+        """Počká na volný slot domény; nižší `priority` se obslouží dřív."""
+        host = urlsplit(url).hostname
+        state = self._state(host)
+        await self._load_robots(url, state)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.waiters, (priority, next(self._sequence), future))
+        if not state.dispatching:
+            state.dispatching = True
+            asyncio.create_task(self._dispatch(host, state))
+        try:
+            await future
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        await state.semaphore.acquire()
+
+    def release(self, url: str):
+        self._state(urlsplit(url).hostname).semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, url: str, priority: int = PRIORITY_BACKFILL):
+        await self.acquire(url, priority)
+        try:
+            yield
+        finally:
+            self.release(url)
+
+    def pause(self, url: str, seconds: float):
+        """Pozastaví doménu pro všechny procesy sdílející plánovač."""
+        host = urlsplit(url).hostname
+        state = self._hosts.get(host)
+        self._ledger.pause(host, seconds, state.interval if state else 1 / self.default_rate, self.burst)
+
+
+_sync_ledger = None
+_sync_intervals = {}
+
+
+def wait_for_slot(url: str):
+    """
+    Blokující varianta pro synchronní skripty (scrape_*.py): počká na další slot
+    domény ve stejném sdíleném bucketu, jaký používá `PolitenessScheduler`.
+    Priority se tu neřeší, požadavek jde na řadu v pořadí příchodu.
+    """
+    global _sync_ledger
+    if _sync_ledger is None:
+        _sync_ledger = _RateLedger(DEFAULT_DB)
+
+    host = urlsplit(url).hostname
+    if host not in _sync_intervals:
+        try:
+            response = httpx.get(_robots_url(url), headers=HEADERS, timeout=ROBOTS_TIMEOUT, follow_redirects=True)
+            lines = response.text.splitlines() if response.status_code == 200 else []
+        except httpx.HTTPError:
+            lines = []
+        _sync_intervals[host] = _host_interval(host, _parse_robots(lines), DEFAULT_RATE)
+
+    wait = _sync_ledger.reserve(host, _sync_intervals[host], DEFAULT_BURST)
+    if wait > 0:
+        time.sleep(wait)
+
+
+class CrawlFrontier:
+    """
+    Omezená prioritní fronta URL s deduplikací.
+    `put` čeká, když je fronta plná; `get` vrátí None po `close()` a vyprázdnění.
+    """
+
+    def __init__(self, maxsize: int = 0, seen=None):
+        self.maxsize = maxsize
+        self.seen = seen
+        self._heap = []
+        self._sequence = itertools.count()
+        self._closed = False
+        self._condition = asyncio.Condition()
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def put(self, url: str, priority: int = PRIORITY_BACKFILL) -> bool:
+        """Přidá URL, vrací False pokud už ve frontě byla (nebo byla zpracována)."""
+        if self.seen is not None and not self.seen.add(url):
+            return False
+        async with self._condition:
+            while self.maxsize and len(self._heap) >= self.maxsize:
+                await self._condition.wait()
+            heapq.heappush(self._heap, (priority, next(self._sequence), url))
+            self._condition.notify_all()
+        return True
+
+    async def get(self) -> str | None:
+        async with self._condition:
+            while not self._heap and not self._closed:
+                await self._condition.wait()
+            if not self._heap:
+                return None
+            _, _, url = heapq.heappop(self._heap)
+            self._condition.notify_all()
+            return url
+
+    async def close(self):
+        async with self._condition:
+            self._closed = True
+            self._condition.notify_all()
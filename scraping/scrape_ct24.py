@@ -1,58 +1,39 @@
 import requests
-from bs4 import BeautifulSoup
 import sys
-import json
-import trafilatura
-import re
-from datetime import datetime
+import os
 
-def scrape_ct24_article(url: str) -> dict:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; FakeNewsScraper/1.0; +https://bezfejku.cz)"
-    }
+# Přidáme kořen projektu do cesty kvůli sdílenému extraktoru
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-    except Exception as e:
-        print(f"Chyba při načítání článku: {e}")
-        return {}
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR
+from scraping.extractor import extract_article, register_fallback, has_class
+from scraping.politeness import wait_for_slot
 
-    # ✅ Nejprve se pokusíme použít trafilatura
-    extracted = trafilatura.extract(response.text, include_comments=False, include_tables=False)
-    metadata = trafilatura.extract_metadata(response.text)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; FakeNewsScraper/1.0; +https://bezfejku.cz)"
+}
 
-    if extracted:
-        return {
-            "url": url,
-            "title": metadata.title if metadata and metadata.title else "Neznámý titulek",
-            "date": metadata.date if metadata and metadata.date else "Neznámé datum",
-            "content": extracted
-        }
+register_fallback(
+    "ct24",
+    title=["//h1"],
+    date=["//time/@datetime"],
+    content=[f"//div[{has_class('article__body')}]/p"],
+)
 
-    # ❌ Pokud trafilatura selže, použijeme fallback přes BeautifulSoup
-    print("⚠️ Trafilatura selhala, přecházím na fallback pomocí BeautifulSoup...")
+def extract_ct24_article(html: str, url: str) -> dict:
+    return extract_article(html, url, source="ct24")
 
+def scrape_ct24_article(url: str) -> dict:
+    # Sdílený limit domény s ostatními běžícími crawlery
+    wait_for_slot(url)
     try:
-        soup = BeautifulSoup(response.text, "lxml")
-    except:
-        soup = BeautifulSoup(response.text, "html.parser")
-
-    title_tag = soup.find("h1")
-    title = title_tag.text.strip() if title_tag else "Neznámý titulek"
-
-    date_tag = soup.find("time")
-    date = date_tag["datetime"] if date_tag and "datetime" in date_tag.attrs else "Neznámé datum"
-
-    paragraphs = soup.select("div.article__body > p")
-    content = "\n".join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
+        response = requests.get(url, headers=HEADERS, timeout=10)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Chyba při načítání článku: {e}")
+        return {}
 
-    return {
-        "url": url,
-        "title": title,
-        "date": date,
-        "content": content
-    }
+    return extract_ct24_article(response.text, url)
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -76,21 +57,9 @@ if __name__ == "__main__":
         print(article_data['content'][:500] + "..." if len(article_data['content']) > 500 else article_data['content'])
         print("\n" + "="*50)
 
-        # Better date handling for filename
-        date_str = article_data['date']
-        if date_str and date_str != "Neznámé datum":
-            # Try to extract a date format that works as a filename
-            # Remove any characters that aren't allowed in filenames
-            safe_date = re.sub(r'[^0-9-]', '_', date_str)
-            if len(safe_date) > 5:  # Ensure we have something meaningful
-                filename = f"ct24_article_{article_data['title']}_{safe_date}.json"
-            else:
-                filename = f"ct24_article_{article_data['title']}_{datetime.now().strftime('%Y-%m-%d')}.json"
-        else:
-            filename = f"ct24_article_{article_data['title']}_{datetime.now().strftime('%Y-%m-%d')}.json"
-            
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(article_data, f, ensure_ascii=False, indent=2)
-        print(f"\nData byla uložena do souboru: {filename}")
+        # Uložení do úložiště článků (klíč = hash URL, žádné kolize názvů souborů)
+        with ArticleStore() as store:
+            is_new = store.put(article_data, source="ct24")
+        print(f"\nČlánek uložen do úložiště: {DEFAULT_STORE_DIR}" if is_new else "\nStejná verze článku už v úložišti je.")
     else:
         print("Nepodařilo se získat obsah článku.")
\ No newline at end of file
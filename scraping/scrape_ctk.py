@@ -1,72 +1,44 @@
 import requests
-from bs4 import BeautifulSoup
 import sys
-import json
-import trafilatura
-import re
-from datetime import datetime
+import os
+
+# Přidáme kořen projektu do cesty kvůli sdílenému extraktoru
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR
+from scraping.extractor import extract_article, register_fallback, has_class
+from scraping.politeness import wait_for_slot
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/124.0.0.0 Safari/537.36"
+    )
+}
+
+register_fallback(
+    "ctk",
+    title=[f"//h1[{has_class('title')}]"],
+    # Datum z metadat nebo z <div class="date">
+    date=["//meta[@property='article:published_time']/@content", f"//div[{has_class('date')}]"],
+    content=[f"(//div[{has_class('article')}])[1]//p"],
+)
+
+def extract_ctk_article(html: str, url: str) -> dict:
+    return extract_article(html, url, source="ctk")
 
 def scrape_ctk_article(url: str) -> dict:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/124.0.0.0 Safari/537.36"
-        )
-    }
-
+    # Sdílený limit domény s ostatními běžícími crawlery
+    wait_for_slot(url)
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = requests.get(url, headers=HEADERS, timeout=10)
         response.raise_for_status()
     except Exception as e:
         print(f"Chyba při načítání článku: {e}")
         return {}
 
-    # ✅ Pokus o extrakci pomocí Trafilatura
-    extracted = trafilatura.extract(response.text, include_comments=False, include_tables=False)
-    metadata = trafilatura.extract_metadata(response.text)
-
-    if extracted:
-        return {
-            "url": url,
-            "title": metadata.title if metadata and metadata.title else "Neznámý titulek",
-            "date": metadata.date if metadata and metadata.date else "Neznámé datum",
-            "content": extracted
-        }
-
-    # ❌ Fallback: BeautifulSoup
-    print("⚠️ Trafilatura selhala, přecházím na fallback pomocí BeautifulSoup...")
-
-    try:
-        soup = BeautifulSoup(response.text, "lxml")
-    except:
-        soup = BeautifulSoup(response.text, "html.parser")
-
-    title_tag = soup.find("h1", class_="title")
-    title = title_tag.text.strip() if title_tag else "Neznámý titulek"
-
-    # Získání data z metadat nebo z <div class="date">
-    date_tag = soup.find("meta", {"property": "article:published_time"})
-    if date_tag and date_tag.has_attr("content"):
-        date = date_tag["content"]
-    else:
-        date_div = soup.find("div", class_="date")
-        date = date_div.get_text(strip=True) if date_div else "Neznámé datum"
-
-    # Obsah článku
-    article_div = soup.find("div", class_="article")
-    if article_div:
-        paragraphs = article_div.find_all("p")
-        content = "\n".join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
-    else:
-        content = ""
-
-    return {
-        "url": url,
-        "title": title,
-        "date": date,
-        "content": content
-    }
+    return extract_ctk_article(response.text, url)
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -90,13 +62,9 @@ if __name__ == "__main__":
         print(article_data['content'][:500] + "..." if len(article_data['content']) > 500 else article_data['content'])
         print("\n" + "="*50)
 
-        # Uložení do souboru
-        safe_title = re.sub(r'[\\/*?:"<>|]', '_', article_data['title'])[:50]
-        safe_date = re.sub(r'[^0-9-]', '_', article_data['date']) if article_data['date'] != "Neznámé datum" else datetime.now().strftime('%Y-%m-%d')
-        filename = f"ctk_article_{safe_title}_{safe_date}.json"
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(article_data, f, ensure_ascii=False, indent=2)
-        print(f"\nData byla uložena do souboru: {filename}")
+        # Uložení do úložiště článků (klíč = hash URL, žádné kolize názvů souborů)
+        with ArticleStore() as store:
+            is_new = store.put(article_data, source="ctk")
+        print(f"\nČlánek uložen do úložiště: {DEFAULT_STORE_DIR}" if is_new else "\nStejná verze článku už v úložišti je.")
     else:
         print("Nepodařilo se získat obsah článku.")
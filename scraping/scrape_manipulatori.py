@@ -1,73 +1,44 @@
 import requests
-from bs4 import BeautifulSoup
 import sys
-import json
-import trafilatura
-import re
-from datetime import datetime
+import os
+
+# Přidáme kořen projektu do cesty kvůli sdílenému extraktoru
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR
+from scraping.extractor import extract_article, register_fallback, has_class
+from scraping.politeness import wait_for_slot
+
+HEADERS = {
+    # Běžný prohlížečový User-Agent (Chrome)
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/124.0.0.0 Safari/537.36"
+    )
+}
+
+register_fallback(
+    "manipulatori",
+    title=[f"//h1[{has_class('tdb-title-text')}]"],
+    date=[f"//time[{has_class('entry-date')}]/@datetime", f"//time[{has_class('entry-date')}]"],
+    content=[f"(//div[{has_class('tdb-block-inner')} and {has_class('td-fix-index')}])[1]//*[self::p or self::h2 or self::li]"],
+)
+
+def extract_manipulatori_article(html: str, url: str) -> dict:
+    return extract_article(html, url, source="manipulatori")
 
 def scrape_manipulatori_article(url: str) -> dict:
-    headers = {
-        # Běžný prohlížečový User-Agent (Chrome)
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/124.0.0.0 Safari/537.36"
-        )
-    }
-
+    # Sdílený limit domény s ostatními běžícími crawlery
+    wait_for_slot(url)
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = requests.get(url, headers=HEADERS, timeout=10)
         response.raise_for_status()
     except Exception as e:
         print(f"Chyba při načítání článku: {e}")
         return {}
 
-    # ✅ Zkus Trafilatura
-    extracted = trafilatura.extract(response.text, include_comments=False, include_tables=False)
-    metadata = trafilatura.extract_metadata(response.text)
-
-    if extracted:
-        return {
-            "url": url,
-            "title": metadata.title if metadata and metadata.title else "Neznámý titulek",
-            "date": metadata.date if metadata and metadata.date else "Neznámé datum",
-            "content": extracted
-        }
-
-    # ❌ Fallback: BeautifulSoup
-    print("⚠️ Trafilatura selhala, přecházím na fallback pomocí BeautifulSoup...")
-
-    try:
-        soup = BeautifulSoup(response.text, "lxml")
-    except:
-        soup = BeautifulSoup(response.text, "html.parser")
-
-    title_tag = soup.find("h1", class_="tdb-title-text")
-    title = title_tag.get_text(strip=True) if title_tag else "Neznámý titulek"
-
-    date_tag = soup.find("time", class_="entry-date")
-    if date_tag and date_tag.has_attr("datetime"):
-        date = date_tag["datetime"]
-    elif date_tag:
-        date = date_tag.get_text(strip=True)
-    else:
-        date = "Neznámé datum"
-
-    # Obsah článku
-    content_container = soup.select_one("div.tdb-block-inner.td-fix-index")
-    if content_container:
-        paragraphs = content_container.find_all(["p", "h2", "li"])
-        content = "\n".join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
-    else:
-        content = ""
-
-    return {
-        "url": url,
-        "title": title,
-        "date": date,
-        "content": content
-    }
+    return extract_manipulatori_article(response.text, url)
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -91,18 +62,9 @@ if __name__ == "__main__":
         print(article_data['content'][:500] + "..." if len(article_data['content']) > 500 else article_data['content'])
         print("\n" + "="*50)
 
-        # Bezpečný název souboru
-        date_str = article_data['date']
-        safe_title = re.sub(r'[\\/*?:"<>|]', '_', article_data['title'])[:50]
-
-        if date_str and date_str != "Neznámé datum":
-            safe_date = re.sub(r'[^0-9-]', '_', date_str)
-            filename = f"manipulatori_article_{safe_title}_{safe_date}.json"
-        else:
-            filename = f"manipulatori_article_{safe_title}_{datetime.now().strftime('%Y-%m-%d')}.json"
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(article_data, f, ensure_ascii=False, indent=2)
-        print(f"\nData byla uložena do souboru: {filename}")
+        # Uložení do úložiště článků (klíč = hash URL, žádné kolize názvů souborů)
+        with ArticleStore() as store:
+            is_new = store.put(article_data, source="manipulatori")
+        print(f"\nČlánek uložen do úložiště: {DEFAULT_STORE_DIR}" if is_new else "\nStejná verze článku už v úložišti je.")
     else:
         print("Nepodařilo se získat obsah článku.")
@@ -1,66 +1,43 @@
 import requests
-from bs4 import BeautifulSoup
 import sys
-import json
-import trafilatura
-import re
-from datetime import datetime
+import os
 
-def scrape_refresher_article(url: str) -> dict:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/124.0.0.0 Safari/537.36"
-        )
-    }
+# Přidáme kořen projektu do cesty kvůli sdílenému extraktoru
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-    except Exception as e:
-        print(f"Chyba při načítání článku: {e}")
-        return {}
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR
+from scraping.extractor import extract_article, register_fallback, has_class
+from scraping.politeness import wait_for_slot
 
-    # ✅ Zkusit trafilatura
-    extracted = trafilatura.extract(response.text, include_comments=False, include_tables=False)
-    metadata = trafilatura.extract_metadata(response.text)
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/124.0.0.0 Safari/537.36"
+    )
+}
 
-    if extracted:
-        return {
-            "url": url,
-            "title": metadata.title if metadata and metadata.title else "Neznámý titulek",
-            "date": metadata.date if metadata and metadata.date else "Neznámé datum",
-            "content": extracted
-        }
+register_fallback(
+    "refresher",
+    title=[f"//h1[{has_class('article-title')}]"],
+    date=["//time/@datetime"],
+    content=[f"(//div[{has_class('article-content')}])[1]//*[self::p or self::h2 or self::li]"],
+)
 
-    # ❌ Fallback – BeautifulSoup
-    print("⚠️ Trafilatura selhala, přecházím na fallback pomocí BeautifulSoup...")
+def extract_refresher_article(html: str, url: str) -> dict:
+    return extract_article(html, url, source="refresher")
 
+def scrape_refresher_article(url: str) -> dict:
+    # Sdílený limit domény s ostatními běžícími crawlery
+    wait_for_slot(url)
     try:
-        soup = BeautifulSoup(response.text, "lxml")
-    except:
-        soup = BeautifulSoup(response.text, "html.parser")
-
-    title_tag = soup.find("h1", class_="article-title")
-    title = title_tag.get_text(strip=True) if title_tag else "Neznámý titulek"
-
-    date_tag = soup.find("time")
-    date = date_tag["datetime"] if date_tag and date_tag.has_attr("datetime") else "Neznámé datum"
-
-    content_div = soup.find("div", class_="article-content")
-    if content_div:
-        paragraphs = content_div.find_all(["p", "h2", "li"])
-        content = "\n".join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
-    else:
-        content = ""
+        response = requests.get(url, headers=HEADERS, timeout=10)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Chyba při načítání článku: {e}")
+        return {}
 
-    return {
-        "url": url,
-        "title": title,
-        "date": date,
-        "content": content
-    }
+    return extract_refresher_article(response.text, url)
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -84,13 +61,9 @@ if __name__ == "__main__":
         print(article_data['content'][:500] + "..." if len(article_data['content']) > 500 else article_data['content'])
         print("\n" + "="*50)
 
-        # Uložit do souboru
-        safe_title = re.sub(r'[\\/*?:"<>|]', '_', article_data['title'])[:50]
-        safe_date = re.sub(r'[^0-9-]', '_', article_data['date']) if article_data['date'] != "Neznámé datum" else datetime.now().strftime('%Y-%m-%d')
-        filename = f"refresher_article_{safe_title}_{safe_date}.json"
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(article_data, f, ensure_ascii=False, indent=2)
-        print(f"\nData byla uložena do souboru: {filename}")
+        # Uložení do úložiště článků (klíč = hash URL, žádné kolize názvů souborů)
+        with ArticleStore() as store:
+            is_new = store.put(article_data, source="refresher")
+        print(f"\nČlánek uložen do úložiště: {DEFAULT_STORE_DIR}" if is_new else "\nStejná verze článku už v úložišti je.")
     else:
         print("Nepodařilo se získat obsah článku.")
@@ -0,0 +1,243 @@
+"""
+Objevování URL článků ze sitemap všech podporovaných zdrojů.
+
+Sitemap indexy i jednotlivé archivy se stahují souběžně a zpracovávají
+proudově: gzip se rozbaluje po kouscích a XML se parsuje inkrementálně
+(lxml XMLPullParser, feed varianta iterparse), takže ani velký archiv
+není celý v paměti. Podle <lastmod> se přeskakují celé archivy i URL,
+které se od minulého běhu nezměnily. Výsledkem je soubor URL (frontier)
+pro každý zdroj, vhodný jako vstup pro batch_scrape.py. Stahování sitemap
+jde přes sdílený plánovač (scraping/politeness.py) s prioritou čerstvých článků.
+
+Použití:
+    python scraping/sitemaps.py                     # všechny zdroje, jen změny od minula
+    python scraping/sitemaps.py ct24 irozhlas --full
+    python scraping/sitemaps.py demagog --since 2025-01-01
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timezone
+
+import httpx
+from lxml import etree
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.politeness import PolitenessScheduler, PRIORITY_FRESH
+from scraping.url_index import UrlWriter, load_url_index
+
+# 🗺️ Zdroj -> výchozí sitemapy (doplní se o řádky "Sitemap:" z robots.txt)
+SITEMAP_SOURCES = {
+    "ct24": ["https://ct24.ceskatelevize.cz/sitemaps/sitemap.xml"],
+    "ctk": ["https://www.ceskenoviny.cz/sitemap.xml"],
+    "irozhlas": ["https://www.irozhlas.cz/sitemap.xml"],
+    "demagog": ["https://demagog.cz/sitemap.xml"],
+    "manipulatori": ["https://manipulatori.cz/sitemap_index.xml"],
+    "refresher": ["https://refresher.cz/sitemap.xml"],
+}
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; FakeNewsScraper/1.0; +https://bezfejku.cz)"
+}
+
+STATE_FILE = "VYSTUP_sitemap_state.json"
+OUTPUT_TEMPLATE = "VYSTUP_sitemap_{source}_urls.txt"
+DEFAULT_CONCURRENCY = 8
+REQUEST_TIMEOUT = 60
+
+
+def parse_lastmod(value: str | None) -> datetime | None:
+    """Převede W3C datum ze sitemapy na datetime v UTC (bez zóny = UTC)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _child_text(element, name: str) -> str | None:
+    for child in element:
+        if isinstance(child.tag, str) and etree.QName(child).localname == name:
+            return (child.text or "").strip() or None
+    return None
+
+
+async def robots_sitemaps(client: httpx.AsyncClient, base_url: str) -> list[str]:
+    """Vrátí sitemapy uvedené v robots.txt domény."""
+    origin = httpx.URL(base_url).copy_with(path="/robots.txt", query=None, fragment=None)
+    try:
+        response = await client.get(origin, headers=HEADERS)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return []
+    return [
+        line.split(":", 1)[1].strip()
+        for line in response.text.splitlines()
+        if line.lower().startswith("sitemap:")
+    ]
+
+
+async def stream_sitemap(client: httpx.AsyncClient, scheduler: PolitenessScheduler, url: str):
+    """
+    Proudově stáhne a naparsuje jednu sitemapu.
+    Vrací seznam (druh, loc, lastmod), kde druh je "sitemap" (odkaz z indexu) nebo "url".
+    """
+    parser = etree.XMLPullParser(events=("end",), tag=("{*}url", "{*}sitemap"), recover=True, resolve_entities=False)
+    decompressor = None
+    entries = []
+
+    def drain():
+        for _, element in parser.read_events():
+            kind = etree.QName(element).localname
+            loc = _child_text(element, "loc")
+            if loc:
+                entries.append((kind, loc, parse_lastmod(_child_text(element, "lastmod"))))
+            # Uvolníme zpracované elementy, aby strom nerostl
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    async with scheduler.slot(url, PRIORITY_FRESH), client.stream("GET", url, headers=HEADERS) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if decompressor is None:
+                # .gz archivy chodí bez Content-Encoding, poznáme je podle magických bajtů
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32) if chunk[:2] == b"\x1f\x8b" else False
+            parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+            drain()
+        if decompressor:
+            parser.feed(decompressor.flush())
+    parser.close()
+    drain()
+    return entries
+
+
+async def discover_source(client: httpx.AsyncClient, scheduler: PolitenessScheduler, source: str,
+                          since: datetime | None, concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """
+    Projde sitemapy zdroje a nové URL připíše do jeho frontier souboru.
+    Archivy ani URL s <lastmod> starším než `since` se nezpracovávají.
+    """
+    output_path = OUTPUT_TEMPLATE.format(source=source)
+    known = load_url_index(output_path)
+    counters = {"sitemaps": 0, "skipped_sitemaps": 0, "urls": 0, "new": 0, "errors": 0}
+
+    start_urls = list(SITEMAP_SOURCES[source])
+    for url in await robots_sitemaps(client, start_urls[0]):
+        if url not in start_urls:
+            start_urls.append(url)
+
+    queue = asyncio.Queue()
+    queued = set(start_urls)
+    for url in start_urls:
+        queue.put_nowait(url)
+
+    with UrlWriter(output_path) as writer:
+
+        async def worker():
+            while True:
+                sitemap_url = await queue.get()
+                try:
+                    entries = await stream_sitemap(client, scheduler, sitemap_url)
+                    counters["sitemaps"] += 1
+                except Exception as e:
+                    counters["errors"] += 1
+                    print(f"❌ {source}: {sitemap_url}: {e}", file=sys.stderr)
+                    entries = []
+
+                for kind, loc, lastmod in entries:
+                    if since is not None and lastmod is not None and lastmod < since:
+                        if kind == "sitemap":
+                            counters["skipped_sitemaps"] += 1
+                        continue
+                    if kind == "sitemap":
+                        if loc not in queued:
+                            queued.add(loc)
+                            queue.put_nowait(loc)
+                    else:
+                        counters["urls"] += 1
+                        if known.add(loc):
+                            writer.write(loc)
+                            counters["new"] += 1
+                writer.flush()
+                queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        await queue.join()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    print(f"✅ {source}: {counters['sitemaps']} sitemap ({counters['skipped_sitemaps']} přeskočeno), "
+          f"{counters['urls']} změněných URL, {counters['new']} nových → {output_path}", file=sys.stderr)
+    return counters
+
+
+def load_state() -> dict:
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state: dict):
+    with open(STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+
+
+async def run_discovery(sources: list[str], since: datetime | None = None, full: bool = False,
+                        concurrency: int = DEFAULT_CONCURRENCY):
+    """Spustí objevování pro více zdrojů najednou a u zdrojů bez chyb uloží čas běhu pro příští inkrement."""
+    state = load_state()
+    started = datetime.now(timezone.utc)
+
+    limits = httpx.Limits(max_connections=concurrency * len(sources), max_keepalive_connections=concurrency * len(sources))
+    async with PolitenessScheduler(concurrency=concurrency) as scheduler, \
+            httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, http2=True, follow_redirects=True) as client:
+
+        async def run_source(source):
+            source_since = since
+            if source_since is None and not full and state.get(source):
+                source_since = parse_lastmod(state[source])
+            counters = await discover_source(client, scheduler, source, source_since, concurrency)
+            # Při chybě watermark neposouváme, jinak by nestažená sitemap příště spadla pod `since`
+            if counters["errors"] == 0:
+                state[source] = started.isoformat()
+            else:
+                print(f"⚠️ {source}: {counters['errors']} chyb, čas běhu se neukládá (příště se zopakuje)", file=sys.stderr)
+
+        await asyncio.gather(*(run_source(source) for source in sources))
+
+    save_state(state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Objevování URL článků ze sitemap.")
+    parser.add_argument("sources", nargs="*", help=f"Zdroje (výchozí: všechny): {', '.join(SITEMAP_SOURCES)}")
+    parser.add_argument("--since", help="Jen URL s <lastmod> od tohoto data (ISO 8601)")
+    parser.add_argument("--full", action="store_true", help="Ignorovat čas minulého běhu a projít vše")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Souběžná stahování sitemap na zdroj")
+    args = parser.parse_args()
+
+    unknown = [source for source in args.sources if source not in SITEMAP_SOURCES]
+    if unknown:
+        parser.error(f"Neznámé zdroje: {', '.join(unknown)}")
+    since = parse_lastmod(args.since) if args.since else None
+    if args.since and since is None:
+        parser.error(f"Neplatné datum: {args.since}")
+
+    asyncio.run(run_discovery(args.sources or list(SITEMAP_SOURCES), since, args.full, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Kompaktní indexy pro deduplikaci URL.
+
+Místo množiny celých URL řetězců (stovky bajtů na položku) se drží jen
+64bitová čísla v seřazeném NumPy poli `int64`:
+- `IdIndex` pro zdroje s číselným id článku (ČT24),
+- `UrlIndex` pro ostatní zdroje přes 64bitový hash normalizované URL,
+  volitelně s Bloom filtrem před vyhledáváním.
+Nové URL se zapisují přes jeden bufferovaný `UrlWriter`.
+"""
+import hashlib
+import math
+import re
+
+import numpy as np
+
+from scraping.html_cache import normalize_url
+
+# Kolik nových položek se drží v bufferu, než se slijí do seřazeného pole;
+# u velkého indexu roste buffer s polem, aby slévání nekopírovalo pole příliš často
+MERGE_THRESHOLD = 50_000
+MERGE_FRACTION = 8
+WRITE_BUFFER_SIZE = 1 << 16
+
+CT24_ARTICLE_ID_RE = re.compile(r"-(\d+)/?$")
+
+
+def ct24_article_id(url: str) -> int | None:
+    """Vytáhne číselné id z URL článku ČT24 (`.../{slug}-{id}`)."""
+    match = CT24_ARTICLE_ID_RE.search(url.strip())
+    return int(match.group(1)) if match else None
+
+
+def url_hash(url: str) -> int:
+    """64bitový (znaménkový) hash normalizované URL."""
+    digest = hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class IdIndex:
+    """Množina 64bitových čísel: seřazené pole `int64` + malý buffer nově přidaných."""
+
+    def __init__(self):
+        self._sorted = np.empty(0, dtype=np.int64)
+        self._pending = set()
+
+    def __len__(self):
+        return len(self._sorted) + len(self._pending)
+
+    def __contains__(self, value: int) -> bool:
+        if value in self._pending:
+            return True
+        position = int(np.searchsorted(self._sorted, value))
+        return position < len(self._sorted) and int(self._sorted[position]) == value
+
+    def add(self, value: int) -> bool:
+        """Přidá hodnotu, vrací False pokud už v indexu byla."""
+        if value in self:
+            return False
+        self._pending.add(value)
+        if len(self._pending) >= max(MERGE_THRESHOLD, len(self._sorted) // MERGE_FRACTION):
+            self._merge()
+        return True
+
+    def _merge(self):
+        # Buffer je disjunktní s polem (add kontroluje členství), stačí vložit na místa z searchsorted
+        pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+        pending.sort()
+        self._sorted = np.insert(self._sorted, np.searchsorted(self._sorted, pending), pending)
+        self._pending.clear()
+
+
+class BloomFilter:
+    """Jednoduchý Bloom filtr nad bytearray s double hashingem."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        # m = -n ln(p) / ln(2)^2, k = m/n ln(2)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: int):
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) & 0xFFFFFFFF | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: int):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: int) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class UrlIndex:
+    """Deduplikace libovolných URL přes 64bitový hash, volitelně s Bloom filtrem."""
+
+    def __init__(self, bloom_capacity: int | None = None):
+        self._ids = IdIndex()
+        self._bloom = BloomFilter(bloom_capacity) if bloom_capacity else None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, url: str) -> bool:
+        value = url_hash(url)
+        # Bloom filtr levně odfiltruje většinu nových URL bez bisect
+        if self._bloom is not None and value not in self._bloom:
+            return False
+        return value in self._ids
+
+    def add(self, url: str) -> bool:
+        value = url_hash(url)
+        if self._bloom is not None:
+            self._bloom.add(value)
+        return self._ids.add(value)
+
+
+def load_ct24_ids(path: str) -> IdIndex:
+    """Načte id článků z existujícího souboru URL ČT24 (řádek po řádku)."""
+    index = IdIndex()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                article_id = ct24_article_id(line)
+                if article_id is not None:
+                    index.add(article_id)
+    except FileNotFoundError:
+        pass
+    return index
+
+
+def load_url_index(path: str, bloom_capacity: int | None = None) -> UrlIndex:
+    """Načte existující soubor URL do hashovaného indexu."""
+    index = UrlIndex(bloom_capacity)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    index.add(line.strip())
+    except FileNotFoundError:
+        pass
+    return index
+
+
+class UrlWriter:
+    """Jeden otevřený bufferovaný soubor pro připisování URL."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'a', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+
+    def write(self, url: str):
+        self._file.write(url + "\n")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
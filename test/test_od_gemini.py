@@ -3,6 +3,12 @@ from bs4 import BeautifulSoup
 from datetime import date, timedelta
 import time
 import os
+import sys
+
+# Přidáme kořen projektu do cesty kvůli sdílenému plánovači
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.politeness import wait_for_slot
 
 # Adresa, na kterou budeme posílat požadavky
 SEARCH_URL = "https://ct24.ceskatelevize.cz/hledat"
@@ -36,7 +42,6 @@ def get_links_from_page(html_content):
 # Nejprve navštívíme stránku, abychom dostali cookies
 print("Inicializuji session...")
 session.get(SEARCH_URL)
-time.sleep(1)
 
 # Nastavíme rozsah dat
 start_date = date(2005, 5, 2)
@@ -53,6 +58,8 @@ while current_date <= end_date:
         params = {'q': '', 'from': date_str, 'to': date_str, 'page': page_num}
         
         try:
+            # Tempo hlídá sdílený plánovač domény místo pevné prodlevy
+            wait_for_slot(SEARCH_URL)
             response = session.get(SEARCH_URL, params=params, timeout=10)
             if not response.ok:
                 print(f"  Chyba {response.status_code} na stránce {page_num}. Přeskakuji.")
@@ -76,7 +83,6 @@ while current_date <= end_date:
                 break # Konec vnitřní smyčky, jdeme na další den
             
             page_num += 1
-            time.sleep(1.5) # Důležitá prodleva!
 
         except requests.RequestException as e:
             print(f"  Nastala chyba při stahování: {e}. Zkusím to znovu za 10s.")
@@ -8,32 +8,46 @@ from datetime import datetime
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.chunking import split_text_smart
-from utils.embedding import get_embedding
+from utils.embedding import get_embeddings, get_cache
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR
+from scraping.url_index import url_hash
+from utils.near_duplicates import DedupIndex
+from utils.lexical_index import LexicalIndex
+from utils.qdrant import chunk_hash, point_id_for
+from utils.vector_files import VectorWriter, DEFAULT_OUTPUT_DIR
 from pprint import pprint
 
-def save_results_to_json(results, original_path):
-    """Uloží výsledky do JSON souboru"""
-    # Vytvoříme adresář pro výstup, pokud neexistuje
-    output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'processed_data'))
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Vytvoříme název výstupního souboru
-    base_name = os.path.basename(original_path)
-    filename_without_ext = os.path.splitext(base_name)[0]
+def output_directory(name: str) -> str:
+    """Adresář výstupu (vectors.npy + metadata.jsonl) v processed_data"""
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    output_file = os.path.join(output_dir, f"{filename_without_ext}_processed_{timestamp}.json")
-    
-    # Uložíme výsledky do JSON souboru
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
-    
-    print(f"✅ Výsledky uloženy do: {output_file}")
-    return output_file
+    return os.path.join(DEFAULT_OUTPUT_DIR, f"{name}_processed_{timestamp}")
+
+def save_results(results, writer: VectorWriter):
+    """Připíše chunky článku do výstupu: vektory do .npy, zbytek do metadata.jsonl"""
+    for result in results:
+        extra = {key: result[key] for key in ("duplicate_of", "error") if key in result}
+        writer.add(result["chunk"], result["embedding"], result["metadata"], **extra)
+    writer.flush()
 
 def process_article_json(json_path: str):
     with open(json_path, encoding="utf-8") as f:
         article = json.load(f)
+    output_dir = output_directory(os.path.splitext(os.path.basename(json_path))[0])
+    with DedupIndex() as dedup, VectorWriter(output_dir) as writer, LexicalIndex() as lexical:
+        process_article(article, json_path, dedup, writer, lexical)
+    print(f"✅ Výsledky uloženy do: {output_dir}")
+    return output_dir
 
+def process_article(article: dict, json_path: str, dedup: DedupIndex, writer: VectorWriter,
+                    lexical: LexicalIndex | None = None):
+    """
+    Rozdělí článek na chunky, spočítá embeddingy a připíše je do `writer`; `json_path` slouží k určení zdroje.
+    S `lexical` se nové chunky zaindexují i pro fulltextové hledání.
+    Duplicitní chunky (i převzaté zpravodajství jiného zdroje) embedding nedostanou,
+    jen odkaz `duplicate_of` na id bodu originálu. Originálem se chunk stane až po
+    nahrání výstupu do Qdrantu (`upload_output`), ne už tady. Celý článek se jako
+    zpracovaný zaregistruje jen tehdy, když embedding dostaly všechny jeho chunky.
+    """
     title = article.get("title", "bez titulku")
     content = article.get("content", "")
     url = article.get("url", "")
@@ -49,6 +63,14 @@ def process_article_json(json_path: str):
         print("⚠️ Článek neobsahuje obsah (content).")
         return
 
+    # Znovu stažený nezměněný článek se nezpracovává vůbec
+    original = dedup.find("article", content)
+    if original and original[0] == url and original[1] == 1.0:
+        print(f"⏭️ Článek se od minulého zpracování nezměnil, přeskakuji: {title}")
+        return
+    if original:
+        print(f"♻️ Článek je z {original[1]:.0%} shodný s {original[0]}, embeddingy se spočítají jen pro nové chunky.")
+
     print(f"🔎 Zpracovávám článek: {title}")
     chunks = split_text_smart(content)
 
@@ -56,7 +78,6 @@ def process_article_json(json_path: str):
 
     results = []
     for i, chunk in enumerate(chunks):
-        embedding = get_embedding(chunk)
         meta = {
             "title": title,
             "url": url,
@@ -65,18 +86,62 @@ def process_article_json(json_path: str):
             "chunk_index": i,
             "chunk_length": len(chunk),
         }
+
+        duplicate = dedup.find("chunk", chunk)
+        if duplicate:
+            results.append({
+                "chunk": chunk,
+                "embedding": None,
+                "duplicate_of": duplicate[0],
+                "metadata": meta
+            })
+            continue
+
+        # Id bodu pro Qdrant je známé předem (odvozené z URL, pořadí a obsahu),
+        # aby na něj mohly odkazovat pozdější duplicity a opakované nahrání nic nezdvojilo
+        meta["content_hash"] = chunk_hash(chunk)
+        meta["point_id"] = point_id_for(url, i, meta["content_hash"])
         results.append({
             "chunk": chunk,
-            "embedding": embedding,
+            "embedding": None,
             "metadata": meta
         })
 
+    # Všechny nové chunky článku jedním dávkovým voláním
+    pending = [result for result in results if not result.get("duplicate_of")]
+    hits_before = get_cache().hits
+    embeddings = get_embeddings([result["chunk"] for result in pending], return_exceptions=True)
+    print(f"💾 Embeddingů z cache: {get_cache().hits - hits_before}/{len(pending)}")
+    for result, embedding in zip(pending, embeddings):
+        if isinstance(embedding, Exception):
+            result["error"] = str(embedding)
+            print(f"❌ Chunk {result['metadata']['chunk_index']}: {embedding}")
+            continue
+        result["embedding"] = embedding
+
+    if lexical is not None:
+        lexical.add_chunks([
+            (result["metadata"]["point_id"], result["chunk"], result["metadata"])
+            for result in pending if result["embedding"] is not None
+        ])
+
+    duplicates = sum(1 for result in results if result.get("duplicate_of"))
+    print(f"🧬 Duplicitních chunků: {duplicates}/{len(results)} (bez nového embeddingu)")
+
     print("📊 Ukázka prvních 2 chunků:")
-    pprint(results[:2])
+    pprint([{**result, "embedding": (result["embedding"] or [])[:5]} for result in results[:2]])
     
     # Uložíme výsledky
-    output_file = save_results_to_json(results, json_path)
-    return output_file
+    save_results(results, writer)
+
+    # Článek se jako zpracovaný zaregistruje až s kompletním výstupem na disku;
+    # s chybou embeddingu se příští běh nepřeskočí, aby chybějící chunky dopočítal
+    failed = sum(1 for result in results if "error" in result)
+    if failed:
+        print(f"⚠️ {failed} chunků bez embeddingu, článek se příště zpracuje znovu.")
+    elif original is None or original[1] < 1.0:
+        dedup.add("article", content, url)
+    return results
 
 def find_similar_file(partial_path):
     """Pokusí se najít podobný soubor, pokud přesný název není nalezen"""
@@ -98,7 +163,21 @@ def find_similar_file(partial_path):
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Použití: python test_pipeline.py \"cesta/k/clanku.json\"")
+        print("         python test_pipeline.py --store [adresář úložiště]")
         sys.exit(1)
+
+    # Zpracování všech článků z úložiště (proudově, po jednom)
+    if sys.argv[1] == "--store":
+        store_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORE_DIR
+        output_dir = output_directory(os.path.basename(os.path.normpath(store_dir)))
+        # Celé úložiště do jednoho výstupu, vektory se zapisují průběžně
+        with ArticleStore(store_dir) as store, DedupIndex() as dedup, VectorWriter(output_dir) as writer, \
+                LexicalIndex() as lexical:
+            for article in store.iter_articles():
+                name = f"{article.get('source', 'unknown')}_article_{url_hash(article['url']) & 0xFFFFFFFFFFFFFFFF:016x}.json"
+                process_article(article, name, dedup, writer, lexical)
+        print(f"✅ Výsledky uloženy do: {output_dir}")
+        sys.exit(0)
         
     # Pokud je více argumentů, spojíme je - to řeší problém s mezerami v názvu souboru
     if len(sys.argv) > 2:
@@ -1,14 +1,22 @@
+import asyncio
+import hashlib
+import json
 import os
+import re
+import sqlite3
 from dotenv import load_dotenv
 import openai
-from typing import List
+from openai import AsyncOpenAI
+from typing import List, Tuple
+
+from utils.embedding import count_tokens
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
 
-# 🧱 Heuristické rozdělení po 2 odstavcích s překryvem
-def split_text_heuristically(text: str, chunk_size: int = 2, overlap: float = 0.3) -> List[str]:
+# 🧱 Heuristické rozdělení po 2 odstavcích (volitelně s překryvem celých odstavců)
+def split_text_heuristically(text: str, chunk_size: int = 2, overlap: float = 0.0) -> List[str]:
     paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
     if not paragraphs:
         return []
@@ -20,50 +28,243 @@ def split_text_heuristically(text: str, chunk_size: int = 2, overlap: float = 0.
         chunk = "\n".join(paragraphs[i:i + chunk_size])
         if chunk:
             chunks.append(chunk.strip())
+        # Poslední okno už obsahuje konec textu, další by byl jen jeho kus
+        if i + chunk_size >= len(paragraphs):
+            break
 
     return chunks
 
-# 🤖 Pokud chunk vypadá podezřele, pošleme ho do LLM pro lepší rozdělení
-def llm_refine_chunk(text: str) -> List[str]:
-    prompt = f"""
-Rozděl následující text na kratší ucelené bloky (chunky) tak, aby každý obsahoval logicky propojené informace. Každý blok může obsahovat 1–3 odstavce. Přidej 1–2 věty překryvu mezi bloky, pokud je to vhodné.
+# 📏 Dělení podle tokenů: odstavce a české věty se skládají do chunků
+# s cílovou velikostí `target_tokens` (nikdy víc než `max_tokens`)
+# a s překryvem posledních vět předchozího chunku do `overlap_tokens`.
+TARGET_TOKENS = 350
+MAX_CHUNK_TOKENS = 500
+OVERLAP_TOKENS = 50
+
+# Zkratky, za kterými tečka neukončuje větu
+CZECH_ABBREVIATIONS = {
+    "tj", "tzv", "tzn", "např", "resp", "mj", "atd", "apod", "aj", "popř", "př", "vč", "cca", "ev",
+    "čl", "č", "odst", "písm", "str", "s", "r", "roč", "st", "sv", "min", "hod", "tis", "mil", "mld", "kč",
+    "ing", "mgr", "bc", "mudr", "judr", "phdr", "rndr", "doc", "prof", "dr", "gen", "plk", "pplk", "mjr",
+    "kpt", "por", "npor", "p", "pí", "ml",
+}
+SENTENCE_END_RE = re.compile(r'[.!?…]+["“”»)]*\s+(?=["„“«(]?[A-ZÁČĎÉĚÍŇÓŘŠŤÚŮÝŽ0-9])')
+LAST_WORD_RE = re.compile(r"(\w+)\W*$")
+
+def split_sentences(text: str) -> List[str]:
+    """Rozdělí odstavec na věty; nedělí za zkratkami (např., tzv., Ing.) a iniciálami (J. Novák)."""
+    sentences, start = [], 0
+    for match in SENTENCE_END_RE.finditer(text):
+        if text[match.start()] == ".":
+            last_word = LAST_WORD_RE.search(text[start:match.start()])
+            word = last_word.group(1) if last_word else ""
+            if word.lower() in CZECH_ABBREVIATIONS or (len(word) == 1 and word.isupper()):
+                continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    if text[start:].strip():
+        sentences.append(text[start:].strip())
+    return sentences
+
+def _split_words(text: str, max_tokens: int) -> List[str]:
+    """Nouzové dělení příliš dlouhé "věty" (tabulky, výčty bez interpunkce) po slovech."""
+    pieces, current, size = [], [], 0
+    for word in text.split():
+        tokens = count_tokens(" " + word)
+        if current and size + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def _token_chunks(text: str, target_tokens: int, max_tokens: int, overlap_tokens: int) -> List[Tuple[str, bool]]:
+    """Vrátí seznam (chunk, vynucené dělení); vynucené dělení znamená text bez použitelných hranic vět."""
+    # Jednotky: (text, tokeny, začíná odstavec, vynucené dělení)
+    units = []
+    for paragraph in (p.strip() for p in text.split("\n")):
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= target_tokens:
+            units.append((paragraph, tokens, True, False))
+            continue
+        first = True
+        for sentence in split_sentences(paragraph):
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                units.append((sentence, tokens, first, False))
+            else:
+                for piece in _split_words(sentence, max_tokens):
+                    units.append((piece, count_tokens(piece), first, True))
+                    first = False
+            first = False
+
+    groups, current, size = [], [], 0
+    for unit in units:
+        if current and size + unit[1] > target_tokens:
+            groups.append((current, size))
+            current, size = [], 0
+        current.append(unit)
+        size += unit[1]
+    if current:
+        groups.append((current, size))
 
-Vrať pouze seznam chunků jako JSON pole řetězců.
+    chunks, previous = [], None
+    for group, size in groups:
+        body = "".join(("\n" if new_paragraph and i else " " if i else "") + unit_text
+                       for i, (unit_text, _, new_paragraph, _) in enumerate(group))
+        forced = any(unit[3] for unit in group)
 
-Text:
-{text.strip()}
+        overlap = []
+        if previous and overlap_tokens:
+            budget = min(overlap_tokens, max_tokens - size)
+            for sentence in reversed(split_sentences(previous.replace("\n", " "))):
+                tokens = count_tokens(sentence)
+                if tokens > budget:
+                    break
+                overlap.insert(0, sentence)
+                budget -= tokens
+        separator = "\n" if group[0][2] else " "
+        chunks.append(((" ".join(overlap) + separator if overlap else "") + body, forced))
+        previous = body
+    return chunks
+
+def split_text_by_tokens(text: str, target_tokens: int = TARGET_TOKENS, max_tokens: int = MAX_CHUNK_TOKENS,
+                         overlap_tokens: int = OVERLAP_TOKENS) -> List[str]:
+    """Deterministické dělení bez LLM."""
+    return [chunk for chunk, _ in _token_chunks(text, target_tokens, max_tokens, overlap_tokens)]
+
+# 🤖 Pokud chunk vypadá podezřele, pošleme ho do LLM pro lepší rozdělení.
+# Podezřelé chunky se posílají souběžně (omezeně semaforem), několik najednou
+# v jednom promptu, a výsledky se ukládají do SQLite cache podle hashe textu
+# a modelu, takže stejný text se LLM nikdy neposílá dvakrát.
+REFINE_CONCURRENCY = int(os.getenv("REFINE_CONCURRENCY", "4"))
+REFINE_BATCH_SIZE = 4           # max. chunků v jednom promptu
+REFINE_BATCH_CHARS = 6000       # max. znaků textu v jednom promptu
+REFINE_CACHE_DB = os.getenv("REFINE_CACHE_DB", "VYSTUP_refine_cache.sqlite")
+
+REFINE_PROMPT = """
+Rozděl každý z následujících očíslovaných textů na kratší ucelené bloky (chunky) tak, aby každý obsahoval logicky propojené informace. Každý blok může obsahovat 1–3 odstavce. Přidej 1–2 věty překryvu mezi bloky, pokud je to vhodné.
+
+Vrať pouze JSON objekt, kde klíčem je číslo textu a hodnotou pole chunků (řetězců), např. {{"1": ["...", "..."], "2": ["..."]}}.
+
+{texts}
 """
-    try:
-        response = openai.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.4
+
+_refine_cache = None
+
+def _cache() -> sqlite3.Connection:
+    global _refine_cache
+    if _refine_cache is None:
+        _refine_cache = sqlite3.connect(REFINE_CACHE_DB)
+        _refine_cache.execute("PRAGMA journal_mode=WAL")
+        _refine_cache.execute(
+            "CREATE TABLE IF NOT EXISTS refine_cache (key TEXT PRIMARY KEY, model TEXT NOT NULL, chunks TEXT NOT NULL)"
         )
-        raw_output = response.choices[0].message.content.strip()
-        chunks = eval(raw_output)  # quick & dirty – můžeš nahradit json.loads pokud výstup bude JSON string
-        if isinstance(chunks, list) and all(isinstance(c, str) for c in chunks):
-            return chunks
-    except Exception as e:
-        print(f"❌ LLM refine error: {e}")
-    return [text.strip()]
-
-# 🔀 Kombinace obou přístupů
-def split_text_smart(text: str, chunk_size: int = 2, overlap: float = 0.3) -> List[str]:
-    initial_chunks = split_text_heuristically(text, chunk_size, overlap)
-    final_chunks = []
+    return _refine_cache
+
+def _cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+def _batches(texts: List[str]) -> List[List[str]]:
+    """Seskupí texty do dávek podle počtu a délky."""
+    batches, current, size = [], [], 0
+    for text in texts:
+        if current and (len(current) >= REFINE_BATCH_SIZE or size + len(text) > REFINE_BATCH_CHARS):
+            batches.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+async def _refine_batch(client: AsyncOpenAI, semaphore: asyncio.Semaphore, batch: List[str], model: str) -> dict:
+    """Jeden prompt pro celou dávku; vrací {text: chunky} jen pro texty s platnou odpovědí."""
+    numbered = "\n\n".join(f"Text {i}:\n{text}" for i, text in enumerate(batch, 1))
+    async with semaphore:
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": REFINE_PROMPT.format(texts=numbered)}
+                ],
+                temperature=0.4,
+                response_format={"type": "json_object"},
+            )
+            output = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"❌ LLM refine error: {e}")
+            return {}
+
+    refined = {}
+    for i, text in enumerate(batch, 1):
+        chunks = output.get(str(i)) if isinstance(output, dict) else None
+        if isinstance(chunks, list) and chunks and all(isinstance(c, str) for c in chunks):
+            refined[text] = [c.strip() for c in chunks if c.strip()]
+    return refined
+
+async def refine_chunks_async(texts: List[str], model: str = LLM_MODEL) -> List[List[str]]:
+    """
+    Zpřesní rozdělení více chunků najednou. Pro každý vstup vrací seznam chunků;
+    při chybě LLM vrací původní text (a nic se neukládá do cache).
+    """
+    texts = [text.strip() for text in texts]
+    cache = _cache()
+    results = {}
+    for text in set(texts):
+        row = cache.execute("SELECT chunks FROM refine_cache WHERE key = ?", (_cache_key(text, model),)).fetchone()
+        if row:
+            results[text] = json.loads(row[0])
 
-    for chunk in initial_chunks:
-        num_lines = chunk.count("\n")
-        length = len(chunk)
+    missing = [text for text in dict.fromkeys(texts) if text not in results]
+    if missing:
+        print(f"⚠️ Refining {len(missing)} chunků pomocí LLM ({len(texts) - len(missing)} z cache)...")
+        semaphore = asyncio.Semaphore(REFINE_CONCURRENCY)
+        async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) as client:
+            batch_results = await asyncio.gather(*(
+                _refine_batch(client, semaphore, batch, model) for batch in _batches(missing)
+            ))
+        with cache:
+            for refined in batch_results:
+                for text, chunks in refined.items():
+                    results[text] = chunks
+                    cache.execute(
+                        "INSERT OR REPLACE INTO refine_cache (key, model, chunks) VALUES (?, ?, ?)",
+                        (_cache_key(text, model), model, json.dumps(chunks, ensure_ascii=False)),
+                    )
 
-        # Podezřelé chunk-y: příliš dlouhé, příliš krátké nebo bez odstavců
-        if length > 1800 or length < 200 or num_lines < 1:
-            print("⚠️ Refining chunk pomocí LLM...")
-            refined = llm_refine_chunk(chunk)
-            final_chunks.extend(refined)
-        else:
-            final_chunks.append(chunk)
+    return [results.get(text, [text]) for text in texts]
 
+def refine_chunks(texts: List[str], model: str = LLM_MODEL) -> List[List[str]]:
+    """Synchronní obálka nad `refine_chunks_async`."""
+    if not texts:
+        return []
+    return asyncio.run(refine_chunks_async(texts, model))
+
+def llm_refine_chunk(text: str) -> List[str]:
+    return refine_chunks([text])[0]
+
+# 🔀 Kombinace obou přístupů: LLM dostane jen chunky, kde se text nedal
+# rozdělit na hranicích vět a muselo se dělit natvrdo po slovech
+async def split_text_smart_async(text: str, target_tokens: int = TARGET_TOKENS, max_tokens: int = MAX_CHUNK_TOKENS,
+                                 overlap_tokens: int = OVERLAP_TOKENS) -> List[str]:
+    chunks = _token_chunks(text, target_tokens, max_tokens, overlap_tokens)
+    forced = [chunk for chunk, is_forced in chunks if is_forced]
+    refined = dict(zip(forced, await refine_chunks_async(forced))) if forced else {}
+
+    final_chunks = []
+    for chunk, _ in chunks:
+        final_chunks.extend(refined.get(chunk, [chunk]))
     return final_chunks
+
+def split_text_smart(text: str, target_tokens: int = TARGET_TOKENS, max_tokens: int = MAX_CHUNK_TOKENS,
+                     overlap_tokens: int = OVERLAP_TOKENS) -> List[str]:
+    chunks = _token_chunks(text, target_tokens, max_tokens, overlap_tokens)
+    # Bez vynuceného dělení se event loop ani LLM vůbec nespouští
+    if not any(is_forced for _, is_forced in chunks):
+        return [chunk for chunk, _ in chunks]
+    return asyncio.run(split_text_smart_async(text, target_tokens, max_tokens, overlap_tokens))
@@ -1,25 +1,178 @@
+import asyncio
 import os
+import random
 from dotenv import load_dotenv
 import openai
+from openai import AsyncOpenAI
+
+from utils.embedding_cache import EmbeddingCache
 
 # 🔐 Načtení klíčů
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+# Zkrácení vektorů (jen modely text-embedding-3), prázdné = plná velikost modelu
+EMBED_DIMENSIONS = int(os.getenv("OPENAI_EMBED_DIMENSIONS", "0")) or None
 
 # ⚠️ Ořez na max délku pro embedding model
 MAX_TOKENS = 8191 if "3" in EMBED_MODEL else 8192  # fallback
 
+# 🔢 Počítání tokenů stejným tokenizerem, jaký používá embedding model (tiktoken).
+# Bez tiktokenu (nebo bez staženého slovníku) se počet tokenů odhaduje z délky textu.
+CHARS_PER_TOKEN = 3.0  # odhad pro češtinu s cl100k_base
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            try:
+                _encoding = tiktoken.encoding_for_model(EMBED_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"⚠️ Tokenizer není k dispozici ({e}), počty tokenů se jen odhadují.")
+            _encoding = False
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return max(1, round(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+def truncate_tokens(text: str, max_tokens: int = MAX_TOKENS) -> str:
+    """Zkrátí text na nejvýše `max_tokens` tokenů."""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:int(max_tokens * CHARS_PER_TOKEN)]
+
+# 📦 Dávkové embeddingy: vstupy se balí do požadavků podle součtu tokenů,
+# požadavky běží souběžně a při 429/5xx/síťové chybě se opakují s backoffem
+BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "100000"))
+BATCH_MAX_ITEMS = 512
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+MAX_RETRIES = 5
+RETRY_BACKOFF = 1.0  # s, násobí se 2^pokus
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+# 💾 Cache už spočítaných embeddingů (utils/embedding_cache.py), otevírá se při prvním použití
+_embedding_cache = None
+
+def get_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+def create_client() -> AsyncOpenAI:
+    # Opakování řešíme sami po dávkách, vestavěné retry klienta vypneme
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+class EmbeddingError(Exception):
+    """Embedding jednoho vstupu se nepodařilo získat."""
+
+def _pack_batches(items: list[tuple[int, str, int]]) -> list[list[tuple[int, str, int]]]:
+    """Rozdělí (index, text, tokeny) do dávek do BATCH_MAX_TOKENS / BATCH_MAX_ITEMS."""
+    batches, current, size = [], [], 0
+    for item in items:
+        if current and (size + item[2] > BATCH_MAX_TOKENS or len(current) >= BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += item[2]
+    if current:
+        batches.append(current)
+    return batches
+
+async def _embed_batch(client: AsyncOpenAI, semaphore: asyncio.Semaphore, batch, model: str, results: list):
+    """Jeden požadavek pro celou dávku; chyba vstupu (400) se rozloží na jednotlivé vstupy."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                response = await client.embeddings.create(
+                    input=[text for _, text, _ in batch], model=model,
+                    **({"dimensions": EMBED_DIMENSIONS} if EMBED_DIMENSIONS else {}),
+                )
+            for item in response.data:
+                results[batch[item.index][0]] = item.embedding
+            return
+        except RETRYABLE_ERRORS as e:
+            if attempt >= MAX_RETRIES:
+                for index, _, _ in batch:
+                    results[index] = EmbeddingError(f"Vyčerpány pokusy: {e}")
+                return
+            delay = RETRY_BACKOFF * 2 ** attempt * (1 + random.random())
+            print(f"⚠️ Embedding dávky ({len(batch)} textů) selhal: {e}. Zkusím znovu za {delay:.1f}s.")
+            await asyncio.sleep(delay)
+        except openai.BadRequestError as e:
+            if len(batch) == 1:
+                results[batch[0][0]] = EmbeddingError(str(e))
+                return
+            # Jeden vadný vstup by shodil celou dávku, zkusíme je zvlášť
+            await asyncio.gather(*(_embed_batch(client, semaphore, [item], model, results) for item in batch))
+            return
+        except openai.APIError as e:
+            # Chyba nezávislá na vstupu (klíč, oprávnění, model): rozklad by ji jen zopakoval pro každý text
+            for index, _, _ in batch:
+                results[index] = EmbeddingError(str(e))
+            return
+
+async def get_embeddings_async(texts: list[str], model: str = EMBED_MODEL, return_exceptions: bool = False,
+                               use_cache: bool = True, client: AsyncOpenAI | None = None) -> list:
+    """
+    Embeddingy pro více textů najednou, ve stejném pořadí jako vstup.
+    S `return_exceptions=True` je na místě neúspěšného vstupu `EmbeddingError`,
+    jinak se první chyba vyhodí až po doběhnutí všech dávek.
+    Texty nalezené v cache se do API neposílají, nově spočítané se do ní uloží.
+    Dlouho běžící služba předá vlastního `client`, jinak se vytvoří na jedno volání.
+    """
+    results = [None] * len(texts)
+    cached = [None] * len(texts)
+    if use_cache:
+        cached = get_cache().get_many([text or "" for text in texts], model, EMBED_DIMENSIONS)
+    items = []
+    for index, text in enumerate(texts):
+        if not text or not text.strip():
+            results[index] = EmbeddingError("Text je prázdný")
+            continue
+        if cached[index] is not None:
+            results[index] = cached[index]
+            continue
+        text = truncate_tokens(text.strip())
+        items.append((index, text, count_tokens(text)))
+
+    if items:
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        if client is None:
+            async with create_client() as client:
+                await asyncio.gather(*(_embed_batch(client, semaphore, batch, model, results) for batch in _pack_batches(items)))
+        else:
+            await asyncio.gather(*(_embed_batch(client, semaphore, batch, model, results) for batch in _pack_batches(items)))
+        if use_cache:
+            get_cache().put_many(
+                [(texts[index], results[index]) for index, _, _ in items if not isinstance(results[index], EmbeddingError)],
+                model, EMBED_DIMENSIONS,
+            )
+
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, EmbeddingError):
+                raise result
+    return results
+
+def get_embeddings(texts: list[str], model: str = EMBED_MODEL, return_exceptions: bool = False,
+                   use_cache: bool = True) -> list:
+    """Synchronní obálka nad `get_embeddings_async`."""
+    if not texts:
+        return []
+    return asyncio.run(get_embeddings_async(texts, model, return_exceptions, use_cache))
+
 def get_embedding(text: str) -> list[float]:
+    """Embedding jednoho textu; při chybě vyhodí `EmbeddingError` (dřív vracelo prázdný seznam)."""
     if not text or not text.strip():
         raise ValueError("Text je prázdný")
-
-    try:
-        response = openai.embeddings.create(
-            input=text.strip(),
-            model=EMBED_MODEL
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"❌ Chyba při získávání embeddingu: {e}")
-        return []
+    return get_embeddings([text])[0]
@@ -0,0 +1,183 @@
+"""
+Trvalá cache embeddingů adresovaná obsahem.
+
+Klíč je sha256 z normalizovaného textu (sloučené bílé znaky), názvu modelu
+a počtu dimenzí, takže stejný chunk se nikdy neembeduje dvakrát - ani po
+opakovaném spuštění pipeline, ani po změně parametrů chunkování, která
+většinu chunků nechá beze změny. Vektory jsou uložené jako float32 bloby
+(1536 dimenzí = 6 kB). Při překročení `max_bytes` se mažou nejdéle
+nepoužité záznamy (LRU).
+
+Použití:
+    python utils/embedding_cache.py          # statistiky
+    python utils/embedding_cache.py clear    # smazání cache
+"""
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_DB = os.getenv("EMBED_CACHE_DB", "VYSTUP_embedding_cache.sqlite")
+DEFAULT_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Po překročení limitu se maže až pod tento podíl, ať se nečistí po každém zápisu
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    dimensions INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used);
+"""
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(text: str, model: str, dimensions: int | None = None) -> str:
+    return hashlib.sha256(f"{model}\0{dimensions or 0}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    `get_many` vrátí pro každý text vektor z cache, nebo None;
+    `put_many` uloží nově spočítané vektory. Počítadla `hits`/`misses` platí pro tuto instanci.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        # Průběžný součet velikosti vektorů; celá tabulka se prochází jen při otevření a nad limitem
+        self._size = self.size_bytes()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, texts: list[str], model: str, dimensions: int | None = None) -> list[list[float] | None]:
+        keys = [cache_key(text, model, dimensions) for text in texts]
+        found = {}
+        # SQLite má limit počtu parametrů, dotazujeme se po kouscích
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            found.update(self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            ))
+        if found:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", ((time.time(), key) for key in found)
+                )
+
+        results = []
+        for key in keys:
+            blob = found.get(key)
+            if blob is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append(np.frombuffer(blob, dtype=np.float32).tolist())
+        return results
+
+    def get(self, text: str, model: str, dimensions: int | None = None) -> list[float] | None:
+        return self.get_many([text], model, dimensions)[0]
+
+    def put_many(self, items: list[tuple[str, list[float]]], model: str, dimensions: int | None = None):
+        """Uloží dvojice (text, vektor) a případně uvolní místo."""
+        if not items:
+            return
+        now = time.time()
+        rows = {
+            cache_key(text, model, dimensions): (model, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in items
+        }
+        keys = list(rows)
+        with self.conn:
+            # Přepsané záznamy se od součtu odečtou
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                self._size -= self.conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchone()[0]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                ((key, *row) for key, row in rows.items()),
+            )
+        self._size += sum(len(row[2]) for row in rows.values())
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def size_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def _evict(self):
+        # Do stejné cache mohou zapisovat i jiné procesy, před mazáním tedy skutečná velikost
+        size = self._size = self.size_bytes()
+        if size <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TO
+        removed = []
+        for key, length in self.conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            if size <= target:
+                break
+            removed.append((key,))
+            size -= length
+        with self.conn:
+            self.conn.executemany("DELETE FROM embeddings WHERE key = ?", removed)
+        self._size = size
+        self.evicted += len(removed)
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM embeddings")
+        self.conn.execute("VACUUM")
+        self._size = 0
+
+    def stats(self) -> dict:
+        by_model = {
+            f"{model} ({dimensions})": count
+            for model, dimensions, count in self.conn.execute(
+                "SELECT model, dimensions, COUNT(*) FROM embeddings GROUP BY model, dimensions"
+            )
+        }
+        return {
+            "entries": sum(by_model.values()),
+            "by_model": by_model,
+            "bytes": self.size_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+
+if __name__ == "__main__":
+    with EmbeddingCache() as cache:
+        if len(sys.argv) > 1 and sys.argv[1] == "clear":
+            cache.clear()
+            print(f"🧹 Cache embeddingů smazána: {DEFAULT_DB}")
+        else:
+            for name, value in cache.stats().items():
+                print(f"{name}: {value}")
@@ -0,0 +1,207 @@
+"""
+Inkrementální indexace článků do Qdrantu.
+
+Id bodu je odvozené z URL, pořadí chunku a hashe jeho textu
+(`point_id_for`), takže se dá bez dalšího stavu zjistit, co už v kolekci je:
+článek se znovu rozdělí na chunky, id se porovnají s body uloženými pod
+jeho URL a
+- nové nebo změněné chunky se embedují a nahrají,
+- nezměněné se přeskočí,
+- body, které v novém dělení už nejsou, se smažou,
+- nové chunky, které už v kolekci jsou pod jiným článkem (převzaté
+  zpravodajství ČTK), se neembedují: URL se jen připíše k bodu originálu
+  (`DedupIndex` + `add_duplicate_source`).
+
+Denní obnova živých článků tak platí jen za změněný text (a i posunuté
+chunky se stejným textem vezme embedding z cache).
+
+Použití:
+    python utils/indexer.py                      # celé úložiště článků
+    python utils/indexer.py --source ct24
+    python utils/indexer.py --store VYSTUP_article_store --collection articles
+"""
+import argparse
+import os
+import sys
+from collections import deque
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR
+from utils.chunking import split_text_smart
+from utils.embedding import get_embeddings
+from utils.lexical_index import LexicalIndex
+from utils.near_duplicates import DedupIndex
+from utils.qdrant import (
+    QDRANT_COLLECTION, BulkUploader, add_duplicate_source, chunk_hash, delete_points, ensure_collection_exists,
+    get_indexed_chunks, point_id_for
+)
+
+
+def article_chunks(article: dict, chunks: list[str]) -> dict:
+    """Id bodu -> (chunk, metadata) pro chunky článku."""
+    url = article["url"]
+    wanted = {}
+    for i, chunk in enumerate(chunks):
+        content_hash = chunk_hash(chunk)
+        metadata = {
+            "title": article.get("title", ""),
+            "url": url,
+            "date": article.get("date", ""),
+            "source": article.get("source", "unknown"),
+            "chunk_index": i,
+            "chunk_length": len(chunk),
+            "content_hash": content_hash,
+        }
+        wanted[point_id_for(url, i, content_hash)] = (chunk, metadata)
+    return wanted
+
+
+def diff_article(url: str, wanted: dict, collection_name: str = QDRANT_COLLECTION,
+                 dedup: DedupIndex | None = None) -> tuple[list[str], list[str], dict]:
+    """
+    Porovná chunky článku s body v kolekci. Vrací (id k nahrání, zastaralá id ke smazání,
+    id duplicitního chunku -> id bodu originálu). Duplicity se hledají jen s `dedup`
+    a mezi id k nahrání už nejsou.
+    """
+    indexed = get_indexed_chunks(url, collection_name)
+    missing = [point_id for point_id in wanted if point_id not in indexed]
+    stale = [point_id for point_id in indexed if point_id not in wanted]
+
+    duplicates = {}
+    if dedup is not None:
+        for point_id in missing:
+            match = dedup.find("chunk", wanted[point_id][0])
+            # Body téhož článku za originál nebereme, zastaralé se za chvíli smažou
+            if match and match[0] not in wanted and match[0] not in indexed:
+                duplicates[point_id] = match[0]
+        missing = [point_id for point_id in missing if point_id not in duplicates]
+    return missing, stale, duplicates
+
+
+def plan_article(article: dict, collection_name: str = QDRANT_COLLECTION,
+                 dedup: DedupIndex | None = None) -> tuple[dict, list[str], list[str], dict]:
+    """
+    Rozdělí článek na chunky a porovná je s body v kolekci.
+    Vrací (id -> (chunk, metadata) pro všechny chunky, id k nahrání, zastaralá id ke smazání,
+    id duplicitního chunku -> id bodu originálu).
+    """
+    chunks = split_text_smart(article["content"]) if article.get("content") else []
+    wanted = article_chunks(article, chunks)
+    return (wanted, *diff_article(article["url"], wanted, collection_name, dedup))
+
+
+def register_uploaded(dedup: DedupIndex, acked) -> int:
+    """
+    Zaregistruje body, které Qdrant potvrdil (fronta plněná z `on_batch_done`), jako originály.
+    Dřív ne: `duplicate_of` nesmí odkazovat na bod, který v kolekci není.
+    """
+    count = 0
+    while acked:
+        point = acked.popleft()
+        dedup.add("chunk", point.payload["chunk"], str(point.id))
+        count += 1
+    return count
+
+
+def attach_duplicates(duplicates: list, collection_name: str = QDRANT_COLLECTION):
+    """Připíše URL duplicitních chunků (id originálu, metadata) k bodům originálů."""
+    for original_id, metadata in duplicates:
+        add_duplicate_source(original_id, metadata, collection_name)
+
+
+def index_article(article: dict, uploader: BulkUploader, collection_name: str = QDRANT_COLLECTION,
+                  stale_ids: list | None = None, lexical: LexicalIndex | None = None,
+                  dedup: DedupIndex | None = None, duplicate_links: list | None = None) -> dict:
+    """
+    Srovná body článku v kolekci s jeho aktuálním textem.
+    Zastaralé body se smažou hned, nebo se jen přidají do `stale_ids` a smaže je volající
+    (až po nahrání nových, aby článek v indexu ani chvíli nechyběl).
+    S `lexical` se stejné změny promítnou i do lexikálního indexu.
+    S `dedup` se duplicitní chunky neembedují a jejich URL se připíše k originálu hned,
+    nebo až volající (`duplicate_links`, po bariéře uploaderu).
+    Vrací počty {"new": …, "unchanged": …, "deleted": …, "duplicates": …, "failed": …}.
+    """
+    url = article["url"]
+    wanted, missing, stale, duplicates = plan_article(article, collection_name, dedup)
+
+    failed = 0
+    added = []
+    embeddings = get_embeddings([wanted[point_id][0] for point_id in missing], return_exceptions=True)
+    for point_id, embedding in zip(missing, embeddings):
+        if isinstance(embedding, Exception):
+            print(f"❌ {url} chunk {wanted[point_id][1]['chunk_index']}: {embedding}")
+            failed += 1
+            continue
+        chunk, metadata = wanted[point_id]
+        uploader.add(chunk, embedding, metadata, point_id=point_id)
+        added.append((point_id, chunk, metadata))
+
+    if lexical is not None:
+        lexical.add_chunks(added)
+        lexical.remove(stale)
+
+    links = [(original_id, wanted[point_id][1]) for point_id, original_id in duplicates.items()]
+    if duplicate_links is None:
+        attach_duplicates(links, collection_name)
+    else:
+        duplicate_links.extend(links)
+
+    if dedup is not None:
+        dedup.remove("chunk", stale)
+    if stale_ids is None:
+        delete_points(stale, collection_name)
+    else:
+        stale_ids.extend(stale)
+    return {
+        "new": len(missing) - failed,
+        "unchanged": len(wanted) - len(missing) - len(duplicates),
+        "deleted": len(stale),
+        "duplicates": len(duplicates),
+        "failed": failed,
+    }
+
+
+def index_store(store: ArticleStore, collection_name: str = QDRANT_COLLECTION, source: str | None = None) -> dict:
+    """Projde úložiště článků a každý článek zaindexuje inkrementálně."""
+    totals = {"articles": 0, "new": 0, "unchanged": 0, "deleted": 0, "duplicates": 0, "failed": 0}
+    stale_ids, duplicate_links = [], []
+    # Body potvrzené Qdrantem; originály pro deduplikaci z nich dělá jen hlavní vlákno
+    acked = deque()
+    with DedupIndex() as dedup, LexicalIndex() as lexical:
+        with BulkUploader(collection_name, on_batch_done=acked.extend) as uploader:
+            for article in store.iter_articles(source):
+                register_uploaded(dedup, acked)
+                counts = index_article(article, uploader, collection_name, stale_ids, lexical, dedup, duplicate_links)
+                totals["articles"] += 1
+                for key, value in counts.items():
+                    totals[key] += value
+                if counts["new"] or counts["deleted"]:
+                    print(f"🔄 {article.get('title', article['url'])[:60]}: "
+                          f"+{counts['new']} / -{counts['deleted']} (beze změny {counts['unchanged']}, "
+                          f"duplicit {counts['duplicates']})")
+        register_uploaded(dedup, acked)
+    # Mazání a připojení duplicit až po bariéře uploaderu, mazání po dávkách
+    for start in range(0, len(stale_ids), 1000):
+        delete_points(stale_ids[start:start + 1000], collection_name)
+    attach_duplicates(duplicate_links, collection_name)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inkrementální indexace článků do Qdrantu.")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Adresář úložiště článků")
+    parser.add_argument("--source", help="Jen články daného zdroje")
+    parser.add_argument("--collection", default=QDRANT_COLLECTION, help="Kolekce v Qdrantu")
+    args = parser.parse_args()
+
+    ensure_collection_exists(args.collection)
+    with ArticleStore(args.store) as store:
+        totals = index_store(store, args.collection, args.source)
+    print(f"✅ Článků: {totals['articles']}, nových chunků: {totals['new']}, beze změny: {totals['unchanged']}, "
+          f"smazaných: {totals['deleted']}, duplicit: {totals['duplicates']}, chyb: {totals['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Lexikální (BM25) index chunků pro okamžité hledání jmen a citovaných frází.
+
+Hledání nepotřebuje embedding ani síť: dotaz "Čapí hnízdo" nebo
+"Zwyrtek Hamplová" se odpoví přímo z invertovaného indexu v SQLite.
+
+Normalizace pro češtinu:
+1. malá písmena a odstranění diakritiky (čapí -> capi),
+2. lehký stemming - odříznutí pádových a tvarových koncovek
+   (hnízdo, hnízda, hnízdě -> hnizd), kořen má aspoň 3 znaky.
+
+Fráze v uvozovkách se musí v chunku vyskytovat přesně v tomto pořadí
+slov (po normalizaci, takže projde i jiný pád). Výsledky lexikálního
+a vektorového hledání jde spojit přes `rrf()` (Reciprocal Rank Fusion).
+
+Česká stop slova a termy z víc než `MAX_DF_RATIO` chunků se do skóre
+nepočítají (ve frázích platí dál) a BM25 se sčítá přímo v SQL s LIMIT,
+takže dotaz neprochází v Pythonu postingy skoro celého korpusu.
+
+Index se plní průběžně (`add_chunks`) z pipeline i z inkrementálního
+indexeru; stejný `point_id` se přepíše, zastaralé chunky se mažou přes
+`remove`.
+
+Použití:
+    python utils/lexical_index.py build processed_data/*
+    python utils/lexical_index.py search '"Čapí hnízdo" dotace' --source ct24
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import unicodedata
+from collections import Counter
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.vector_files import iter_metadata
+
+DEFAULT_DB = os.getenv("LEXICAL_DB", "VYSTUP_lexical.sqlite")
+# Parametry BM25
+K1 = 1.2
+B = 0.75
+# Konstanta Reciprocal Rank Fusion
+RRF_K = 60
+MIN_STEM = 3
+# Termy z většího podílu chunků skoro nerozlišují, do skóre se nepočítají
+MAX_DF_RATIO = 0.5
+
+WORD_RE = re.compile(r"\w+")
+PHRASE_RE = re.compile(r'"([^"]+)"')
+# Koncovky bez diakritiky, od nejdelších; odřízne se první, po které zbude kořen >= MIN_STEM
+SUFFIXES = sorted({
+    "atech", "atum", "ych", "ymi", "ich", "imi", "iho", "imu", "emi", "ach", "ami",
+    "ata", "aty", "ama", "ete", "eti", "ech", "eho", "emu", "ou", "em", "es", "im", "um", "at",
+    "am", "os", "us", "ym", "mi", "a", "e", "i", "o", "u", "y",
+}, key=len, reverse=True)
+
+# Česká stop slova (malá písmena bez diakritiky, před stemmingem)
+STOPWORDS = frozenset("""
+a aby aj ale ani aniz ano asi az bez bude budou by byl byla byli bylo byt ci co coz do i jak jake jako
+je jeho jej jeji jejich jen jeste ji jiz jsem jsi jsme jsou jste k kam kde kdo kdy kdyz ke ktera ktere
+kteri kterou ktery ma maji me mezi mi mu na nad nam nas ne nebo neni nez nic o od ode on ona oni ono
+pak po pod podle pokud pouze pro proc proto protoze pred pres pri s se si sve svych ta tak take takze
+tam te tedy ten tento teto tim to tohle toho tom tomto tu tuto ty tyto u uz v ve vsak vse z za ze
+""".split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    point_id TEXT NOT NULL UNIQUE,
+    url TEXT,
+    source TEXT,
+    date TEXT,
+    chunk_index INTEGER,
+    title TEXT,
+    chunk TEXT NOT NULL,
+    stems TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_url ON docs (url);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+-- Počet chunků a součet jejich délek, aby dotaz nemusel procházet celou tabulku docs
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES ('docs', 0), ('length', 0);
+"""
+
+
+def fold(text: str) -> str:
+    """Malá písmena bez diakritiky."""
+    return "".join(c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn")
+
+
+def stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def analyze(text: str) -> list[str]:
+    """Text -> seznam normalizovaných termů v pořadí výskytu."""
+    return [stem(word) for word in WORD_RE.findall(fold(text))]
+
+
+def parse_query(query: str) -> tuple[list[str], list[list[str]]]:
+    """Vrátí (termy dotazu pro skóre bez stop slov, fráze jako seznamy všech termů)."""
+    phrases = [analyze(phrase) for phrase in PHRASE_RE.findall(query)]
+    words = WORD_RE.findall(fold(query.replace('"', " ")))
+    # Dotaz jen ze stop slov ("to je on") se hledá celý
+    terms = [stem(word) for word in words if word not in STOPWORDS] or [stem(word) for word in words]
+    return terms, [phrase for phrase in phrases if phrase]
+
+
+class LexicalIndex:
+    def __init__(self, path: str = DEFAULT_DB):
+        # Pipeline zapisuje z pomocného vlákna (vždy jednoho najednou)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT value FROM totals WHERE name = 'docs'").fetchone()[0]
+
+    # --- Zápis ---
+    def _delete_docs(self, doc_ids: list[int]):
+        for doc_id in doc_ids:
+            terms = [term for (term,) in self.conn.execute("SELECT term FROM postings WHERE doc_id = ?", (doc_id,))]
+            self.conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", ((term,) for term in terms))
+            self.conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            (length,) = self.conn.execute("SELECT length FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            self._add_totals(-1, -length)
+            self.conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM terms WHERE df <= 0")
+
+    def _add_totals(self, docs: int, length: int):
+        self.conn.execute("UPDATE totals SET value = value + ? WHERE name = 'docs'", (docs,))
+        self.conn.execute("UPDATE totals SET value = value + ? WHERE name = 'length'", (length,))
+
+    def add_chunks(self, chunks: list[tuple[str, str, dict]]):
+        """
+        Přidá chunky (point_id, text, metadata) v jedné transakci.
+        Chunk se stejným `point_id` se nahradí.
+        """
+        with self.conn:
+            for point_id, chunk, metadata in chunks:
+                row = self.conn.execute("SELECT id FROM docs WHERE point_id = ?", (point_id,)).fetchone()
+                if row:
+                    self._delete_docs([row[0]])
+                terms = analyze(chunk)
+                cursor = self.conn.execute(
+                    "INSERT INTO docs (point_id, url, source, date, chunk_index, title, chunk, stems, length) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (point_id, metadata.get("url"), metadata.get("source"), (metadata.get("date") or "")[:10],
+                     metadata.get("chunk_index"), metadata.get("title"), chunk, " ".join(terms), len(terms)),
+                )
+                self._add_totals(1, len(terms))
+                counts = Counter(terms)
+                self.conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    ((term, cursor.lastrowid, tf) for term, tf in counts.items()),
+                )
+                self.conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                    ((term,) for term in counts),
+                )
+
+    def remove(self, point_ids: list[str]):
+        """Smaže chunky podle `point_id` (např. zastaralé po přeindexování článku)."""
+        with self.conn:
+            doc_ids = []
+            for point_id in point_ids:
+                row = self.conn.execute("SELECT id FROM docs WHERE point_id = ?", (point_id,)).fetchone()
+                if row:
+                    doc_ids.append(row[0])
+            self._delete_docs(doc_ids)
+
+    # --- Hledání ---
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        source: str | list[str] | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None
+    ) -> list[tuple[float, dict]]:
+        """
+        BM25 top-k pro dotaz; fráze v uvozovkách musí chunk obsahovat celé.
+        Vrací seznam (skóre, chunk s metadaty) seřazený od nejlepšího.
+        """
+        terms, phrases = parse_query(query)
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return []
+        totals = dict(self.conn.execute("SELECT name, value FROM totals"))
+        total = totals["docs"]
+        if not total:
+            return []
+        avg_length = max(totals["length"] / total, 1)
+
+        conditions, params = [], []
+        if isinstance(source, str):
+            source = [source]
+        if source:
+            conditions.append(f"d.source IN ({','.join('?' * len(source))})")
+            params.extend(source)
+        if date_from:
+            conditions.append("d.date >= ?")
+            params.append(date_from[:10])
+        if date_to:
+            conditions.append("d.date <= ?")
+            params.append(date_to[:10])
+        where = "".join(f" AND {condition}" for condition in conditions)
+
+        placeholders = ",".join("?" * len(terms))
+        df = dict(self.conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms))
+        terms = [term for term in terms if term in df]
+        if not terms:
+            return []
+        # Příliš časté termy vynecháme, pokud po nich zbude aspoň jeden
+        selective = [term for term in terms if df[term] <= MAX_DF_RATIO * total]
+        terms = selective or [min(terms, key=df.get)]
+        idf = [(term, math.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5))) for term in terms]
+
+        having, limit = "", " LIMIT ?"
+        required = 0
+        if phrases:
+            # Fráze: kandidát musí mít všechny její termy, pořadí se ověří v textu
+            phrase_terms = {term for phrase in phrases for term in phrase}
+            required = sum(1 for term in terms if term in phrase_terms)
+            having, limit = " HAVING COUNT(*) >= ?", ""
+        query_terms = ",".join("(?, ?)" for _ in idf)
+        cursor = self.conn.execute(
+            f"WITH q(term, idf) AS (VALUES {query_terms}) "
+            f"SELECT p.doc_id, SUM(q.idf * p.tf * ? / (p.tf + ? * (1 - ? + ? * d.length / ?))) AS score "
+            f"FROM q JOIN postings p ON p.term = q.term JOIN docs d ON d.id = p.doc_id "
+            f"WHERE 1{where} GROUP BY p.doc_id{having} ORDER BY score DESC{limit}",
+            [value for pair in idf for value in pair] + [K1 + 1, K1, B, B, avg_length] + params
+            + ([required] if phrases else [k]),
+        )
+        if phrases:
+            # Kandidáti jdou od nejlepšího skóre, stačí prvních k s frází
+            top = []
+            for doc_id, score in cursor:
+                if self._with_phrases([doc_id], phrases):
+                    top.append((doc_id, score))
+                    if len(top) >= k:
+                        break
+        else:
+            top = cursor.fetchall()
+
+        results = []
+        for doc_id, score in top:
+            point_id, url, source_name, date, chunk_index, title, chunk = self.conn.execute(
+                "SELECT point_id, url, source, date, chunk_index, title, chunk FROM docs WHERE id = ?", (doc_id,)
+            ).fetchone()
+            results.append((score, {
+                "point_id": point_id, "url": url, "source": source_name, "date": date,
+                "chunk_index": chunk_index, "title": title, "chunk": chunk,
+            }))
+        return results
+
+    def _with_phrases(self, doc_ids: list[int], phrases: list[list[str]]) -> list[int]:
+        matching = []
+        for doc_id in doc_ids:
+            stems = f" {self.conn.execute('SELECT stems FROM docs WHERE id = ?', (doc_id,)).fetchone()[0]} "
+            if all(f" {' '.join(phrase)} " in stems for phrase in phrases):
+                matching.append(doc_id)
+        return matching
+
+
+def rrf(*rankings: list, k: int = RRF_K, limit: int = 10) -> list[tuple[float, dict]]:
+    """
+    Reciprocal Rank Fusion: spojí seřazené výsledky různých hledání (lexikálního,
+    vektorového, ...) podle `point_id` (záznam z BM25) nebo `id` (zásah z search.py).
+    Skóre = součet 1 / (k + pořadí) přes všechna pořadí, kde se chunk objevil.
+    """
+    fused, items = Counter(), {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            item = result[1] if isinstance(result, tuple) else result
+            key = item.get("point_id") or item.get("id")
+            fused[key] += 1 / (k + rank)
+            items.setdefault(key, item)
+    return [(score, items[key]) for key, score in fused.most_common(limit)]
+
+
+def _iter_output(path: str):
+    """Chunky (point_id, text, metadata) z výstupu pipeline, nový i starší JSON formát."""
+    if os.path.isdir(path):
+        records = ((record["chunk"], record["metadata"]) for record in iter_metadata(path)
+                   if not record.get("duplicate_of") and not record.get("error"))
+    else:
+        with open(path, encoding="utf-8") as f:
+            records = [(result["chunk"], result["metadata"]) for result in json.load(f) if result.get("embedding")]
+    for chunk, metadata in records:
+        point_id = metadata.get("point_id") or f"{metadata.get('url')}#{metadata.get('chunk_index')}"
+        yield point_id, chunk, metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lexikální BM25 index chunků.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Soubor indexu")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Zaindexovat výstupy pipeline")
+    build_parser.add_argument("paths", nargs="+")
+    search_parser = commands.add_parser("search", help="Hledat (fráze v uvozovkách)")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-k", type=int, default=10)
+    search_parser.add_argument("--source", action="append")
+    search_parser.add_argument("--from", dest="date_from")
+    search_parser.add_argument("--to", dest="date_to")
+    args = parser.parse_args()
+
+    with LexicalIndex(args.db) as index:
+        if args.command == "build":
+            for path in args.paths:
+                chunks = list(_iter_output(path))
+                index.add_chunks(chunks)
+                print(f"✅ {path}: {len(chunks)} chunků")
+            print(f"📚 V indexu je {len(index)} chunků")
+        else:
+            for score, doc in index.search(args.query, args.k, args.source, args.date_from, args.date_to):
+                print(f"{score:.2f}  [{doc['source']}, {doc['date']}] {doc['title']}")
+                print(f"       {doc['chunk'][:200]}")
+
+
+if __name__ == "__main__":
+    main()
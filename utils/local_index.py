@@ -0,0 +1,235 @@
+"""
+Přesné (brute-force) vyhledávání nad embeddingy z `processed_data/` bez Qdrantu.
+
+Vektory ze všech zadaných výstupů se jednou znormalizují do souvislé
+float32 matice (v paměti, nebo s `cache_path` do memory-mapped `.npy`),
+takže kosinová podobnost je obyčejný skalární součin. Dotazy se
+vyhodnocují po dávkách maticovým násobením po blocích řádků a nejlepších
+k se vybírá přes `argpartition`, bez řazení všech skóre.
+
+Čte nový formát (adresář s `vectors.npy` + `metadata.jsonl`) i starší
+JSON soubory s polem chunků. Výsledky jsou přesné, proto slouží i jako
+referenční odpověď pro měření recallu a latence HNSW v Qdrantu
+(`measure_recall`).
+
+Použití:
+    python utils/local_index.py "tvrzení k ověření" processed_data/*
+    python utils/local_index.py --recall 100 processed_data/*
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from qdrant_client.http.models import SearchParams
+
+from utils.embedding import get_embedding
+from utils.qdrant import QDRANT_COLLECTION, get_client
+from utils.vector_files import DEFAULT_OUTPUT_DIR, VECTORS_FILE, load_vectors
+
+# Kolik řádků matice se násobí najednou (omezuje paměť na dávka x BLOCK_ROWS skóre)
+BLOCK_ROWS = 65536
+
+
+def _load_output(path: str):
+    """Vrátí (vektory, záznamy) jednoho výstupu; záznam odpovídá řádku vektorů."""
+    if os.path.isdir(path):
+        vectors, records = load_vectors(path)
+        rows = np.fromiter((record["row"] for record in records), dtype=np.int64, count=len(records))
+        return vectors, rows, [{"chunk": r["chunk"], **r["metadata"]} for r in records]
+    # Starší formát: jeden JSON s polem {"chunk", "embedding", "metadata"}
+    with open(path, encoding="utf-8") as f:
+        results = [result for result in json.load(f) if result.get("embedding")]
+    vectors = np.asarray([result["embedding"] for result in results], dtype=np.float32)
+    return vectors, np.arange(len(results)), [{"chunk": r["chunk"], **r["metadata"]} for r in results]
+
+
+class LocalIndex:
+    """Normalizovaná matice vektorů + metadata (`records[i]` patří k řádku i)."""
+
+    def __init__(self, matrix: np.ndarray, records: list[dict]):
+        self.matrix = matrix
+        self.records = records
+        # Sloupce pro filtry jako pole, aby maska vznikla vektorově
+        self.sources = np.array([record.get("source") or "" for record in records], dtype=object)
+        self.dates = np.array([(record.get("date") or "")[:10] for record in records], dtype="U10")
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def load(cls, paths: list[str], cache_path: str | None = None) -> "LocalIndex":
+        """Načte výstupy pipeline; s `cache_path` se normalizovaná matice zapíše do .npy a memory-mapuje."""
+        outputs = [_load_output(path) for path in paths]
+        outputs = [output for output in outputs if len(output[1])]
+        if not outputs:
+            return cls(np.empty((0, 0), dtype=np.float32), [])
+        dim = outputs[0][0].shape[1]
+        total = sum(len(rows) for _, rows, _ in outputs)
+        if cache_path:
+            matrix = np.lib.format.open_memmap(cache_path, mode="w+", dtype=np.float32, shape=(total, dim))
+        else:
+            matrix = np.empty((total, dim), dtype=np.float32)
+
+        records, position = [], 0
+        for vectors, rows, output_records in outputs:
+            if vectors.shape[1] != dim:
+                raise ValueError(f"Výstupy mají různé dimenze ({vectors.shape[1]} a {dim})")
+            for start in range(0, len(rows), BLOCK_ROWS):
+                block = np.asarray(vectors[rows[start:start + BLOCK_ROWS]], dtype=np.float32)
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                matrix[position:position + len(block)] = block / np.maximum(norms, 1e-12)
+                position += len(block)
+            records.extend(output_records)
+        if cache_path:
+            matrix.flush()
+        return cls(matrix, records)
+
+    def _mask(self, source, date_from, date_to) -> np.ndarray | None:
+        if not source and not date_from and not date_to:
+            return None
+        mask = np.ones(len(self.records), dtype=bool)
+        if source:
+            mask &= np.isin(self.sources, [source] if isinstance(source, str) else list(source))
+        # Data YYYY-MM-DD jdou porovnávat jako řetězce, obě meze včetně
+        if date_from:
+            mask &= self.dates >= date_from[:10]
+        if date_to:
+            mask &= self.dates <= date_to[:10]
+        return mask
+
+    def search(
+        self,
+        queries,
+        k: int = 10,
+        source: str | list[str] | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        with_records: bool = True
+    ) -> list[list]:
+        """
+        Top-k podle kosinové podobnosti pro jeden vektor nebo dávku (matice dotazů x dimenze).
+        Vrací pro každý dotaz seznam (skóre, záznam), s `with_records=False` (skóre, řádek).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        mask = self._mask(source, date_from, date_to)
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        n = len(candidates) if candidates is not None else len(self.records)
+        k = min(k, n)
+        if k == 0:
+            return [[] for _ in queries]
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, n, BLOCK_ROWS):
+            rows = candidates[start:start + BLOCK_ROWS] if candidates is not None else np.arange(start, min(start + BLOCK_ROWS, n))
+            block = self.matrix[rows] if candidates is not None else self.matrix[start:start + len(rows)]
+            scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+            all_rows = np.concatenate([best_rows, np.broadcast_to(rows, (len(queries), len(rows)))], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                all_rows = np.take_along_axis(all_rows, top, axis=1)
+            best_scores, best_rows = scores, all_rows
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [(float(score), self.records[row] if with_records else int(row)) for score, row in zip(scores, rows)]
+            for scores, rows in zip(best_scores, best_rows)
+        ]
+
+
+def _recall_key(record: dict):
+    """
+    Klíč pro párování se body v Qdrantu: `point_id`, u starších výstupů bez něj
+    (nahrané s náhodným uuid) dvojice (url, pořadí chunku) z payloadu.
+    """
+    if record.get("point_id"):
+        return str(record["point_id"])
+    if record.get("url") and record.get("chunk_index") is not None:
+        return record["url"], int(record["chunk_index"])
+    return None
+
+
+def measure_recall(index: LocalIndex, queries: np.ndarray, k: int = 10, hnsw_ef: int | None = None,
+                   collection_name: str = QDRANT_COLLECTION) -> dict:
+    """
+    Recall@k HNSW hledání v Qdrantu proti přesné odpovědi z lokálního indexu
+    (body se párují přes `point_id`, u starších výstupů přes url a pořadí chunku)
+    a latence obou stran v ms.
+    """
+    if any(_recall_key(record) is None for record in index.records):
+        raise ValueError("Výstupy obsahují chunky bez point_id i bez url/chunk_index, recall nejde spárovat s Qdrantem")
+    client = get_client()
+    started = time.perf_counter()
+    exact = index.search(queries, k)
+    local_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    recalls, latencies = [], []
+    for query, expected in zip(queries, exact):
+        expected_ids = {_recall_key(record) for _, record in expected}
+        started = time.perf_counter()
+        points = client.query_points(
+            collection_name=collection_name, query=np.asarray(query).tolist(), limit=k,
+            search_params=SearchParams(hnsw_ef=hnsw_ef), with_payload=["url", "chunk_index"],
+        ).points
+        latencies.append((time.perf_counter() - started) * 1000)
+        found = {str(point.id) for point in points}
+        found |= {_recall_key(point.payload or {}) for point in points} - {None}
+        recalls.append(len(expected_ids & found) / max(len(expected_ids), 1))
+    return {
+        "recall": float(np.mean(recalls)),
+        "qdrant_ms_p50": float(np.percentile(latencies, 50)),
+        "qdrant_ms_p95": float(np.percentile(latencies, 95)),
+        "local_ms_per_query": local_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Přesné vyhledávání nad processed_data bez Qdrantu.")
+    parser.add_argument("query", nargs="?", help="Text dotazu (bez --recall)")
+    parser.add_argument("paths", nargs="*", help="Výstupy pipeline (adresáře nebo starší JSON)")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--source", action="append")
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--recall", type=int, metavar="N", help="Změřit recall Qdrantu na N náhodných uložených vektorech")
+    parser.add_argument("--ef", type=int, help="hnsw_ef pro měření recallu")
+    args = parser.parse_args()
+
+    paths = args.paths
+    if args.recall and args.query:
+        paths = [args.query] + paths
+    if not paths:
+        paths = [path for path in glob.glob(os.path.join(DEFAULT_OUTPUT_DIR, "*"))
+                 if path.endswith(".json") or os.path.exists(os.path.join(path, VECTORS_FILE))]
+
+    started = time.perf_counter()
+    index = LocalIndex.load(paths)
+    print(f"📦 Načteno {len(index)} vektorů za {time.perf_counter() - started:.2f}s")
+
+    if args.recall:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(index), size=min(args.recall, len(index)), replace=False)
+        print(json.dumps(measure_recall(index, index.matrix[sample], args.k, args.ef), indent=2))
+        return
+
+    results = index.search(get_embedding(args.query), args.k, args.source, args.date_from, args.date_to)[0]
+    for score, record in results:
+        print(f"{score:.3f}  [{record.get('source', '?')}, {record.get('date', '')}] {record.get('title', '')}")
+        print(f"       {record.get('chunk', '')[:200]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Detekce duplicitních a téměř duplicitních textů před embeddingem.
+
+Dvě úrovně kontroly (na článek i na chunk):
+1. přesná shoda - sha256 normalizovaného textu (malá písmena, jen slova),
+2. téměř shoda - MinHash podpis ze slovních 5-gramů a LSH (16 pásem po 8
+   řádcích) pro rychlé nalezení kandidátů; duplicita se potvrdí odhadem
+   Jaccardovy podobnosti z podpisů.
+
+U duplicitního chunku se vrátí id už existujícího bodu v Qdrantu, takže se
+nemusí znovu platit embedding ani ukládat další vektor. Chunk se proto
+registruje jako originál až po úspěšném nahrání jeho bodu a při smazání
+bodu se z indexu odebere. Index je v SQLite a přežívá mezi běhy.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+DEFAULT_DB = os.getenv("DEDUP_DB", "VYSTUP_dedup.sqlite")
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Od jaké odhadnuté Jaccardovy podobnosti je text duplicitní
+DEFAULT_THRESHOLD = 0.8
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+# Pevné seedy, aby podpisy z různých běhů šly porovnat
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+WORD_RE = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    exact_hash TEXT NOT NULL,
+    signature BLOB
+);
+CREATE INDEX IF NOT EXISTS items_exact ON items (kind, exact_hash);
+CREATE INDEX IF NOT EXISTS items_ref ON items (kind, ref);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    kind TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    item_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_lookup ON lsh_buckets (kind, band, bucket);
+CREATE INDEX IF NOT EXISTS lsh_item ON lsh_buckets (item_id);
+"""
+
+
+def normalize_words(text: str) -> list[str]:
+    return WORD_RE.findall(text.lower())
+
+
+def exact_hash(words: list[str]) -> str:
+    return hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+
+
+def minhash(words: list[str]) -> np.ndarray | None:
+    """MinHash podpis ze slovních n-gramů, nebo None pro text kratší než jeden n-gram."""
+    if len(words) < SHINGLE_SIZE:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    values = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    # (a * x + b) mod p pro všechny permutace najednou: matice NUM_PERM x počet shinglů
+    hashed = (np.outer(_PERM_A, values) + _PERM_B[:, None]) % MERSENNE_PRIME & MAX_HASH
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def _band_buckets(signature: np.ndarray):
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        yield band, int.from_bytes(digest, "little", signed=True)
+
+
+class DedupIndex:
+    """
+    Index už zpracovaných textů. `kind` odděluje úrovně ("article", "chunk"),
+    `ref` je odkaz na originál (URL článku, id bodu v Qdrantu).
+    Lze sdílet mezi vlákny (pipeline, callback uploaderu), přístup hlídá zámek.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.counters = {"exact": 0, "near": 0, "unique": 0}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def find(self, kind: str, text: str) -> tuple[str, float] | None:
+        """Vrátí (ref, podobnost) nejpodobnějšího známého textu nad prahem, jinak None."""
+        with self._lock:
+            return self._find(kind, text)
+
+    def _find(self, kind: str, text: str) -> tuple[str, float] | None:
+        words = normalize_words(text)
+        row = self.conn.execute(
+            "SELECT ref FROM items WHERE kind = ? AND exact_hash = ? LIMIT 1", (kind, exact_hash(words))
+        ).fetchone()
+        if row:
+            self.counters["exact"] += 1
+            return row[0], 1.0
+
+        signature = minhash(words)
+        if signature is not None:
+            candidates = set()
+            for band, bucket in _band_buckets(signature):
+                candidates.update(item_id for (item_id,) in self.conn.execute(
+                    "SELECT item_id FROM lsh_buckets WHERE kind = ? AND band = ? AND bucket = ?", (kind, band, bucket)
+                ))
+            best = None
+            for item_id in candidates:
+                ref, blob = self.conn.execute("SELECT ref, signature FROM items WHERE id = ?", (item_id,)).fetchone()
+                similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (ref, similarity)
+            if best:
+                self.counters["near"] += 1
+                return best
+
+        self.counters["unique"] += 1
+        return None
+
+    def add(self, kind: str, text: str, ref: str):
+        """Zaregistruje text jako originál, na který mohou odkazovat pozdější duplicity."""
+        words = normalize_words(text)
+        signature = minhash(words)
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO items (kind, ref, exact_hash, signature) VALUES (?, ?, ?, ?)",
+                (kind, ref, exact_hash(words), signature.tobytes() if signature is not None else None),
+            )
+            if signature is not None:
+                self.conn.executemany(
+                    "INSERT INTO lsh_buckets (kind, band, bucket, item_id) VALUES (?, ?, ?, ?)",
+                    ((kind, band, bucket, cursor.lastrowid) for band, bucket in _band_buckets(signature)),
+                )
+
+    def remove(self, kind: str, refs: list[str]):
+        """Odebere originály (např. smazané body), aby na ně už nic neodkazovalo."""
+        if not refs:
+            return
+        with self._lock, self.conn:
+            for start in range(0, len(refs), 500):
+                part = refs[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                ids = [item_id for (item_id,) in self.conn.execute(
+                    f"SELECT id FROM items WHERE kind = ? AND ref IN ({placeholders})", (kind, *part)
+                )]
+                if ids:
+                    id_list = ",".join("?" * len(ids))
+                    self.conn.execute(f"DELETE FROM lsh_buckets WHERE item_id IN ({id_list})", ids)
+                    self.conn.execute(f"DELETE FROM items WHERE id IN ({id_list})", ids)
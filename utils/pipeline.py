@@ -0,0 +1,486 @@
+"""
+Proudová ingestní pipeline: stažení -> extrakce -> chunky -> embeddingy -> Qdrant.
+
+Fáze běží souběžně a předávají si práci přes omezené fronty, takže síť
+(stahování, OpenAI, Qdrant) i CPU (extrakce, tokenizace) pracují zároveň
+a plná fronta zpomalí předchozí fázi místo hromadění v paměti:
+
+    zdroj ─► [fetch] ─► [extract] ─► články ─► [chunk] ─► [embed] ─► [upsert]
+
+- zdroj: adresář JSON souborů (`scrapnute_clanky/`), úložiště článků
+  nebo seznam URL (soubor / stdin, tedy i živý výstup crawleru),
+- chunk: rozdělení článku a porovnání s body v kolekci (jako indexer.py),
+  dál jdou jen nové a změněné chunky, zastaralé se smažou; chunky převzaté
+  z jiného článku (`DedupIndex`) se neembedují, jen se připíšou k originálu,
+- embed: chunky z více článků se skládají do dávek pro `get_embeddings_async`,
+- upsert: `BulkUploader` + lexikální index.
+
+Každá fáze má vlastní počet workerů. Manifest běhu (SQLite) eviduje stav
+každého článku; článek je "done", až když Qdrant potvrdil všechny jeho
+body. `--resume RUN_ID` po pádu přeskočí hotové články a zbytek dokončí.
+
+Použití:
+    python utils/pipeline.py --dir scrapnute_clanky
+    python utils/pipeline.py --store VYSTUP_article_store --embed-workers 8
+    python scraping/sitemaps.py ... | python utils/pipeline.py --urls - --save-store
+    python utils/pipeline.py --dir scrapnute_clanky --resume 20250623-170552
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraping.article_store import ArticleStore, DEFAULT_STORE_DIR, content_hash
+from scraping.batch_scrape import DEFAULT_MAX_TASKS_PER_CHILD, REQUEST_TIMEOUT, fetch_one, read_urls
+from scraping.politeness import PRIORITY_BACKFILL, PolitenessScheduler
+from utils.chunking import split_text_smart_async
+from utils.embedding import create_client, get_embeddings_async
+from utils.indexer import article_chunks, attach_duplicates, diff_article
+from utils.lexical_index import LexicalIndex
+from utils.near_duplicates import DedupIndex
+from utils.qdrant import QDRANT_COLLECTION, UPLOAD_BATCH_SIZE, UPLOAD_WORKERS, BulkUploader, delete_points, ensure_collection_exists
+
+DEFAULT_MANIFEST = os.getenv("PIPELINE_MANIFEST", "VYSTUP_pipeline_runs.sqlite")
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_FETCH_WORKERS = 16
+DEFAULT_EXTRACT_WORKERS = os.cpu_count() or 1
+DEFAULT_CHUNK_WORKERS = 4
+DEFAULT_EMBED_WORKERS = 4
+# Kolik chunků (z různých článků) embed worker skládá do jednoho volání
+EMBED_BATCH = 256
+REPORT_EVERY = 10.0  # s
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    options TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    content_hash TEXT,
+    status TEXT NOT NULL,
+    chunks INTEGER,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (run_id, url)
+);
+"""
+
+
+class RunManifest:
+    """Stav článků jednoho běhu; hotové články se při `--resume` přeskočí."""
+
+    def __init__(self, run_id: str, path: str = DEFAULT_MANIFEST, options: dict | None = None):
+        self.run_id = run_id
+        # Zapisuje se z jednoho vlákna mimo smyčku událostí (`Pipeline._mark`)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, started, options) VALUES (?, ?, ?)",
+                (run_id, time.time(), json.dumps(options or {}, ensure_ascii=False)),
+            )
+        self.done = {
+            url: digest for url, digest in self.conn.execute(
+                "SELECT url, content_hash FROM items WHERE run_id = ? AND status = 'done'", (run_id,)
+            )
+        }
+
+    def close(self):
+        self.conn.close()
+
+    def is_done(self, url: str, digest: str | None = None) -> bool:
+        """Hotový článek; se zadaným hashem jen pokud se mezitím nezměnil obsah."""
+        return url in self.done and (digest is None or self.done[url] == digest)
+
+    def mark(self, url: str, status: str, digest: str | None = None, chunks: int | None = None, error: str | None = None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO items (run_id, url, content_hash, status, chunks, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.run_id, url, digest, status, chunks, error, time.time()),
+            )
+        if status == "done":
+            self.done[url] = digest
+
+    def finish(self):
+        with self.conn:
+            self.conn.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (time.time(), self.run_id))
+
+    def summary(self) -> dict:
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM items WHERE run_id = ? GROUP BY status", (self.run_id,)))
+
+
+def iter_json_dir(directory: str):
+    """Články ze starých souborů `{zdroj}_article_*.json`."""
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            with open(path, encoding="utf-8") as f:
+                article = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Nelze načíst {path}: {e}", file=sys.stderr)
+            continue
+        name = os.path.basename(path)
+        if not article.get("source") and "_article_" in name:
+            article["source"] = name.split("_article_")[0]
+        yield article
+
+
+async def _stage(name: str, workers: int, work, inbox: asyncio.Queue, outbox: asyncio.Queue | None, downstream: int):
+    """Spustí `workers` kopií `work(položka)`; po skončení pošle dál `downstream` zarážek None."""
+
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            try:
+                await work(item)
+            except Exception as e:
+                print(f"❌ Fáze {name}: {e}", file=sys.stderr)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    if outbox is not None:
+        for _ in range(downstream):
+            await outbox.put(None)
+
+
+class Pipeline:
+    def __init__(
+        self,
+        manifest: RunManifest,
+        collection_name: str = QDRANT_COLLECTION,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        fetch_workers: int = DEFAULT_FETCH_WORKERS,
+        extract_workers: int = DEFAULT_EXTRACT_WORKERS,
+        chunk_workers: int = DEFAULT_CHUNK_WORKERS,
+        embed_workers: int = DEFAULT_EMBED_WORKERS,
+        upload_workers: int = UPLOAD_WORKERS,
+        batch_size: int = UPLOAD_BATCH_SIZE,
+        store: ArticleStore | None = None
+    ):
+        self.manifest = manifest
+        self.collection_name = collection_name
+        self.queue_size = queue_size
+        self.fetch_workers = fetch_workers
+        self.extract_workers = extract_workers
+        self.chunk_workers = chunk_workers
+        self.embed_workers = embed_workers
+        self.upload_workers = upload_workers
+        self.batch_size = batch_size
+        self.store = store
+        self.counters = {"articles": 0, "skipped": 0, "chunks": 0, "duplicates": 0, "embedded": 0, "uploaded": 0,
+                         "done": 0, "errors": 0}
+        # url -> [zbývající body, hash obsahu, počet chunků, zastaralá id, duplicity k připojení]
+        self._pending = {}
+        self._finishing = set()
+        # Články s duplicitami: hotové až po připojení k originálům za bariérou uploaderu
+        self._deferred = []
+        self._dedup = None
+        self._manifest_writer = None
+
+    # --- Zdroje ---
+    async def _feed_articles(self, articles, queue: asyncio.Queue):
+        for article in articles:
+            if not article.get("url") or not article.get("content"):
+                continue
+            if self.manifest.is_done(article["url"], content_hash(article["content"])):
+                self.counters["skipped"] += 1
+                continue
+            await queue.put(article)
+            # Synchronní iterátor (soubory, úložiště) nesmí blokovat ostatní fáze
+            await asyncio.sleep(0)
+
+    async def _feed_urls(self, urls, queue: asyncio.Queue):
+        """Stáhne a extrahuje články ze seznamu URL (stejné fáze jako batch_scrape.py)."""
+        html_queue = asyncio.Queue(maxsize=self.queue_size)
+        url_queue = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+        scheduler = PolitenessScheduler()
+        # Procesy extrakce se recyklují kvůli paměti lxml/trafilatury (jako v batch_scrape.py)
+        pool = ProcessPoolExecutor(max_workers=self.extract_workers, max_tasks_per_child=DEFAULT_MAX_TASKS_PER_CHILD)
+        # Úložiště má jednoho zapisovatele: zápisy (gzip, fsync, SQLite) popořadě v jednom vlákně mimo smyčku
+        store_writer = ThreadPoolExecutor(max_workers=1)
+        limits = httpx.Limits(max_connections=self.fetch_workers, max_keepalive_connections=self.fetch_workers)
+        try:
+            async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, http2=True, follow_redirects=True) as client:
+
+                async def fetch(url):
+                    item = await fetch_one(client, url, scheduler, PRIORITY_BACKFILL)
+                    if "error" in item:
+                        self.counters["errors"] += 1
+                        await self._mark(url, "error", error=item["error"])
+                    else:
+                        await html_queue.put(item)
+
+                async def extract(item):
+                    article = await loop.run_in_executor(pool, item["extractor"], item["html"], item["url"])
+                    if not article or not article.get("content"):
+                        self.counters["errors"] += 1
+                        await self._mark(item["url"], "error", error="Nepodařilo se získat obsah článku")
+                        return
+                    article = {"source": item["source"], **article}
+                    if self.store is not None:
+                        await loop.run_in_executor(store_writer, self.store.put, article)
+                    await queue.put(article)
+
+                async def produce():
+                    for url in urls:
+                        if not self.manifest.is_done(url):
+                            await url_queue.put(url)
+                        else:
+                            self.counters["skipped"] += 1
+                    for _ in range(self.fetch_workers):
+                        await url_queue.put(None)
+
+                await asyncio.gather(
+                    produce(),
+                    _stage("fetch", self.fetch_workers, fetch, url_queue, html_queue, self.extract_workers),
+                    _stage("extract", self.extract_workers, extract, html_queue, None, 0),
+                )
+        finally:
+            pool.shutdown()
+            store_writer.shutdown()
+            await scheduler.aclose()
+
+    # --- Zpracování ---
+    async def run(self, articles=None, urls=None):
+        article_queue = asyncio.Queue(maxsize=self.queue_size)
+        chunk_queue = asyncio.Queue(maxsize=self.queue_size)
+        embedded_queue = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+        openai_client = create_client()
+        lexical = LexicalIndex()
+        self._dedup = dedup = DedupIndex()
+        # Manifest se commituje po každém článku: zápisy popořadě v jednom vlákně mimo smyčku
+        self._manifest_writer = ThreadPoolExecutor(max_workers=1)
+
+        def batch_done(points):
+            # Voláno z vlákna uploaderu: potvrzené body se stanou originály pro deduplikaci,
+            # stav pipeline se mění jen ve smyčce událostí
+            for point in points:
+                dedup.add("chunk", point.payload["chunk"], str(point.id))
+            loop.call_soon_threadsafe(self._points_uploaded, points)
+
+        uploader = BulkUploader(self.collection_name, self.batch_size, self.upload_workers, on_batch_done=batch_done)
+        started = time.monotonic()
+
+        async def source():
+            if urls is not None:
+                await self._feed_urls(urls, article_queue)
+            else:
+                await self._feed_articles(articles, article_queue)
+            for _ in range(self.chunk_workers):
+                await article_queue.put(None)
+
+        async def chunk(article):
+            url, digest = article["url"], content_hash(article["content"])
+            if url in self._pending:
+                # Stejná URL už se v tomto běhu zpracovává (např. dvě kopie v adresáři)
+                self.counters["skipped"] += 1
+                return
+            self.counters["articles"] += 1
+            self._pending[url] = [0, digest, 0, [], []]
+            try:
+                # Dělení (i případné LLM zpřesnění) běží ve smyčce, do vlákna jde jen dotaz na Qdrant a deduplikace
+                wanted = article_chunks(article, await split_text_smart_async(article["content"]))
+                missing, stale, duplicates = await asyncio.to_thread(
+                    diff_article, url, wanted, self.collection_name, dedup
+                )
+            except Exception as e:
+                self.counters["errors"] += 1
+                self._pending.pop(url, None)
+                await self._mark(url, "error", digest, error=str(e))
+                return
+            links = [(original_id, wanted[point_id][1]) for point_id, original_id in duplicates.items()]
+            self.counters["duplicates"] += len(links)
+            self._pending[url] = [len(missing), digest, len(wanted), stale, links]
+            if not missing:
+                await self._finish_article(url)
+                return
+            self.counters["chunks"] += len(missing)
+            await chunk_queue.put((url, [(point_id, *wanted[point_id]) for point_id in missing]))
+
+        async def embed(first):
+            # Přibereme další čekající články, ať je volání API co nejplnější
+            items, size = [first], len(first[1])
+            while size < EMBED_BATCH:
+                try:
+                    item = chunk_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    # Zarážku vrátíme zpět pro jiného workera
+                    chunk_queue.put_nowait(None)
+                    break
+                items.append(item)
+                size += len(item[1])
+
+            texts = [chunk for _, chunks in items for _, chunk, _ in chunks]
+            vectors = iter(await get_embeddings_async(texts, return_exceptions=True, client=openai_client))
+            for url, chunks in items:
+                results = [(point_id, chunk, metadata, next(vectors)) for point_id, chunk, metadata in chunks]
+                failed = [vector for *_, vector in results if isinstance(vector, Exception)]
+                if failed:
+                    self.counters["errors"] += 1
+                    self._pending.pop(url, None)
+                    await self._mark(url, "error", error=str(failed[0]))
+                    continue
+                self.counters["embedded"] += len(results)
+                await embedded_queue.put((url, results))
+
+        async def upsert(item):
+            url, results = item
+
+            def add_all():
+                lexical.add_chunks([(point_id, chunk, metadata) for point_id, chunk, metadata, _ in results])
+                for point_id, chunk, metadata, vector in results:
+                    uploader.add(chunk, vector, metadata, point_id=point_id)
+
+            # Zápis do SQLite i add(), které blokuje, když jsou všechna vlákna uploaderu vytížená
+            await asyncio.to_thread(add_all)
+
+        async def report():
+            while True:
+                await asyncio.sleep(REPORT_EVERY)
+                elapsed = time.monotonic() - started
+                print(f"📈 {elapsed:.0f}s: článků {self.counters['articles']} (hotovo {self.counters['done']}), "
+                      f"chunků {self.counters['chunks']}, embeddingů {self.counters['embedded']}, "
+                      f"nahráno {self.counters['uploaded']} | fronty {article_queue.qsize()}/{chunk_queue.qsize()}/"
+                      f"{embedded_queue.qsize()}", file=sys.stderr)
+
+        reporter = asyncio.create_task(report())
+        try:
+            await asyncio.gather(
+                source(),
+                _stage("chunk", self.chunk_workers, chunk, article_queue, chunk_queue, self.embed_workers),
+                _stage("embed", self.embed_workers, embed, chunk_queue, embedded_queue, 1),
+                # Jeden upsert worker stačí, paralelně nahrává až BulkUploader
+                _stage("upsert", 1, upsert, embedded_queue, None, 0),
+            )
+            await asyncio.to_thread(uploader.close)
+            # Callbacky posledních dávek ještě čekají ve smyčce, pak jejich dokončení článků
+            await asyncio.sleep(0)
+            await asyncio.gather(*self._finishing)
+            # Za bariérou jsou originály v kolekci určitě vidět
+            for url, digest, chunks, links in self._deferred:
+                await asyncio.to_thread(attach_duplicates, links, self.collection_name)
+                await self._mark(url, "done", digest, chunks)
+                self.counters["done"] += 1
+
+            for url in [url for url, state in self._pending.items() if state[0] > 0]:
+                await self._mark(url, "error", self._pending[url][1], error="Body nebyly nahrány")
+            await loop.run_in_executor(self._manifest_writer, self.manifest.finish)
+        finally:
+            reporter.cancel()
+            lexical.close()
+            dedup.close()
+            self._manifest_writer.shutdown()
+            await openai_client.close()
+
+        elapsed = time.monotonic() - started
+        print(f"✅ Běh {self.manifest.run_id}: článků {self.counters['done']} hotovo, {self.counters['skipped']} přeskočeno, "
+              f"{self.counters['errors']} chyb; {self.counters['uploaded']} bodů za {elapsed:.1f}s, "
+              f"{self.counters['duplicates']} duplicitních chunků")
+        return self.counters
+
+    def _points_uploaded(self, points):
+        self.counters["uploaded"] += len(points)
+        for point in points:
+            state = self._pending.get(point.payload["url"])
+            if state is None:
+                continue
+            state[0] -= 1
+            if state[0] == 0:
+                task = asyncio.get_running_loop().create_task(self._finish_article(point.payload["url"]))
+                self._finishing.add(task)
+                task.add_done_callback(self._finishing.discard)
+
+    async def _finish_article(self, url: str):
+        """Všechny body článku jsou v Qdrantu: smažou se zastaralé a článek se označí jako hotový."""
+        _, digest, chunks, stale, links = self._pending.pop(url)
+        if stale:
+            await asyncio.to_thread(self._dedup.remove, "chunk", stale)
+            await asyncio.to_thread(delete_points, stale, self.collection_name)
+        if links:
+            self._deferred.append((url, digest, chunks, links))
+            return
+        await self._mark(url, "done", digest, chunks)
+        self.counters["done"] += 1
+
+    async def _mark(self, url: str, status: str, digest: str | None = None, chunks: int | None = None,
+                    error: str | None = None):
+        """`RunManifest.mark` ve vlákně zapisovatele manifestu."""
+        await asyncio.get_running_loop().run_in_executor(
+            self._manifest_writer, self.manifest.mark, url, status, digest, chunks, error
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proudová ingestní pipeline do Qdrantu.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Adresář JSON souborů článků (např. scrapnute_clanky)")
+    source.add_argument("--store", nargs="?", const=DEFAULT_STORE_DIR, help="Úložiště článků")
+    source.add_argument("--urls", help="Soubor s URL, nebo - pro stdin")
+    parser.add_argument("--save-store", nargs="?", const=DEFAULT_STORE_DIR,
+                        help="Stažené články (--urls) uložit i do úložiště")
+    parser.add_argument("--collection", default=QDRANT_COLLECTION)
+    parser.add_argument("--resume", metavar="RUN_ID", help="Navázat na přerušený běh")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE, help="Velikost front mezi fázemi")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--extract-workers", type=int, default=DEFAULT_EXTRACT_WORKERS)
+    parser.add_argument("--chunk-workers", type=int, default=DEFAULT_CHUNK_WORKERS)
+    parser.add_argument("--embed-workers", type=int, default=DEFAULT_EMBED_WORKERS)
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS)
+    parser.add_argument("--batch", type=int, default=UPLOAD_BATCH_SIZE, help="Velikost dávky pro Qdrant")
+    args = parser.parse_args()
+
+    run_id = args.resume or datetime.now().strftime("%Y%m%d-%H%M%S")
+    manifest = RunManifest(run_id, args.manifest, {key: value for key, value in vars(args).items() if value is not None})
+    if args.resume:
+        print(f"↩️ Navazuji na běh {run_id} ({len(manifest.done)} hotových článků)")
+    ensure_collection_exists(args.collection)
+
+    store = None
+    articles = urls = None
+    if args.store:
+        store = ArticleStore(args.store)
+        articles = store.iter_articles()
+    elif args.dir:
+        articles = iter_json_dir(args.dir)
+    else:
+        urls = read_urls(args.urls)
+        if args.save_store:
+            store = ArticleStore(args.save_store)
+
+    pipeline = Pipeline(
+        manifest, args.collection, args.queue, args.fetch_workers, args.extract_workers, args.chunk_workers,
+        args.embed_workers, args.upload_workers, args.batch, store if urls is not None else None,
+    )
+    try:
+        asyncio.run(pipeline.run(articles=articles, urls=urls))
+    finally:
+        if store is not None:
+            store.close()
+        print(f"📋 Manifest {args.manifest}, běh {run_id}: {manifest.summary()}")
+        manifest.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,318 @@
+import hashlib
 import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http.models import (
     PointStruct, VectorParams, Distance, CollectionStatus, CollectionInfo,
-    CreateCollection
+    CreateCollection, Filter, FieldCondition, MatchValue, PointIdsList,
+    HnswConfigDiff, PayloadSchemaType
 )
 import uuid
 
+import numpy as np
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.near_duplicates import DedupIndex
+from utils.vector_files import iter_metadata, load_vectors
+
 # 🔐 Načti API klíč a URL z .env
 load_dotenv()
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "articles")
+# gRPC je pro hromadné nahrávání výrazně rychlejší než REST (port 6334)
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "").lower() in ("1", "true", "yes")
+UPLOAD_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", "256"))
+UPLOAD_WORKERS = int(os.getenv("QDRANT_UPLOAD_WORKERS", "4"))
+UPLOAD_RETRIES = 3
+# 🕸️ Parametry HNSW grafu: m = počet hran na uzel, ef_construct = šíře hledání při stavbě
+HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "128"))
+# Indexy payloadu pro filtrování (bez nich Qdrant filtruje procházením všech bodů)
+PAYLOAD_INDEXES = {
+    "source": PayloadSchemaType.KEYWORD,
+    "url": PayloadSchemaType.KEYWORD,
+    "date": PayloadSchemaType.DATETIME,
+    "chunk_index": PayloadSchemaType.INTEGER,
+}
 
-# 🧠 Inicializace klienta
-client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY
-)
+# 🆔 Pevný jmenný prostor pro uuid5 id bodů - nesmí se měnit, jinak se změní všechna id
+POINT_NAMESPACE = uuid.UUID("6f1c2a4e-5b7d-4c1e-9a3f-2d8e0b4c6a15")
+
+# 🧠 Klient se vytvoří až při prvním použití
+_client = None
+
+def get_client() -> QdrantClient:
+    global _client
+    if _client is None:
+        _client = QdrantClient(
+            url=QDRANT_URL,
+            api_key=QDRANT_API_KEY,
+            prefer_grpc=QDRANT_PREFER_GRPC
+        )
+    return _client
+
+def create_async_client() -> AsyncQdrantClient:
+    """Asynchronní klient pro dlouho běžící služby (vlastní pool spojení)."""
+    return AsyncQdrantClient(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+        prefer_grpc=QDRANT_PREFER_GRPC
+    )
+
+def chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+def point_id_for(url: str, chunk_index: int, content_hash: str) -> str:
+    """
+    Deterministické id bodu: stejný chunk stejného článku dostane vždy stejné id,
+    takže opakované nahrání bod přepíše místo založení duplicitního.
+    """
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{url}\0{chunk_index}\0{content_hash}"))
 
 def ensure_collection_exists(collection_name: str = QDRANT_COLLECTION, vector_size: int = 1536):
     """
     Zkontroluje, jestli kolekce existuje – pokud ne, vytvoří ji.
+    V obou případech doplní chybějící indexy payloadu.
     """
+    client = get_client()
     if not client.collection_exists(collection_name):
         print(f"📁 Kolekce '{collection_name}' neexistuje, vytvářím...")
         client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+            hnsw_config=HnswConfigDiff(m=HNSW_M, ef_construct=HNSW_EF_CONSTRUCT)
         )
     else:
         print(f"✅ Kolekce '{collection_name}' existuje.")
+    ensure_payload_indexes(collection_name)
+
+def ensure_payload_indexes(collection_name: str = QDRANT_COLLECTION):
+    """Založí indexy payloadu z `PAYLOAD_INDEXES`, které v kolekci ještě nejsou."""
+    client = get_client()
+    existing = client.get_collection(collection_name).payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            client.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+            print(f"🗂️ Index payloadu '{field}' ({schema.value}) vytvořen.")
+
+def configure_hnsw(m: int | None = None, ef_construct: int | None = None, collection_name: str = QDRANT_COLLECTION):
+    """Změní parametry HNSW existující kolekce (Qdrant graf na pozadí přestaví)."""
+    get_client().update_collection(
+        collection_name=collection_name,
+        hnsw_config=HnswConfigDiff(m=m, ef_construct=ef_construct)
+    )
 
 def upload_chunk(
     chunk: str,
     embedding: list[float],
     metadata: dict,
-    collection_name: str = QDRANT_COLLECTION
+    collection_name: str = QDRANT_COLLECTION,
+    point_id: str | None = None
 ):
     """
-    Nahraje jeden chunk s embeddingem a metadaty do kolekce
+    Nahraje jeden chunk s embeddingem a metadaty do kolekce.
+    Bez `point_id` se id odvodí z URL, pořadí a hashe chunku (`point_id_for`).
     """
-    point_id = str(uuid.uuid4())
+    content_hash = chunk_hash(chunk)
+    point_id = point_id or metadata.get("point_id") or point_id_for(
+        metadata.get("url", ""), metadata.get("chunk_index", 0), content_hash
+    )
     point = PointStruct(
         id=point_id,
         vector=embedding,
         payload={
             "chunk": chunk,
+            "content_hash": content_hash,
             **metadata  # např. title, url, source, date, etc.
         }
     )
-    client.upsert(collection_name=collection_name, points=[point])
+    get_client().upsert(collection_name=collection_name, points=[point])
     print(f"🟢 Uložen chunk: {metadata.get('title', '')[:40]}...")
+    return point_id
+
+def get_indexed_chunks(url: str, collection_name: str = QDRANT_COLLECTION) -> dict[str, dict]:
+    """Vrátí {id bodu: payload (chunk_index, content_hash)} všech bodů článku s danou URL."""
+    client = get_client()
+    indexed, offset = {}, None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=Filter(must=[FieldCondition(key="url", match=MatchValue(value=url))]),
+            with_payload=["chunk_index", "content_hash"],
+            with_vectors=False,
+            limit=256,
+            offset=offset,
+        )
+        indexed.update({str(point.id): point.payload or {} for point in points})
+        if offset is None:
+            return indexed
+
+def delete_points(point_ids: list[str], collection_name: str = QDRANT_COLLECTION):
+    if point_ids:
+        get_client().delete(collection_name=collection_name, points_selector=PointIdsList(points=point_ids))
+
+def add_duplicate_source(point_id: str, metadata: dict, collection_name: str = QDRANT_COLLECTION):
+    """
+    Duplicitní chunk nedostane vlastní bod: jeho URL se jen připíše
+    do `duplicate_urls` existujícího bodu, aby hledání vrátilo všechny zdroje.
+    """
+    client = get_client()
+    points = client.retrieve(collection_name=collection_name, ids=[point_id], with_payload=["url", "duplicate_urls"])
+    if not points:
+        print(f"⚠️ Bod {point_id} v kolekci není, duplicitu nelze připojit.")
+        return
+    payload = points[0].payload or {}
+    urls = payload.get("duplicate_urls", [])
+    url = metadata.get("url")
+    if url and url != payload.get("url") and url not in urls:
+        client.set_payload(collection_name=collection_name, payload={"duplicate_urls": urls + [url]}, points=[point_id])
+        print(f"🔗 Duplicitní chunk připojen k bodu {point_id}")
+
+class BulkUploader:
+    """
+    Hromadné nahrávání bodů: `add()` plní dávky po `batch_size`, plné dávky
+    nahrává `workers` vláken souběžně. S `wait=False` Qdrant jen potvrdí přijetí
+    do WAL a body zaindexuje na pozadí; `close()` počká na všechny dávky,
+    udělá závěrečnou bariéru a vypíše rychlost v bodech za sekundu.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = QDRANT_COLLECTION,
+        batch_size: int = UPLOAD_BATCH_SIZE,
+        workers: int = UPLOAD_WORKERS,
+        wait: bool = False,
+        client: QdrantClient | None = None,
+        on_batch_done=None
+    ):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.wait = wait
+        self.client = client or get_client()
+        # Volá se (z vlákna uploaderu) se seznamem bodů po úspěšném nahrání dávky
+        self.on_batch_done = on_batch_done
+        self.uploaded = 0
+        self.errors = []
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_batch = None
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        # Nejvýš dvě dávky na vlákno čekají v paměti, pak add() zablokuje
+        self._in_flight = threading.BoundedSemaphore(workers * 2)
+        self._started = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, chunk: str, embedding, metadata: dict, point_id: str | None = None) -> str:
+        if self._started is None:
+            self._started = time.perf_counter()
+        content_hash = chunk_hash(chunk)
+        point_id = point_id or metadata.get("point_id") or point_id_for(
+            metadata.get("url", ""), metadata.get("chunk_index", 0), content_hash
+        )
+        vector = embedding.tolist() if isinstance(embedding, np.ndarray) else embedding
+        self._buffer.append(PointStruct(
+            id=point_id, vector=vector, payload={"chunk": chunk, "content_hash": content_hash, **metadata}
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return point_id
+
+    def flush(self):
+        """Odešle rozpracovanou dávku (nečeká na její dokončení)."""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._last_batch = batch
+        self._in_flight.acquire()
+        self._futures.append(self._executor.submit(self._upload, batch, self.wait))
+
+    def _upload(self, batch: list, wait: bool):
+        try:
+            for attempt in range(UPLOAD_RETRIES + 1):
+                try:
+                    self.client.upsert(collection_name=self.collection_name, points=batch, wait=wait)
+                    break
+                except Exception as e:
+                    if attempt >= UPLOAD_RETRIES:
+                        print(f"❌ Dávka {len(batch)} bodů se nenahrála: {e}")
+                        self.errors.append(e)
+                        return
+                    time.sleep(2 ** attempt)
+            with self._lock:
+                self.uploaded += len(batch)
+            # Mimo opakování: chyba callbacku nesmí dávku poslat znovu ani ji vykázat jako nenahranou
+            if self.on_batch_done is not None:
+                try:
+                    self.on_batch_done(batch)
+                except Exception as e:
+                    print(f"❌ Zpracování potvrzené dávky selhalo: {e}")
+                    self.errors.append(e)
+        finally:
+            self._in_flight.release()
+
+    def close(self):
+        self.flush()
+        for future in self._futures:
+            future.result()
+        self._executor.shutdown()
+        # Bariéra: operace se v Qdrantu aplikují v pořadí, takže jakmile je s wait=True
+        # aplikovaná znovu poslaná poslední dávka (upsert je idempotentní), jsou i všechny předchozí
+        if not self.wait and self._last_batch:
+            self.client.upsert(collection_name=self.collection_name, points=self._last_batch, wait=True)
+        if self._started is not None:
+            elapsed = time.perf_counter() - self._started
+            print(f"🚀 Nahráno {self.uploaded} bodů za {elapsed:.1f}s "
+                  f"({self.uploaded / max(elapsed, 1e-9):.0f} bodů/s, dávka {self.batch_size}, vláken {self.workers})")
+        if self.errors:
+            raise self.errors[0]
+
+def upload_output(directory: str, collection_name: str = QDRANT_COLLECTION, dedup: DedupIndex | None = None,
+                  **uploader_options) -> int:
+    """
+    Nahraje výstup test_pipeline.py (vectors.npy + metadata.jsonl) do kolekce.
+    Vektory se čtou přes memmap, duplicity se po nahrání připojí k originálům.
+    S `dedup` se body potvrzené Qdrantem zaregistrují jako originály
+    pro deduplikaci dalších článků.
+    """
+    # Výstup jen s duplicitami nemá vectors.npy (VectorWriter ho při zavření smaže)
+    vectors, records = load_vectors(directory)
+    if records:
+        ensure_collection_exists(collection_name, vector_size=vectors.shape[1])
+    else:
+        ensure_collection_exists(collection_name)
+    duplicates = [record for record in iter_metadata(directory) if record.get("duplicate_of")]
+    acked = deque()
+    try:
+        with BulkUploader(collection_name, on_batch_done=acked.extend, **uploader_options) as uploader:
+            for record in records:
+                uploader.add(record["chunk"], vectors[record["row"]], record["metadata"])
+    finally:
+        # I při chybě jiné dávky: co Qdrant potvrdil, v kolekci je
+        if dedup is not None:
+            for point in acked:
+                dedup.add("chunk", point.payload["chunk"], str(point.id))
+    for record in duplicates:
+        add_duplicate_source(record["duplicate_of"], record["metadata"], collection_name)
+    return uploader.uploaded
 
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Použití: python utils/qdrant.py processed_data/<výstup> [kolekce]")
+        sys.exit(1)
+    with DedupIndex() as dedup:
+        upload_output(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else QDRANT_COLLECTION, dedup)
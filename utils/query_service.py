@@ -0,0 +1,294 @@
+"""
+Dlouho běžící asynchronní služba pro vyhledávání tvrzení.
+
+Drží otevřená spojení na OpenAI i Qdrant (žádný klient na dotaz) a souběžně
+příchozí dotazy skládá do mikrodávek: dotazy, které přijdou během
+`max_wait_ms` (nejvýš `max_batch`), dostanou embeddingy jedním požadavkem
+a výsledky jedním `query_batch_points`. Nedávné embeddingy dotazů
+a výsledky drží LRU cache, takže opakované tvrzení během zpravodajské
+špičky se vrátí bez sítě.
+
+HTTP rozhraní (jen standardní knihovna):
+    POST /search  {"query": "...", "limit": 10, "source": ["ct24"], "date_from": "2024-01-01", "date_to": null}
+    GET  /stats
+
+Použití:
+    python utils/query_service.py --port 8080
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from qdrant_client.http.models import QueryRequest, SearchParams
+
+from utils.embedding import EMBED_MODEL, create_client, get_embeddings_async
+from utils.qdrant import QDRANT_COLLECTION, create_async_client
+from utils.search import DEFAULT_HNSW_EF, DEFAULT_LIMIT, PAYLOAD_FIELDS, build_filter, point_to_hit
+
+MAX_BATCH = int(os.getenv("QUERY_MAX_BATCH", "32"))
+MAX_WAIT_MS = float(os.getenv("QUERY_MAX_WAIT_MS", "5"))
+CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+# Výsledky stárnou s novými články, embedding dotazu ne
+RESULT_TTL = float(os.getenv("QUERY_RESULT_TTL", "300"))
+# Kolikrát víc bodů si říct, aby po sloučení podle URL zbylo `limit` článků
+GROUP_OVERFETCH = 4
+MAX_REQUEST_BYTES = 64 * 1024
+
+
+class LRUCache:
+    def __init__(self, size: int, ttl: float | None = None):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None or (self.ttl and time.monotonic() - item[1] > self.ttl):
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, value):
+        self._items[key] = (value, time.monotonic())
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+def _group_by_url(hits: list[dict], limit: int) -> list[dict]:
+    """Z každého článku jen nejlepší chunk."""
+    seen, grouped = set(), []
+    for hit in hits:
+        if hit.get("url") not in seen:
+            seen.add(hit.get("url"))
+            grouped.append(hit)
+        if len(grouped) >= limit:
+            break
+    return grouped
+
+
+class QueryService:
+    def __init__(
+        self,
+        collection_name: str = QDRANT_COLLECTION,
+        max_batch: int = MAX_BATCH,
+        max_wait_ms: float = MAX_WAIT_MS,
+        cache_size: int = CACHE_SIZE,
+        openai_client=None,
+        qdrant_client=None
+    ):
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.openai = openai_client or create_client()
+        self.qdrant = qdrant_client or create_async_client()
+        self.embeddings = LRUCache(cache_size)
+        self.results = LRUCache(cache_size, RESULT_TTL)
+        self.batches = 0
+        self.queries = 0
+        self._queue = asyncio.Queue()
+        self._batcher = None
+        self._tasks = set()
+
+    async def __aenter__(self):
+        self._batcher = asyncio.create_task(self._collect())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._batcher.cancel()
+        await asyncio.gather(self._batcher, *self._tasks, return_exceptions=True)
+        await self.openai.close()
+        await self.qdrant.close()
+
+    async def search(
+        self,
+        query: str,
+        limit: int = DEFAULT_LIMIT,
+        source: str | list[str] | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        group_by_url: bool = True
+    ) -> list[dict]:
+        """Stejné výsledky jako `utils.search.search`, ale přes sdílenou dávku a cache."""
+        query = _normalize_query(query)
+        if not query:
+            raise ValueError("Dotaz je prázdný")
+        self.queries += 1
+        sources = (source,) if isinstance(source, str) else tuple(source or ())
+        key = (query, limit, sources, date_from, date_to, group_by_url)
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, future))
+        hits = await future
+        self.results.put(key, hits)
+        return hits
+
+    async def _collect(self):
+        """Skládá čekající dotazy do dávek; dávka se zpracuje v samostatné úloze, další se mezitím plní."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: list):
+        self.batches += 1
+        try:
+            # Embeddingy jen pro texty, které ještě nejsou v LRU, každý text jednou
+            vectors, missing = {}, []
+            for text in dict.fromkeys(key[0] for key, _ in batch):
+                vector = self.embeddings.get(text)
+                if vector is None:
+                    missing.append(text)
+                else:
+                    vectors[text] = vector
+            if missing:
+                # Bez trvalé cache: její SQLite by blokovala smyčku obsluhující všechny dotazy, stačí vlastní LRU
+                embedded = await get_embeddings_async(missing, EMBED_MODEL, return_exceptions=True, use_cache=False,
+                                                      client=self.openai)
+                for text, vector in zip(missing, embedded):
+                    if not isinstance(vector, Exception):
+                        self.embeddings.put(text, vector)
+                        vectors[text] = vector
+
+            requests, waiting = [], []
+            for key, future in batch:
+                query, limit, sources, date_from, date_to, group_by_url = key
+                vector = vectors.get(query)
+                if vector is None:
+                    future.set_exception(RuntimeError(f"Embedding dotazu se nepodařilo získat: {query[:60]}"))
+                    continue
+                requests.append(QueryRequest(
+                    query=vector,
+                    filter=build_filter(list(sources), date_from, date_to),
+                    limit=limit * GROUP_OVERFETCH if group_by_url else limit,
+                    params=SearchParams(hnsw_ef=DEFAULT_HNSW_EF),
+                    with_payload=PAYLOAD_FIELDS,
+                ))
+                waiting.append((key, future))
+            if not requests:
+                return
+
+            responses = await self.qdrant.query_batch_points(collection_name=self.collection_name, requests=requests)
+            for (key, future), response in zip(waiting, responses):
+                hits = [point_to_hit(point) for point in response.points]
+                if key[5]:
+                    hits = _group_by_url(hits, key[1])
+                if not future.done():
+                    future.set_result(hits)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "queries": self.queries,
+            "batches": self.batches,
+            "embedding_cache": {"hits": self.embeddings.hits, "misses": self.embeddings.misses},
+            "result_cache": {"hits": self.results.hits, "misses": self.results.misses},
+        }
+
+
+# --- HTTP ---
+async def _respond(writer: asyncio.StreamWriter, status: str, body: dict):
+    payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(payload)}\r\nConnection: keep-alive\r\n\r\n".encode("latin1") + payload
+    )
+    await writer.drain()
+
+
+async def _handle(service: QueryService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Minimální HTTP/1.1 s keep-alive: POST /search a GET /stats."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode("latin1").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if length > MAX_REQUEST_BYTES:
+                await _respond(writer, "413 Payload Too Large", {"error": "Požadavek je příliš velký"})
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            if method == "GET" and path == "/stats":
+                await _respond(writer, "200 OK", service.stats())
+            elif method == "POST" and path == "/search":
+                started = time.perf_counter()
+                try:
+                    params = json.loads(body or b"{}")
+                    hits = await service.search(
+                        params["query"], int(params.get("limit", DEFAULT_LIMIT)), params.get("source"),
+                        params.get("date_from"), params.get("date_to"), params.get("group_by_url", True),
+                    )
+                except (KeyError, ValueError) as e:
+                    await _respond(writer, "400 Bad Request", {"error": str(e)})
+                    continue
+                except Exception as e:
+                    await _respond(writer, "502 Bad Gateway", {"error": str(e)})
+                    continue
+                await _respond(writer, "200 OK", {"hits": hits, "ms": round((time.perf_counter() - started) * 1000, 2)})
+            else:
+                await _respond(writer, "404 Not Found", {"error": "Neznámá cesta"})
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int, collection_name: str = QDRANT_COLLECTION):
+    async with QueryService(collection_name) as service:
+        server = await asyncio.start_server(lambda r, w: _handle(service, r, w), host, port)
+        print(f"🚀 Vyhledávací služba běží na http://{host}:{port} (kolekce '{collection_name}')")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asynchronní vyhledávací služba nad Qdrantem.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--collection", default=QDRANT_COLLECTION)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.collection))
+    except KeyboardInterrupt:
+        print("👋 Služba ukončena.")
+
+
+if __name__ == "__main__":
+    main()
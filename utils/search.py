@@ -0,0 +1,118 @@
+"""
+Vyhledávání v kolekci Qdrantu: top-k podobných chunků s filtry.
+
+- filtr podle zdroje (jeden nebo více) a rozsahu data (využívá indexy
+  payloadu z `ensure_payload_indexes`),
+- seskupení podle `url`, aby jeden dlouhý článek nezaplnil všechny výsledky,
+- `hnsw_ef` určuje šíři hledání v HNSW grafu (přesnost vs. rychlost),
+  `exact=True` projde všechny body (pro kontrolu recallu).
+
+Použití:
+    python utils/search.py "Babiš Čapí hnízdo dotace" --source ct24 --from 2024-01-01
+"""
+import argparse
+import os
+import sys
+
+# Přidáme kořen projektu do cesty kvůli sdíleným modulům
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from qdrant_client.http.models import DatetimeRange, FieldCondition, Filter, MatchAny, MatchValue, SearchParams
+
+from utils.embedding import get_embedding
+from utils.qdrant import QDRANT_COLLECTION, get_client
+
+DEFAULT_LIMIT = 10
+# Šíře hledání v HNSW grafu při dotazu; None = nastavení kolekce
+DEFAULT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "0")) or None
+PAYLOAD_FIELDS = ["chunk", "title", "url", "date", "source", "chunk_index", "duplicate_urls"]
+
+
+def build_filter(source: str | list[str] | None = None, date_from: str | None = None,
+                 date_to: str | None = None) -> Filter | None:
+    """Filtr na zdroj a rozsah data (data ve formátu RFC 3339 nebo YYYY-MM-DD, obě meze včetně)."""
+    conditions = []
+    if isinstance(source, str):
+        conditions.append(FieldCondition(key="source", match=MatchValue(value=source)))
+    elif source:
+        conditions.append(FieldCondition(key="source", match=MatchAny(any=list(source))))
+    if date_from or date_to:
+        conditions.append(FieldCondition(key="date", range=DatetimeRange(gte=date_from, lte=date_to)))
+    return Filter(must=conditions) if conditions else None
+
+
+def point_to_hit(point) -> dict:
+    return {"id": str(point.id), "score": point.score, **(point.payload or {})}
+
+
+def search(
+    query: str | list[float],
+    limit: int = DEFAULT_LIMIT,
+    source: str | list[str] | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    group_by_url: bool = True,
+    per_url: int = 1,
+    hnsw_ef: int | None = DEFAULT_HNSW_EF,
+    exact: bool = False,
+    collection_name: str = QDRANT_COLLECTION
+) -> list[dict]:
+    """
+    Vrátí nejpodobnější chunky jako slovníky (id, score + payload), seřazené podle skóre.
+    Dotaz je text (embedding se spočítá, případně vezme z cache) nebo rovnou vektor.
+    S `group_by_url` vrátí nejvýš `per_url` chunků z jednoho článku a `limit` článků.
+    """
+    vector = get_embedding(query) if isinstance(query, str) else query
+    query_filter = build_filter(source, date_from, date_to)
+    params = SearchParams(hnsw_ef=hnsw_ef, exact=exact)
+    client = get_client()
+
+    if group_by_url:
+        groups = client.query_points_groups(
+            collection_name=collection_name,
+            query=vector,
+            group_by="url",
+            limit=limit,
+            group_size=per_url,
+            query_filter=query_filter,
+            search_params=params,
+            with_payload=PAYLOAD_FIELDS,
+        ).groups
+        return [point_to_hit(point) for group in groups for point in group.hits]
+
+    points = client.query_points(
+        collection_name=collection_name,
+        query=vector,
+        limit=limit,
+        query_filter=query_filter,
+        search_params=params,
+        with_payload=PAYLOAD_FIELDS,
+    ).points
+    return [point_to_hit(point) for point in points]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vyhledávání podobných chunků v Qdrantu.")
+    parser.add_argument("query", help="Text dotazu (tvrzení)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument("--source", action="append", help="Zdroj (lze opakovat)")
+    parser.add_argument("--from", dest="date_from", help="Datum od (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Datum do (YYYY-MM-DD)")
+    parser.add_argument("--per-url", type=int, default=1, help="Chunků z jednoho článku")
+    parser.add_argument("--no-group", action="store_true", help="Neseskupovat podle URL")
+    parser.add_argument("--ef", type=int, default=DEFAULT_HNSW_EF, help="hnsw_ef pro dotaz")
+    parser.add_argument("--exact", action="store_true", help="Přesné hledání bez HNSW")
+    args = parser.parse_args()
+
+    hits = search(
+        args.query, args.limit, args.source, args.date_from, args.date_to,
+        group_by_url=not args.no_group, per_url=args.per_url, hnsw_ef=args.ef, exact=args.exact
+    )
+    for hit in hits:
+        print(f"{hit['score']:.3f}  [{hit.get('source', '?')}, {hit.get('date', '')}] {hit.get('title', '')}")
+        print(f"       {hit.get('url', '')}")
+        print(f"       {hit.get('chunk', '')[:200]}")
+
+
+if __name__ == "__main__":
+    main()
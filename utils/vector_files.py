@@ -0,0 +1,130 @@
+"""
+Binární výstup zpracovaných chunků: vektory v `.npy`, metadata vedle v JSONL.
+
+Jeden výstup je adresář se dvěma soubory:
+- `vectors.npy` - matice N x D (float32, volitelně float16) ve standardním
+  formátu NumPy, takže ji jde bez parsování otevřít přes
+  `np.load(path, mmap_mode="r")` i pro miliony vektorů,
+- `metadata.jsonl` - jeden řádek na chunk (text, metadata, `row` = řádek
+  v `vectors.npy`, nebo null u duplicit a chyb).
+
+Zapisuje se proudově: vektory se připisují na konec souboru a hlavička
+s počtem řádků se přepíše při každém flushi, takže i po pádu zůstane
+čitelné všechno do posledního flushe.
+
+Použití:
+    with VectorWriter("processed_data/run_20250623") as writer:
+        writer.add(chunk, embedding, metadata)
+    vectors, records = load_vectors("processed_data/run_20250623")
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+DEFAULT_OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'processed_data'))
+DEFAULT_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.jsonl"
+FLUSH_EVERY = 256
+
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+# Pevná délka hlavičky (násobek 64), aby šla přepsat na místě s libovolným počtem řádků
+NPY_HEADER_LEN = 128
+
+
+def _npy_header(dtype: np.dtype, rows: int, dim: int) -> bytes:
+    header = repr({"descr": dtype.str, "fortran_order": False, "shape": (rows, dim)})
+    size = NPY_HEADER_LEN - len(NPY_MAGIC) - 2
+    return NPY_MAGIC + struct.pack("<H", size) + (header.ljust(size - 1) + "\n").encode("latin1")
+
+
+class VectorWriter:
+    """
+    Proudový zápis chunků. Dimenze se určí z prvního vektoru;
+    existující výstup se nepřepisuje, nové chunky se připíší.
+    """
+
+    def __init__(self, directory: str, dtype: str = DEFAULT_DTYPE):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, VECTORS_FILE)
+        self.rows = 0
+        self.dim = None
+        self._buffer = []
+        self._records = []
+        if os.path.exists(self.vectors_path):
+            existing = np.load(self.vectors_path, mmap_mode="r")
+            if existing.dtype != self.dtype:
+                raise ValueError(f"{self.vectors_path} má typ {existing.dtype}, ne {self.dtype}")
+            self.rows, self.dim = existing.shape
+            del existing
+        self._vectors = open(self.vectors_path, "r+b" if self.rows or self.dim else "w+b")
+        self._metadata = open(os.path.join(directory, METADATA_FILE), "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, chunk: str, embedding: list[float] | None, metadata: dict, **extra) -> int | None:
+        """Přidá chunk; vrací jeho řádek ve `vectors.npy`, nebo None, pokud nemá embedding."""
+        row = None
+        if embedding is not None:
+            if self.dim is None:
+                self.dim = len(embedding)
+            elif len(embedding) != self.dim:
+                raise ValueError(f"Embedding má {len(embedding)} dimenzí, výstup {self.dim}")
+            row = self.rows + len(self._buffer)
+            self._buffer.append(embedding)
+        record = {"row": row, "chunk": chunk, "metadata": metadata, **extra}
+        self._records.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if len(self._records) >= FLUSH_EVERY:
+            self.flush()
+        return row
+
+    def flush(self):
+        if self._buffer:
+            block = np.asarray(self._buffer, dtype=self.dtype)
+            self._vectors.seek(NPY_HEADER_LEN + self.rows * self.dim * self.dtype.itemsize)
+            self._vectors.write(block.tobytes())
+            self.rows += len(block)
+            self._buffer.clear()
+        if self.dim is not None:
+            self._vectors.seek(0)
+            self._vectors.write(_npy_header(self.dtype, self.rows, self.dim))
+            self._vectors.flush()
+        # Metadata až po vektorech, aby řádek v JSONL nikdy neodkazoval na nezapsaný vektor
+        self._metadata.writelines(self._records)
+        self._metadata.flush()
+        self._records.clear()
+
+    def close(self):
+        self.flush()
+        self._vectors.close()
+        self._metadata.close()
+        # Výstup bez jediného vektoru má jen metadata (hlavička .npy by neměla dimenzi)
+        if self.dim is None:
+            os.remove(self.vectors_path)
+
+
+def iter_metadata(directory: str):
+    """Proudově vrací záznamy z `metadata.jsonl`."""
+    with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_vectors(directory: str, mmap: bool = True) -> tuple[np.ndarray, list[dict]]:
+    """
+    Vrátí (matice vektorů, záznamy chunků s vektorem). Vektory jsou memory-mapped,
+    nic se nenačítá celé; řádek vektoru je v `record["row"]`.
+    """
+    path = os.path.join(directory, VECTORS_FILE)
+    vectors = np.load(path, mmap_mode="r" if mmap else None) if os.path.exists(path) else np.empty((0, 0), np.float32)
+    records = [record for record in iter_metadata(directory) if record["row"] is not None and record["row"] < len(vectors)]
+    return vectors, records